@@ -0,0 +1,345 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from models import db, Bill, BillItem, Expense
+from reports import as_date, period_bucket
+from store_calendar import store_calendar
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+SERIES_FIELDS = ('sales', 'cogs', 'expenses', 'bill_count', 'items')
+# Points in one series; an hourly year would be 8760
+MAX_BUCKETS = 2000
+DEFAULT_TOP = 10
+MAX_TOP = 50
+# Top sellers kept per range of settled days, as a multiple of the number asked for
+TOP_CANDIDATES = 5
+
+
+class AnalyticsCache:
+    """Per-worker LRU of analytics results, invalidated by the business days they cover.
+
+    Entries are series buckets (one hour, day, week or month, clipped to the
+    requested range) and top-seller lists for a range. Each records the version
+    of the business days it covers when its query started. Saving a bill or an
+    expense bumps its day's version through invalidate(), so only the buckets
+    and ranges containing that day are recomputed. Everything else, including
+    the whole prior period, is served from memory. A result read before an
+    invalidation is stored with the old versions and never served.
+
+    Other workers' sales show up once an entry's TTL runs out: `ttl` seconds
+    for entries that include today, and `history_ttl` for older ones, which
+    only change when an offline backlog syncs or the summary is rebuilt.
+    """
+
+    def __init__(self, max_size=20000, ttl=30, history_ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.history_ttl = history_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, version, value)
+        self._versions = {}  # business day -> changes recorded on it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get('ANALYTICS_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('ANALYTICS_CACHE_TTL', self.ttl)
+        self.history_ttl = app.config.get('ANALYTICS_HISTORY_TTL', self.history_ttl)
+        app.extensions['analytics_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def version(self, first, last):
+        """Changes recorded on business days first..last; goes up whenever one of them changes."""
+        span = (last - first).days + 1
+        with self._lock:
+            if span < len(self._versions):
+                return sum(self._versions.get(first + timedelta(days=i), 0) for i in range(span))
+            return sum(n for day, n in self._versions.items() if first <= day <= last)
+
+    def get(self, key, first, last):
+        if not self.enabled:
+            return None
+        version = self.version(first, last)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic() and entry[1] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        return None
+
+    def put(self, key, last, version, value):
+        if not self.enabled:
+            return
+        ttl = self.ttl if last >= store_calendar.today() else self.history_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, days):
+        """Drop whatever covers these business days. Call after the transaction commits."""
+        with self._lock:
+            for day in days:
+                self._versions[day] = self._versions.get(day, 0) + 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+            }
+
+
+analytics_cache = AnalyticsCache()
+
+
+def buckets(start, end, granularity):
+    """(key, first day, last day) for each period overlapping business days start..end, clipped to them.
+
+    Keys are the period's first business day, or the start of the hour for 'hour'.
+    """
+    if granularity == 'hour':
+        low, high = store_calendar.bounds(start, end)
+        hour = low.replace(minute=0, second=0, microsecond=0)
+        result = []
+        while hour < high:
+            result.append((hour, max(start, store_calendar.business_day(hour)),
+                           min(end, store_calendar.business_day(hour + timedelta(minutes=59)))))
+            hour += timedelta(hours=1)
+        return result
+
+    result = []
+    day = start
+    while day <= end:
+        if granularity == 'day':
+            key, following = day, day + timedelta(days=1)
+        elif granularity == 'week':
+            key = day - timedelta(days=day.weekday())
+            following = key + timedelta(days=7)
+        else:
+            key = day.replace(day=1)
+            following = (key + timedelta(days=32)).replace(day=1)
+        result.append((key, day, min(end, following - timedelta(days=1))))
+        day = following
+    return result
+
+
+def _bucket_totals(first, last, granularity):
+    """{bucket key: totals} for business days first..last, three grouped queries."""
+    totals = {}
+
+    def row_for(key):
+        key = datetime.fromisoformat(str(key)) if granularity == 'hour' else as_date(key)
+        return totals.setdefault(key, dict.fromkeys(SERIES_FIELDS, 0))
+
+    bill_bucket = period_bucket(Bill.date, granularity)
+    sales = store_calendar.filter(
+        db.session.query(bill_bucket, db.func.sum(Bill.total_amount), db.func.count(Bill.id)),
+        Bill.date, first, last
+    ).group_by(bill_bucket)
+    for key, amount, count in sales:
+        row = row_for(key)
+        row['sales'] = amount or 0.0
+        row['bill_count'] = count
+
+    items = store_calendar.filter(
+        db.session.query(bill_bucket, db.func.sum(BillItem.quantity),
+                         db.func.sum(BillItem.cost_at_sale * BillItem.quantity))
+        .select_from(BillItem).join(Bill, Bill.id == BillItem.bill_id),
+        Bill.date, first, last
+    ).group_by(bill_bucket)
+    for key, quantity, cogs in items:
+        row = row_for(key)
+        row['items'] = int(quantity or 0)
+        row['cogs'] = cogs or 0.0
+
+    expense_bucket = period_bucket(Expense.date, granularity)
+    expenses = store_calendar.filter(
+        db.session.query(expense_bucket, db.func.sum(Expense.amount)),
+        Expense.date, first, last
+    ).group_by(expense_bucket)
+    for key, amount in expenses:
+        row_for(key)['expenses'] = amount or 0.0
+    return totals
+
+
+def _runs(spans):
+    """Merge (first, last) day spans that touch into as few runs as possible."""
+    runs = []
+    for first, last in sorted(spans):
+        if runs and first <= runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = max(runs[-1][1], last)
+        else:
+            runs.append([first, last])
+    return runs
+
+
+def series_totals(start, end, granularity):
+    """[(bucket key, totals)] for start..end, querying only the buckets not cached.
+
+    Missing buckets are fetched a run of consecutive days at a time, so a warm
+    dashboard whose only change is today's sales re-reads just today. Weeks
+    and months are summed from cached days, so that holds for them too.
+    """
+    if granularity in ('week', 'month'):
+        days = series_totals(start, end, 'day')
+        result = []
+        for key, first, last in buckets(start, end, granularity):
+            totals = dict.fromkeys(SERIES_FIELDS, 0)
+            for day, day_totals in days:
+                if first <= day <= last:
+                    for field in SERIES_FIELDS:
+                        totals[field] += day_totals[field]
+            result.append((key, totals))
+        return result
+
+    values = {}
+    missing = []
+    for key, first, last in buckets(start, end, granularity):
+        cache_key = ('series', granularity, key, first, last)
+        cached = analytics_cache.get(cache_key, first, last)
+        if cached is None:
+            missing.append((key, first, last, cache_key, analytics_cache.version(first, last)))
+        else:
+            values[key] = cached
+    for first, last in _runs((m[1], m[2]) for m in missing):
+        found = _bucket_totals(first, last, granularity)
+        for key, bucket_first, bucket_last, cache_key, version in missing:
+            if first <= bucket_first and bucket_last <= last:
+                values[key] = found.get(key) or dict.fromkeys(SERIES_FIELDS, 0)
+                analytics_cache.put(cache_key, bucket_last, version, values[key])
+    return sorted(values.items())
+
+
+def _sellers(start, end, by, limit=None):
+    """[(key, name, quantity, sales, cogs)] per product or category over start..end, best sellers first."""
+    cache_key = ('sellers', by, start, end, limit)
+    cached = analytics_cache.get(cache_key, start, end)
+    if cached is not None:
+        return cached
+    version = analytics_cache.version(start, end)
+
+    if by == 'product':
+        # Name is a snapshot and may vary between sales, report the latest spelling
+        key_cols, group_col = (BillItem.product_id, db.func.max(BillItem.product_name)), BillItem.product_id
+    else:
+        key_cols, group_col = (BillItem.category, db.literal(None)), BillItem.category
+    sales = db.func.sum(BillItem.subtotal)
+    query = store_calendar.filter(
+        db.session.query(*key_cols, db.func.sum(BillItem.quantity), sales,
+                         db.func.sum(BillItem.cost_at_sale * BillItem.quantity))
+        .select_from(BillItem).join(Bill, Bill.id == BillItem.bill_id),
+        Bill.date, start, end
+    ).group_by(group_col).order_by(sales.desc())
+    if limit:
+        query = query.limit(limit)
+    rows = [(key, name, int(qty or 0), amount or 0.0, cogs or 0.0) for key, name, qty, amount, cogs in query]
+    analytics_cache.put(cache_key, end, version, rows)
+    return rows
+
+
+def _top(start, end, by, limit):
+    """The `limit` best sellers over start..end.
+
+    A range running up to today is answered from the days before it, cached
+    and rarely invalidated, plus today's sales, which every sale invalidates
+    but are one day's worth to read. The earlier days keep TOP_CANDIDATES times
+    `limit` sellers. Anything outside those can have sold at most the last
+    one's figure, so the merge is exact unless today's sales could push such
+    a seller in; then the whole range is queried instead.
+    """
+    today = store_calendar.today()
+    if not start < today <= end:
+        return _sellers(start, end, by, limit)
+    earlier = _sellers(start, today - timedelta(days=1), by, limit * TOP_CANDIDATES)
+    recent = _sellers(today, end, by)
+    merged = {}
+    for key, name, qty, amount, cogs in earlier + recent:
+        if key in merged:
+            _, _, q, a, c = merged[key]
+            qty, amount, cogs = qty + q, amount + a, cogs + c
+        merged[key] = (key, name, qty, amount, cogs)
+    ranked = sorted(merged.values(), key=lambda row: row[3], reverse=True)[:limit]
+    if len(earlier) == limit * TOP_CANDIDATES:
+        candidates = {row[0] for row in earlier}
+        ceiling = earlier[-1][3] + max((row[3] for row in recent if row[0] not in candidates), default=0)
+        if ranked[-1][3] < ceiling:
+            return _sellers(start, end, by, limit)
+    return ranked
+
+
+def top_sellers(start, end, limit=DEFAULT_TOP):
+    """Best-selling products and categories by sales over start..end."""
+    return {
+        'products': [{'product_id': pid, 'product_name': name, 'quantity': qty, 'sales': amount,
+                      'profit': amount - cogs} for pid, name, qty, amount, cogs in _top(start, end, 'product', limit)],
+        'categories': [{'category': category, 'quantity': qty, 'sales': amount, 'profit': amount - cogs}
+                       for category, _, qty, amount, cogs in _top(start, end, 'category', limit)],
+    }
+
+
+def _point(totals):
+    bills = totals['bill_count']
+    return {
+        **totals,
+        'profit': totals['sales'] - totals['cogs'] - totals['expenses'],
+        'avg_basket': totals['sales'] / bills if bills else 0.0,
+        'items_per_basket': totals['items'] / bills if bills else 0.0,
+    }
+
+
+def _period(start, end, granularity):
+    points = series_totals(start, end, granularity)
+    overall = dict.fromkeys(SERIES_FIELDS, 0)
+    for _, totals in points:
+        for field in SERIES_FIELDS:
+            overall[field] += totals[field]
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': [{'period': key.isoformat(), **_point(totals)} for key, totals in points],
+        'totals': _point(overall),
+    }
+
+
+def analytics(start, end, granularity='day', top=DEFAULT_TOP, compare=True):
+    """Sales, profit, expense and basket series for business days start..end, plus top sellers.
+
+    With `compare`, the same figures for the equally long period just before,
+    and the change in each total, as a percentage (None when the earlier figure
+    was zero). Raises ValueError for a bad granularity or a range too long for it.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise ValueError('start must not be after end')
+    days = (end - start).days + 1
+    if days * (24 if granularity == 'hour' else 1) > MAX_BUCKETS:
+        raise ValueError(f'Range too long for {granularity} granularity')
+
+    result = {'granularity': granularity, **_period(start, end, granularity)}
+    tops = top_sellers(start, end, top)
+    result['top_products'], result['top_categories'] = tops['products'], tops['categories']
+    if compare:
+        previous_end = start - timedelta(days=1)
+        result['previous'] = _period(previous_end - timedelta(days=days - 1), previous_end, granularity)
+        before = result['previous']['totals']
+        result['change'] = {
+            field: round((value - before[field]) * 100 / abs(before[field]), 2) if before[field] else None
+            for field, value in result['totals'].items()
+        }
+    return result
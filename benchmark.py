@@ -0,0 +1,993 @@
+"""Performance benchmarks for the billing app.
+
+Runs against any SQLAlchemy URL so results can be compared between a local
+SQLite file and the real MySQL server:
+
+    python benchmark.py --db sqlite:///bench.db reports --bills 100000
+    python benchmark.py --db mysql+mysqlconnector://root:@localhost/bench reports
+    python benchmark.py --db sqlite:///bench.db scan --products 50000
+    python benchmark.py --db sqlite:///bench.db search --products 50000
+    python benchmark.py --db sqlite:///bench.db export --rows 1000000
+    python benchmark.py --db sqlite:///bench.db import --rows 20000
+    python benchmark.py --db sqlite:///bench.db receipt
+    python benchmark.py --db sqlite:///bench.db checkout-stress --workers 50
+    python benchmark.py --db sqlite:///bench.db sync --bills 2000 --batch-size 50
+    python benchmark.py --db sqlite:///bench.db bill-numbers --workers 4 --threads 8
+    python benchmark.py --db sqlite:///startup.db startup --runs 5
+    python benchmark.py --db sqlite:///bench.db analytics --bills 100000 --days 60
+    python benchmark.py --db sqlite:///bench.db stock --movements 50000
+    python benchmark.py --db sqlite:///bench.db jobs --bills 200000
+    python benchmark.py --db sqlite:///load.db endpoints --requests 500 --concurrency 16 --save before.json
+    python benchmark.py --db sqlite:///load.db endpoints --baseline before.json
+
+Every command seeds, sells into or creates tables in the database it runs on,
+so --db is required and may not be the database the app is configured with.
+
+Correctness checks (no oversell under concurrent checkout, duplicate-free
+resends and bill numbers, receipt query counts, index use and sargable date
+filters) live in tests/ and run with `python -m pytest tests`; set
+TEST_DATABASE_URL to a scratch MySQL database to run them where row locks are
+real. These commands only time the same paths.
+
+startup exits non-zero if importing wsgi.py opens a database connection.
+analytics fails if a cached /api/analytics answer differs from a fresh one
+after a sale. stock fails if stock as of a past moment (snapshot plus
+movements) differs from what was on hand then, or if stock on hand
+drifts from the ledger. jobs times checkouts while a long export runs in the
+background and fails if an identical request doesn't reuse its result or
+cancelling doesn't stop it. export fails if exporting every bill item peaks at
+more than --max-ratio times the memory of exporting the last three days.
+endpoints loads the main pages and APIs and reports p50/p99 and throughput;
+with --baseline it fails when an endpoint's p50 regressed past --tolerance.
+Generate a large dataset for it first with generate_data.py.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import Config
+from generate_data import product_name, scratch_db
+
+app = db = None
+
+
+def load_app(db_uri=None):
+    global app, db
+    if db_uri:
+        Config.SQLALCHEMY_DATABASE_URI = db_uri
+    from app import create_app
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@contextmanager
+def count_queries():
+    """Count statements sent to the database inside the block."""
+    from sqlalchemy import event
+    stats = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        stats['queries'] += 1
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def timed(label, fn, repeat=3):
+    """Run fn `repeat` times and print best latency and query count."""
+    best = None
+    queries = 0
+    for _ in range(repeat):
+        db.session.expunge_all()
+        with count_queries() as stats:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        queries = stats['queries']
+    print(f"  {label:<40} {best * 1000:>10.1f} ms {queries:>8} queries")
+    return best
+
+
+def seed_products(n_products, chunk=5000):
+    """Bulk-insert synthetic products with barcodes BENCH00000000, BENCH00000001, ..."""
+    from models import Product
+
+    existing = Product.query.filter(Product.barcode.like('BENCH%')).count()
+    rng = random.Random(42)
+    for start in range(existing, n_products, chunk):
+        db.session.execute(Product.__table__.insert(), [{
+            'name': product_name(i),
+            'barcode': f'BENCH{i:08d}',
+            'price': round(rng.uniform(1, 50), 2),
+            'cost_price': round(rng.uniform(0.5, 30), 2),
+            'stock_quantity': 10 ** 6,
+            'category': f'Category {i % 20}'
+        } for i in range(start, min(start + chunk, n_products))])
+        db.session.commit()
+
+
+def seed_bills(n_bills, n_products=500, days=30, max_lines=6, chunk=5000):
+    """Bulk-insert synthetic products, bills and line items spread over the last `days` days."""
+    from models import Product, Bill, BillItem
+
+    existing = Bill.query.count()
+    if existing >= n_bills:
+        print(f"Database already has {existing} bills, skipping seed.")
+        return
+
+    rng = random.Random(42)
+    seed_products(n_products)
+    products = Product.query.with_entities(
+        Product.id, Product.price, Product.cost_price, Product.name, Product.category
+    ).all()
+
+    now = datetime.now()
+    next_bill_id = (db.session.query(db.func.max(Bill.id)).scalar() or 0) + 1
+    remaining = n_bills - existing
+    print(f"Seeding {remaining} bills...")
+    while remaining > 0:
+        batch = min(chunk, remaining)
+        bills, items = [], []
+        for bill_id in range(next_bill_id, next_bill_id + batch):
+            total = 0
+            for _ in range(rng.randint(1, max_lines)):
+                product_id, price, cost, name, category = rng.choice(products)
+                qty = rng.randint(1, 3)
+                items.append({'bill_id': bill_id, 'product_id': product_id, 'quantity': qty,
+                              'price_at_sale': price, 'subtotal': price * qty,
+                              'cost_at_sale': cost, 'product_name': name, 'category': category})
+                total += price * qty
+            bills.append({'id': bill_id, 'bill_number': f'B{bill_id:010d}',
+                          'date': now - timedelta(seconds=rng.randint(0, days * 86400)),
+                          'customer_name': 'Walk-in', 'subtotal': total, 'tax_amount': 0,
+                          'discount_amount': 0, 'total_amount': total, 'payment_mode': 'Cash'})
+        db.session.execute(Bill.__table__.insert(), bills)
+        db.session.execute(BillItem.__table__.insert(), items)
+        db.session.commit()
+        next_bill_id += batch
+        remaining -= batch
+
+
+def legacy_month_cogs(start):
+    """The per-bill Python loop dashboard() used before the reporting module."""
+    from models import Bill
+    cogs = 0
+    for bill in Bill.query.filter(Bill.date >= start).all():
+        for item in bill.items:
+            if item.product:
+                cogs += item.product.cost_price * item.quantity
+    return cogs
+
+
+def bench_reports(args):
+    from reports import profit_report
+    from rollups import rebuild_daily_summary
+
+    seed_bills(args.bills)
+    rebuild_daily_summary()
+
+    today = datetime.now().date()
+    month_start = today - timedelta(days=30)
+    client = app.test_client()
+
+    print(f"\nReports over {args.bills} bills:")
+    if not args.skip_legacy:
+        timed('legacy per-bill COGS loop (30 days)', lambda: legacy_month_cogs(month_start), repeat=1)
+    for group_by in ('day', 'week', 'month', 'category', 'product'):
+        timed(f'profit_report(group_by={group_by!r})', lambda: profit_report(month_start, today, group_by))
+    timed('rebuild_daily_summary()', rebuild_daily_summary)
+    timed('GET / (dashboard)', lambda: client.get('/'))
+
+
+def bench_scan(args):
+    """Barcode scan latency through /api/product/<barcode> with and without the catalog cache."""
+    from catalog_cache import product_cache
+
+    seed_products(args.products)
+    rng = random.Random(7)
+    # Skewed like a real till: most scans hit a small set of fast movers
+    hot = [f'BENCH{i:08d}' for i in rng.sample(range(args.products), min(500, args.products))]
+    scans = [rng.choice(hot) for _ in range(args.scans)]
+    client = app.test_client()
+
+    def run(label):
+        latencies = []
+        for barcode in scans:
+            start = time.perf_counter()
+            client.get(f'/api/product/{barcode}')
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"  {label:<28} p50 {p50:>8.0f} us  p99 {p99:>8.0f} us")
+
+    print(f"\n{args.scans} scans over {args.products} products:")
+    size = product_cache.max_size
+    product_cache.max_size = 0
+    product_cache.invalidate()
+    run('without cache (endpoint)')
+    product_cache.max_size = size
+    run('with cache (endpoint)')
+
+    start = time.perf_counter()
+    for barcode in scans:
+        product_cache.get(barcode)
+    per_lookup = (time.perf_counter() - start) / len(scans) * 1e6
+    print(f"  {'cache lookup only':<28} {per_lookup:>12.1f} us/lookup")
+    print(f"  stats: {product_cache.stats()}")
+
+
+def bench_search(args):
+    """Product search latency: leading-wildcard ILIKE vs. the trigram index."""
+    from models import Product
+    from product_search import search_index
+
+    seed_products(args.products)
+    queries = ['milk', 'choc', 'chocolte', 'BENCH0000123', 'brown bread', 'oil 500', 'te', '4567']
+
+    def ilike(q):
+        return Product.query.filter(Product.name.ilike(f'%{q}%') | Product.barcode.ilike(f'%{q}%')).all()
+
+    start = time.perf_counter()
+    search_index.rebuild()
+    print(f"\nIndex build over {args.products} products: {(time.perf_counter() - start) * 1000:.0f} ms")
+    client = app.test_client()
+    for q in queries:
+        print(f"  q={q!r}")
+        timed('ILIKE %q% (unranked, unlimited)', lambda: ilike(q))
+        timed('search_index.search()', lambda: search_index.search(q))
+        timed('GET /api/products?q=', lambda: client.get('/api/products', query_string={'q': q}))
+
+
+def bench_export(args):
+    """Stream exports; fails unless peak Python memory stays flat as row count grows."""
+    from models import BillItem
+    from exports import generate_export
+
+    # ~3.5 lines per seeded bill
+    seed_bills(int(args.rows / 3.5) + 1)
+    total_items = BillItem.query.count()
+
+    def run(kind, fmt, start=None):
+        db.session.expunge_all()
+        tracemalloc.start()
+        began = time.perf_counter()
+        size = lines = 0
+        for chunk in generate_export(kind, fmt, start):
+            size += len(chunk)
+            lines += chunk.count('\n')
+        elapsed = time.perf_counter() - began
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {kind:<11} {fmt:<6} {lines:>9} lines {size / 1e6:>8.1f} MB out "
+              f"{elapsed:>6.1f} s  peak {peak / 1e6:>6.2f} MB")
+        return peak
+
+    print(f"\nExports ({total_items} bill items in database):")
+    recent = datetime.now().date() - timedelta(days=3)
+    small = run('bill_items', 'csv', start=recent)
+    full = max(run('bill_items', 'csv'), run('bill_items', 'jsonl'))
+    run('bills', 'csv')
+    print(f"  peak memory ratio, full export vs last 3 days: {full / small:.2f}x")
+    # Ten times the rows; an export that buffered its result would grow with them
+    if full / small > args.max_ratio:
+        print(f"  FAIL: peak memory grew more than {args.max_ratio}x with the row count")
+        raise SystemExit(1)
+
+
+def bench_import(args):
+    """Bulk product import throughput: fresh inserts, full re-upsert, then stock deltas."""
+    import io
+    from product_import import import_file
+
+    def catalog_csv(price_bump=0.0):
+        out = io.StringIO()
+        out.write('barcode,name,price,cost_price,stock_quantity,category\n')
+        for i in range(args.rows):
+            out.write(f'IMP{i:08d},{product_name(i)},{5 + i % 40 + price_bump:.2f},{3 + i % 30:.2f},{i % 200},'
+                      f'Category {i % 20}\n')
+        out.seek(0)
+        return out
+
+    def delta_csv():
+        out = io.StringIO()
+        out.write('barcode,quantity\n')
+        for i in range(args.rows):
+            out.write(f'IMP{i:08d},{(i % 7) - 3}\n')
+        out.seek(0)
+        return out
+
+    print(f"\nImporting {args.rows} rows in chunks of {args.chunk_size}:")
+    for label, make, mode in [('upsert (insert/update)', catalog_csv, 'upsert'),
+                              ('upsert (update all)', lambda: catalog_csv(0.5), 'upsert'),
+                              ('stock_delta', delta_csv, 'stock_delta')]:
+        data = make()
+        start = time.perf_counter()
+        result = import_file(data, 'csv', mode, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<24} {elapsed:>7.2f} s {result['imported'] / elapsed:>10.0f} rows/s"
+              f"  ({result['imported']} imported, {result['failed']} failed)")
+
+
+def bench_receipt(args):
+    """Query count and latency of receipt rendering and bill serialization as bills grow."""
+    from models import Bill, Product
+    from shop_settings import settings_cache
+
+    seed_products(max(args.lines))
+    products = [pid for (pid,) in db.session.query(Product.id).filter(Product.barcode.like('BENCH%'))
+                .order_by(Product.id).limit(max(args.lines))]
+    client = app.test_client()
+    settings_cache.get()  # warm, as on a running till
+
+    print("\nReceipt / bill serialization query counts:")
+    for lines in args.lines:
+        items = [{'product_id': pid, 'quantity': 1, 'price': 1.0, 'subtotal': 1.0} for pid in products[:lines]]
+        bill_id = client.post('/api/checkout', json={'total_amount': lines, 'subtotal': lines, 'items': items}).json['bill_id']
+        db.session.expunge_all()
+        with count_queries() as receipt_q:
+            assert client.get(f'/receipt/{bill_id}').status_code == 200
+        with count_queries() as api_q:
+            client.get('/api/bills', query_string={'limit': 1})
+        db.session.expunge_all()
+        with count_queries() as to_dict_q:
+            db.session.get(Bill, bill_id).to_dict()
+        print(f"  {lines:>3} lines: GET /receipt {receipt_q['queries']} queries, GET /api/bills {api_q['queries']},"
+              f" lazy Bill.to_dict() {to_dict_q['queries']}")
+    timed('GET /receipt (largest bill)', lambda: client.get(f'/receipt/{bill_id}'), repeat=20)
+
+
+def bench_checkout_stress(args):
+    """Latency of concurrent checkouts contending for the same SKUs."""
+    from models import Product
+
+    skus = []
+    for i in range(args.skus):
+        barcode = f'STRESS{i:04d}'
+        product = Product.query.filter_by(barcode=barcode).first()
+        if not product:
+            product = Product(name=f'Stress {i}', barcode=barcode, price=1.0, cost_price=0.5, category='Stress')
+            db.session.add(product)
+        product.stock_quantity = args.stock
+        skus.append(product)
+    db.session.commit()
+    sku_ids = [p.id for p in skus]
+
+    def one_checkout(n):
+        # Shuffle line order per till; the server must still lock consistently
+        lines = [{'product_id': pid, 'quantity': args.quantity, 'price': 1.0, 'subtotal': args.quantity}
+                 for pid in random.sample(sku_ids, len(sku_ids))]
+        total = sum(line['subtotal'] for line in lines)
+        start = time.perf_counter()
+        with app.test_client() as client:
+            response = client.post('/api/checkout', json={
+                'customer_name': f'Stress {n}', 'subtotal': total, 'total_amount': total, 'items': lines
+            })
+        return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(one_checkout, range(args.workers)))
+    elapsed = time.perf_counter() - start
+
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    print(f"\n{args.workers} concurrent checkouts of {args.quantity} x {args.skus} SKUs (stock {args.stock} each)"
+          f" in {elapsed * 1000:.0f} ms, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms")
+    print(f"  responses: {dict(sorted(codes.items()))}")
+
+
+def bench_sync(args):
+    """Offline backlog drain rate: one POST per bill vs. /api/checkout/batch, plus a resend."""
+    import uuid
+    from models import Product
+
+    seed_products(500)
+    products = [pid for (pid,) in db.session.query(Product.id).filter(Product.barcode.like('BENCH%'))
+                .order_by(Product.id).limit(500)]
+    client = app.test_client()
+
+    def backlog(n):
+        bills = []
+        for _ in range(n):
+            items = [{'product_id': pid, 'quantity': 1, 'price': 1.0, 'subtotal': 1.0}
+                     for pid in random.sample(products, random.randint(1, 6))]
+            bills.append({'client_ref': str(uuid.uuid4()), 'date': datetime.now().isoformat(),
+                          'subtotal': len(items), 'total_amount': len(items), 'items': items})
+        return bills
+
+    def drain_single(bills):
+        for bill in bills:
+            assert client.post('/api/checkout', json=bill).status_code == 200
+
+    def drain_batched(bills):
+        statuses = {}
+        for i in range(0, len(bills), args.batch_size):
+            response = client.post('/api/checkout/batch', json={'bills': bills[i:i + args.batch_size]})
+            for result in response.json['results']:
+                statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        return statuses
+
+    print(f"\nDraining a backlog of {args.bills} queued bills:")
+    for label, drain in (('one POST per bill', drain_single), (f'batches of {args.batch_size}', drain_batched)):
+        bills = backlog(args.bills)
+        start = time.perf_counter()
+        drain(bills)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<20} {elapsed:>7.2f} s {args.bills / elapsed:>8.0f} bills/s")
+
+    # A till that lost the responses sends the same backlog again
+    start = time.perf_counter()
+    statuses = drain_batched(bills)
+    elapsed = time.perf_counter() - start
+    print(f"  {'resend (duplicates)':<20} {elapsed:>7.2f} s {args.bills / elapsed:>8.0f} bills/s  {statuses}")
+
+
+def _bill_number_worker(db_uri, block_size, threads, numbers_per_thread, checkouts, product_ids):
+    """One app process: threads drawing numbers, then real checkouts. Runs in a child process."""
+    load_app(db_uri)
+    from bill_numbers import bill_numbers
+    bill_numbers.block_size = block_size
+
+    def draw(_):
+        with app.app_context():
+            return [bill_numbers.next_number() for _ in range(numbers_per_thread)]
+
+    with app.app_context(), count_queries() as stats:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            drawn = list(pool.map(draw, range(threads)))
+        codes = {}
+        with app.test_client() as client:
+            for _ in range(checkouts):
+                pid = random.choice(product_ids)
+                response = client.post('/api/checkout', json={
+                    'subtotal': 1.0, 'total_amount': 1.0,
+                    'items': [{'product_id': pid, 'quantity': 1, 'price': 1.0, 'subtotal': 1.0}]
+                })
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    drawn.append([response.json['bill_number']])
+        stats['blocks'] = bill_numbers.blocks_reserved
+    return drawn, codes, stats
+
+
+def bench_bill_numbers(args):
+    """Throughput of bill number allocation with several worker processes drawing at once."""
+    from models import Product
+
+    seed_products(100)
+    product_ids = [pid for (pid,) in db.session.query(Product.id).filter(Product.barcode.like('BENCH%')).limit(100)]
+    db.session.remove()
+
+    work = (args.db, args.block_size, args.threads, args.numbers, args.checkouts, product_ids)
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+        results = pool.starmap(_bill_number_worker, [work] * args.workers)
+    elapsed = time.perf_counter() - start
+
+    issued = []
+    codes = {}
+    blocks = 0
+    for drawn, worker_codes, stats in results:
+        for numbers in drawn:
+            issued.extend(numbers)
+        for code, n in worker_codes.items():
+            codes[code] = codes.get(code, 0) + n
+        blocks += stats['blocks']
+
+    print(f"\n{args.workers} processes x {args.threads} threads, block size {args.block_size}:")
+    print(f"  {len(issued)} numbers issued in {elapsed:.2f} s, {blocks} blocks reserved"
+          f" ({blocks / len(issued):.3f} reservations per number)")
+    print(f"  checkouts: {dict(sorted(codes.items()))}")
+    print(f"  e.g. {min(issued)} .. {max(issued)}")
+
+
+def bench_analytics(args):
+    """Queries and latency for /api/analytics cold, warm and after a sale; fails if a cached answer is stale."""
+    from analytics import analytics, analytics_cache
+    from models import Bill, Product
+    from store_calendar import store_calendar
+
+    seed_bills(args.bills, days=args.days)
+    client = app.test_client()
+    product = Product.query.filter(Product.barcode.like('BENCH%')).first()
+    line = {'product_id': product.id, 'quantity': 1, 'price': product.price, 'subtotal': product.price}
+    end = store_calendar.today()
+    start = end - timedelta(days=args.days - 1)
+    failed = False
+
+    print(f"\n/api/analytics over {args.days} days ({Bill.query.count()} bills), with the previous period:")
+    for granularity in ('hour', 'day', 'week', 'month'):
+        if granularity == 'hour' and args.days * 24 > 2000:
+            continue
+        url = f'/api/analytics?granularity={granularity}&start={start}&end={end}'
+        cells = []
+        for label in ('cold', 'warm', 'after a sale'):
+            if label == 'after a sale':
+                client.post('/api/checkout', json={'total_amount': product.price, 'items': [line]})
+            db.session.expunge_all()
+            with count_queries() as stats:
+                began = time.perf_counter()
+                cached = client.get(url).get_json()
+                elapsed = time.perf_counter() - began
+            cells.append(f"{label} {elapsed * 1000:>7.1f} ms {stats['queries']:>2} q")
+        print(f"  {granularity:<6} " + '   '.join(cells))
+
+        # What the cache served after the sale has to match a fresh computation
+        size, analytics_cache.max_size = analytics_cache.max_size, 0
+        with app.test_request_context():
+            fresh = json.loads(json.dumps(analytics(start, end, granularity)))
+        analytics_cache.max_size = size
+        if fresh != cached:
+            failed = True
+            print(f"  FAIL: cached {granularity} analytics differ from a fresh computation")
+    print(f"  cache: {analytics_cache.stats()}")
+    if failed:
+        raise SystemExit(1)
+
+
+def bench_stock(args):
+    """Stock ledger consistency and as-of query cost before/after compaction; fails on any mismatch."""
+    from models import Product
+    from stock_ledger import apply_movements, compact, drift, on_hand as stock_on_hand, stock_as_of
+
+    products = Product.query.filter(Product.barcode.like('LEDGER%')).order_by(Product.id).all()
+    if not products:
+        products = [Product(name=f'Ledger {i}', barcode=f'LEDGER{i:04d}', price=2.0, cost_price=1.0,
+                            stock_quantity=0, category='Ledger') for i in range(args.products)]
+        db.session.add_all(products)
+        db.session.commit()
+    ids = [p.id for p in products]
+    client = app.test_client()
+    rng = random.Random(7)
+
+    def on_hand():
+        db.session.expire_all()
+        return {pid: qty for pid, qty in stock_on_hand(ids).items() if qty}
+
+    def settle():
+        # Movements are stamped to the second; step past it so a moment splits rounds cleanly
+        time.sleep(1.05)
+        return datetime.now().replace(microsecond=0) - timedelta(microseconds=1)
+
+    # Rounds of restocks, sales, batch syncs and edits, remembering stock after each
+    seen = []
+    for n in range(args.rounds):
+        apply_movements([{'product_id': pid, 'kind': 'restock', 'quantity': rng.randint(5, 20)} for pid in ids])
+        for _ in range(5):
+            lines = [{'product_id': pid, 'quantity': 1, 'price': 2.0, 'subtotal': 2.0} for pid in rng.sample(ids, 3)]
+            client.post('/api/checkout', json={'total_amount': 6.0, 'items': lines})
+        client.post('/api/checkout/batch', json={'bills': [
+            {'client_ref': f'ledger-{n}-{i}-{time.time()}', 'total_amount': 2.0,
+             'items': [{'product_id': rng.choice(ids), 'quantity': 1, 'price': 2.0, 'subtotal': 2.0}]}
+            for i in range(5)]})
+        client.put(f'/api/product/{rng.choice(ids)}', json={'stock_quantity': rng.randint(0, 50)})
+        seen.append((settle(), on_hand()))
+        if n == args.rounds // 2:
+            compact(seen[-1][0])
+
+    failed = False
+    for moment, expected in seen:
+        got = stock_as_of(moment, ids)
+        if got != expected:
+            failed = True
+            print(f"  FAIL: stock as of {moment} {got} != {expected}")
+    if not failed:
+        print(f"\nStock as of {len(seen)} past moments matches what was on hand then.")
+
+    # What a snapshot saves: as-of reads over a long history, before and after compacting it
+    entries = [{'product_id': rng.choice(ids), 'kind': 'adjustment', 'quantity': rng.choice([-1, 1])}
+               for _ in range(args.movements)]
+    for start in range(0, len(entries), 1000):
+        try:
+            apply_movements(entries[start:start + 1000])
+        except ValueError:
+            pass  # an adjustment that would go negative; skip that batch
+    now = settle()
+    timed(f'stock_as_of, {args.movements} movements since snapshot', lambda: stock_as_of(now, ids))
+    compact(now)
+    timed('stock_as_of, right after compaction', lambda: stock_as_of(now, ids))
+
+    mismatches = drift()
+    if mismatches:
+        failed = True
+        print(f"  FAIL: {len(mismatches)} products disagree with the ledger, e.g. {mismatches[:3]}")
+    if failed:
+        raise SystemExit(1)
+    print("Stock on hand agrees with the ledger.")
+
+
+def bench_jobs(args):
+    """Checkout latency while a long export runs as a background job; fails if a job misbehaves."""
+    from models import Product
+    from jobs import PROGRESS_INTERVAL
+
+    seed_bills(args.bills)
+    client = app.test_client()
+    product = Product.query.filter(Product.barcode.like('BENCH%')).first()
+    line = {'product_id': product.id, 'quantity': 1, 'price': product.price, 'subtotal': product.price}
+    failed = False
+
+    def checkouts(n):
+        latencies = []
+        for _ in range(n):
+            start = time.perf_counter()
+            client.post('/api/checkout', json={'total_amount': product.price, 'items': [line]})
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+    def poll(job_id, until=('done', 'failed', 'cancelled'), timeout=600):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            job = client.get(f'/api/jobs/{job_id}').get_json()
+            if job['status'] in until:
+                return job
+            time.sleep(0.05)
+        raise SystemExit(f'Job {job_id} still {job["status"]} after {timeout} s')
+
+    start = time.perf_counter()
+    size = len(client.get('/export/bill_items').get_data())
+    print(f"\nbill_items export inside a request: {time.perf_counter() - start:.1f} s ({size / 1e6:.1f} MB),"
+          " a worker tied up for all of it")
+
+    idle = checkouts(args.checkouts)
+    start = time.perf_counter()
+    job_id = client.post('/api/jobs', json={'kind': 'export', 'params': {'kind': 'bill_items'}}).get_json()['id']
+    busy, updates = [], set()
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        updates.add(job['progress'])
+        if job['status'] not in ('queued', 'running'):
+            break
+        busy.extend(checkouts(5))
+    elapsed = time.perf_counter() - start
+    busy.sort()
+    print(f"  as a background job: {job['status']} in {elapsed:.1f} s, {len(updates)} distinct progress values")
+    print(f"  checkout p50 idle {_percentile(idle, 50) * 1000:.1f} ms, during the job"
+          f" {_percentile(busy, 50) * 1000:.1f} ms (p99 {_percentile(busy, 99) * 1000:.1f} ms, {len(busy)} sales)")
+    if job['status'] != 'done':
+        failed = True
+        print(f"  FAIL: export job {job['status']}: {job['error']}")
+
+    again = client.post('/api/jobs', json={'kind': 'export', 'params': {'kind': 'bill_items'}})
+    if again.status_code != 200 or again.get_json()['id'] != job_id:
+        failed = True
+        print("  FAIL: an identical request did not get the finished export")
+
+    job_id = client.post('/api/jobs', json={'kind': 'export', 'params': {'kind': 'bill_items', 'format': 'jsonl'}}) \
+        .get_json()['id']
+    poll(job_id, until=('running',))
+    client.delete(f'/api/jobs/{job_id}')
+    start = time.perf_counter()
+    job = poll(job_id)
+    waited = time.perf_counter() - start
+    print(f"  cancelled a running export: {job['status']} after {waited:.1f} s at {job['progress']:.0%}")
+    if job['status'] != 'cancelled' and job['progress'] < 1:
+        failed = True
+        print("  FAIL: the job did not stop when cancelled")
+    elif waited > PROGRESS_INTERVAL * 5:
+        failed = True
+        print("  FAIL: cancelling took longer than a few progress updates")
+    if failed:
+        raise SystemExit(1)
+
+
+ENDPOINTS = ('dashboard', 'analytics', 'history', 'inventory', 'inventory-api', 'search', 'barcode', 'checkout')
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_endpoints(args):
+    """p50/p99 latency and throughput of the main pages and APIs under concurrent load.
+
+    Drives the app in-process through the test client, or a running server
+    given with --url (e.g. gunicorn against MySQL; in-process threads share
+    one GIL). --save writes the results as JSON, and --baseline compares a run
+    against such a file, failing if any endpoint's p50 got more than
+    --tolerance (and --min-delta-ms) slower.
+    """
+    import urllib.error
+    import urllib.request
+    from urllib.parse import quote
+    from generate_data import generate
+    from models import Bill, Product
+
+    generated = Product.barcode.like('GEN%')
+    if not db.session.query(Product.id).filter(generated).first():
+        print(f"Generating {args.products} products and {args.bills} bills (generate_data.py for more):")
+        generate(products=args.products, bills=args.bills, expenses=args.bills // 10, days=90, seed=args.seed)
+
+    rng = random.Random(args.seed)
+    barcodes = [b for (b,) in db.session.query(Product.barcode).filter(generated).order_by(Product.id).limit(5000)]
+    names = [n for (n,) in db.session.query(Product.name).filter(generated).order_by(Product.id).limit(500)]
+    terms = [rng.choice(name.split())[:rng.randint(3, 6)] for name in names]
+    sellable = db.session.query(Product.id, Product.price).filter(generated, Product.stock_quantity >= 1000) \
+        .order_by(Product.id).limit(500).all()
+
+    def checkout_body():
+        lines = [{'product_id': pid, 'quantity': 1, 'price': price, 'subtotal': price}
+                 for pid, price in rng.sample(sellable, min(len(sellable), rng.randint(1, 5)))]
+        total = round(sum(line['subtotal'] for line in lines), 2)
+        return {'subtotal': total, 'total_amount': total, 'payment_mode': 'Cash', 'items': lines}
+
+    bills = db.session.query(db.func.count(Bill.id)).scalar()
+    products = db.session.query(db.func.count(Product.id)).scalar()
+    scenarios = {
+        'dashboard': lambda: ('GET', '/', None),
+        # The dashboard chart's period picker
+        'analytics': lambda: ('GET', '/api/analytics?top=1&' + rng.choice(
+            ['granularity=hour&days=1', 'granularity=day&days=7', 'granularity=day&days=30',
+             'granularity=week&days=84', 'granularity=month&days=365']), None),
+        'history': lambda: ('GET', '/history', None),
+        'inventory': lambda: ('GET', '/inventory', None),
+        # A scroll through the virtualized table: any page, any sort
+        'inventory-api': lambda: ('GET', f"/api/inventory?offset={rng.randrange(0, max(products, 1), 100)}"
+                                         f"&sort={rng.choice(['name', 'stock', 'margin'])}", None),
+        'search': lambda: ('GET', f'/api/products?q={quote(rng.choice(terms))}', None),
+        'barcode': lambda: ('GET', f'/api/product/{rng.choice(barcodes)}', None),
+        'checkout': lambda: ('POST', '/api/checkout', checkout_body()),
+    }
+
+    if args.url:
+        def send(method, path, body):
+            request_ = urllib.request.Request(
+                args.url.rstrip('/') + path, method=method, headers={'Content-Type': 'application/json'},
+                data=json.dumps(body).encode() if body is not None else None)
+            try:
+                with urllib.request.urlopen(request_, timeout=60) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+    else:
+        def send(method, path, body):
+            with app.test_client() as client:
+                response = client.open(path, method=method, json=body)
+                response.get_data()
+                return response.status_code
+
+    def timed_send(request_):
+        start = time.perf_counter()
+        status = send(*request_)
+        return status, time.perf_counter() - start
+
+    print(f"\n{args.requests} requests per endpoint, {args.concurrency} concurrent, "
+          f"{products} products / {bills} bills on {db.engine.dialect.name}"
+          f"{' via ' + args.url if args.url else ' in-process'}:")
+    print(f"  {'endpoint':<13} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8}")
+
+    results = {}
+    for name in args.only or ENDPOINTS:
+        # Requests are drawn up front so the same --seed replays the same run
+        plan = [scenarios[name]() for _ in range(args.requests)]
+        for request_ in plan[:args.warmup]:
+            send(*request_)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            samples = list(pool.map(timed_send, plan))
+        elapsed = time.perf_counter() - start
+        latencies = sorted(latency for _, latency in samples)
+        results[name] = {
+            'requests': len(samples),
+            'errors': sum(1 for status, _ in samples if status >= 400),
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'rps': round(len(samples) / elapsed, 1),
+        }
+        r = results[name]
+        print(f"  {name:<13} {r['errors']:>7} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} {r['rps']:>8.1f}")
+
+    run = {'commit': _git_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+           'database': db.engine.dialect.name, 'target': args.url or 'in-process', 'products': products,
+           'bills': bills, 'concurrency': args.concurrency, 'results': results}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.baseline} (commit {baseline.get('commit')}, {baseline.get('bills')} bills):")
+        regressed = []
+        for name, r in results.items():
+            before = baseline['results'].get(name)
+            if not before:
+                continue
+            change = r['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            slower = r['p50_ms'] - before['p50_ms'] > args.min_delta_ms
+            flag = 'REGRESSED' if change > args.tolerance and slower else ''
+            print(f"  {name:<13} p50 {before['p50_ms']:>8.1f} -> {r['p50_ms']:>8.1f} ms ({change:+.0%})"
+                  f"  p99 {before['p99_ms']:>8.1f} -> {r['p99_ms']:>8.1f} ms  {flag}")
+            if flag:
+                regressed.append(name)
+        if regressed:
+            print(f"FAIL: p50 more than {args.tolerance:.0%} slower on {', '.join(regressed)}")
+            raise SystemExit(1)
+
+
+# Run in a fresh interpreter per sample, so imports are really cold
+STARTUP_PROBE = '''
+import json, time
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connects = []
+event.listen(Pool, 'connect', lambda *a: connects.append(1))
+start = time.perf_counter()
+from wsgi import app
+imported = time.perf_counter()
+at_import = len(connects)
+from models import db
+with app.app_context():
+    db.create_all()
+schema_checked = time.perf_counter()
+app.test_client().get('/api/settings')
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'connections': at_import,
+                  'schema_check': schema_checked - imported, 'first_request': served - schema_checked}))
+'''
+
+
+def bench_startup(args):
+    """Worker cold start: wsgi import time, and what the old import-time schema check cost.
+
+    The probe runs db.create_all(), so it points the workers at the scratch --db.
+    """
+    env = dict(os.environ, DATABASE_URL=scratch_db(args.db))
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(args.runs):
+        probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=here, env=env,
+                               capture_output=True, text=True)
+        if probe.returncode:
+            errors = [line for line in probe.stderr.splitlines() if 'Error' in line]
+            print(errors[-1] if errors else probe.stderr.strip())
+            raise SystemExit(f"FAIL: start-up probe exited with {probe.returncode}")
+        samples.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+
+    def median_ms(key):
+        return statistics.median(s[key] for s in samples) * 1000
+
+    connections = max(s['connections'] for s in samples)
+    print(f"\nWorker start-up, median of {args.runs} cold processes:")
+    print(f"  import wsgi (create_app)            {median_ms('import'):>8.1f} ms, {connections} DB connections")
+    print(f"  db.create_all() (formerly at import) {median_ms('schema_check'):>8.1f} ms")
+    print(f"  first request (opens the pool)       {median_ms('first_request'):>8.1f} ms")
+    if connections:
+        print("  FAIL: importing the app connected to the database")
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='SQLAlchemy URL of a scratch database; required, '
+                                     'and refused if it is the configured database')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    reports = sub.add_parser('reports', help='Profit/COGS reporting vs. the legacy per-bill loop')
+    reports.add_argument('--bills', type=int, default=100000)
+    reports.add_argument('--skip-legacy', action='store_true', help='Skip the slow N+1 baseline')
+    reports.set_defaults(func=bench_reports)
+
+    scan = sub.add_parser('scan', help='Barcode lookup latency with and without the catalog cache')
+    scan.add_argument('--products', type=int, default=50000)
+    scan.add_argument('--scans', type=int, default=5000)
+    scan.set_defaults(func=bench_scan)
+
+    search = sub.add_parser('search', help='Product search latency, ILIKE vs. trigram index')
+    search.add_argument('--products', type=int, default=50000)
+    search.set_defaults(func=bench_search)
+
+    export = sub.add_parser('export', help='Streaming export memory use over a large bill_items table')
+    export.add_argument('--rows', type=int, default=1000000, help='Approximate bill_items rows to seed')
+    export.add_argument('--max-ratio', type=float, default=2.0,
+                        help='Most the full export may peak at, as a multiple of the last-3-days one')
+    export.set_defaults(func=bench_export)
+
+    imp = sub.add_parser('import', help='Bulk product import/upsert throughput')
+    imp.add_argument('--rows', type=int, default=20000)
+    imp.add_argument('--chunk-size', type=int, default=1000)
+    imp.set_defaults(func=bench_import)
+
+    receipt = sub.add_parser('receipt', help='Receipt/bill serialization query counts and latency')
+    receipt.add_argument('--lines', type=int, nargs='+', default=[1, 10, 40])
+    receipt.set_defaults(func=bench_receipt)
+
+    stress = sub.add_parser('checkout-stress', help='Latency of parallel checkouts on the same SKUs')
+    stress.add_argument('--workers', type=int, default=50)
+    stress.add_argument('--skus', type=int, default=3)
+    stress.add_argument('--stock', type=int, default=100)
+    stress.add_argument('--quantity', type=int, default=3)
+    stress.set_defaults(func=bench_checkout_stress)
+
+    sync = sub.add_parser('sync', help='Offline backlog drain throughput')
+    sync.add_argument('--bills', type=int, default=2000)
+    sync.add_argument('--batch-size', type=int, default=50)
+    sync.set_defaults(func=bench_sync)
+
+    numbers = sub.add_parser('bill-numbers', help='Concurrent bill number allocation throughput')
+    numbers.add_argument('--workers', type=int, default=4, help='Worker processes')
+    numbers.add_argument('--threads', type=int, default=8, help='Threads per worker')
+    numbers.add_argument('--numbers', type=int, default=500, help='Numbers drawn per thread')
+    numbers.add_argument('--checkouts', type=int, default=50, help='Real checkouts per worker')
+    numbers.add_argument('--block-size', type=int, default=50)
+    numbers.set_defaults(func=bench_bill_numbers)
+
+    analytics = sub.add_parser('analytics', help='/api/analytics cold, warm and after a sale; fails on a stale cache')
+    analytics.add_argument('--bills', type=int, default=100000)
+    analytics.add_argument('--days', type=int, default=60)
+    analytics.set_defaults(func=bench_analytics)
+
+    stock = sub.add_parser('stock', help='Stock ledger as-of queries vs. snapshots; fails if ledger and stock disagree')
+    stock.add_argument('--products', type=int, default=20)
+    stock.add_argument('--rounds', type=int, default=4)
+    stock.add_argument('--movements', type=int, default=20000, help='History to compact for the timing')
+    stock.set_defaults(func=bench_stock)
+
+    jobs = sub.add_parser('jobs', help='Checkout latency during a background export; fails if caching or cancel breaks')
+    jobs.add_argument('--bills', type=int, default=200000)
+    jobs.add_argument('--checkouts', type=int, default=200, help='Sales timed with no job running')
+    jobs.set_defaults(func=bench_jobs)
+
+    endpoints = sub.add_parser('endpoints', help='p50/p99 latency and throughput of pages and APIs under load')
+    endpoints.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    endpoints.add_argument('--concurrency', type=int, default=8)
+    endpoints.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first')
+    endpoints.add_argument('--only', nargs='+', choices=ENDPOINTS)
+    endpoints.add_argument('--url', help='Load a running server instead, e.g. http://127.0.0.1:8000')
+    endpoints.add_argument('--products', type=int, default=5000, help='Generated when the database has none')
+    endpoints.add_argument('--bills', type=int, default=50000, help='Generated along with the products')
+    endpoints.add_argument('--seed', type=int, default=42)
+    endpoints.add_argument('--save', help='Write the results to this JSON file')
+    endpoints.add_argument('--baseline', help='JSON from an earlier --save to compare against')
+    endpoints.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown vs. the baseline')
+    endpoints.add_argument('--min-delta-ms', type=float, default=5.0,
+                           help='Ignore p50 slowdowns smaller than this, they are noise on fast endpoints')
+    endpoints.set_defaults(func=bench_endpoints)
+
+    startup = sub.add_parser('startup', help='Cold start time of wsgi.py; fails if import connects to the DB')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.set_defaults(func=bench_startup, standalone=True)
+
+    args = parser.parse_args()
+    if getattr(args, 'standalone', False):
+        args.func(args)
+        return
+    load_app(scratch_db(args.db))
+    with app.app_context():
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
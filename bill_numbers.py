@@ -0,0 +1,82 @@
+import threading
+from datetime import date
+from models import db, BillSequence
+
+# Days kept in memory; offline backlogs can still carry bills from a few days back
+MAX_OPEN_DAYS = 32
+
+
+class BillNumberAllocator:
+    """Hands out bill numbers like S1-20261018-000042 without a query per bill.
+
+    Numbers count up per store and sale day. Each worker reserves a block of
+    `block_size` numbers with one statement against bill_sequences, on its own
+    connection and committed straight away, so the reservation never waits on
+    or rolls back with the checkout transaction. Two workers can't get the same
+    block, so numbers are unique without retrying on the unique index.
+
+    Within a worker numbers are increasing; across workers they interleave by
+    block. Numbers left in a block when a worker stops, or taken by a bill that
+    fails, are never reused, so sequences can have gaps.
+    """
+
+    def __init__(self, store_code='S1', block_size=50):
+        self.store_code = store_code
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}  # day -> [next value, last value reserved]
+        self.blocks_reserved = 0
+        self.issued = 0
+
+    def init_app(self, app):
+        self.store_code = app.config.get('BILL_STORE_CODE', self.store_code)
+        self.block_size = app.config.get('BILL_NUMBER_BLOCK_SIZE', self.block_size)
+        app.extensions['bill_numbers'] = self
+
+    def format(self, day, value):
+        return f'{self.store_code}-{day:%Y%m%d}-{value:06d}'
+
+    def take(self, day=None, count=1):
+        """`count` bill numbers for bills dated `day`, reserving a new block when this one runs out."""
+        day = day or date.today()
+        numbers = []
+        with self._lock:
+            block = self._blocks.get(day)
+            while len(numbers) < count:
+                if not block or block[0] > block[1]:
+                    size = max(self.block_size, count - len(numbers))
+                    last = self._reserve(day, size)
+                    block = self._blocks[day] = [last - size + 1, last]
+                    self.blocks_reserved += 1
+                numbers.append(self.format(day, block[0]))
+                block[0] += 1
+            self.issued += count
+            if len(self._blocks) > MAX_OPEN_DAYS:
+                del self._blocks[min(self._blocks)]
+        return numbers
+
+    def next_number(self, day=None):
+        return self.take(day)[0]
+
+    def _reserve(self, day, size):
+        """Advance the day's sequence by `size` in one statement; returns the new last value."""
+        table = BillSequence.__table__
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'mysql':
+                # LAST_INSERT_ID(expr) hands the new value back in the OK packet, no SELECT needed
+                from sqlalchemy.dialects.mysql import insert
+                stmt = insert(table).values(
+                    store_code=self.store_code, day=day, last_value=db.func.last_insert_id(size)
+                ).on_duplicate_key_update(last_value=db.func.last_insert_id(table.c.last_value + size))
+                return conn.execute(stmt).lastrowid
+
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(store_code=self.store_code, day=day, last_value=size)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.store_code, table.c.day],
+                set_={'last_value': table.c.last_value + size}
+            ).returning(table.c.last_value)
+            return conn.execute(stmt).scalar_one()
+
+
+bill_numbers = BillNumberAllocator()
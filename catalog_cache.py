@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from models import Product
+
+
+class ProductCatalogCache:
+    """In-process barcode -> product lookup for the scanner path.
+
+    Entries are plain dicts (Product.to_dict()), never ORM objects, so they can be
+    shared across requests and threads. The cache is a bounded LRU; unknown
+    barcodes are cached too so a repeatedly scanned bad label doesn't hit MySQL.
+
+    Invalidation is versioned: every invalidate() bumps a generation counter and a
+    lookup that started before the bump discards its DB result instead of caching
+    it, so a slow read can never resurrect data that was changed mid-flight.
+    Other workers' caches are not notified; the TTL bounds how stale they can get.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # barcode -> (expires_at, product dict or None)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get('CATALOG_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('CATALOG_CACHE_TTL', self.ttl)
+        app.extensions['catalog_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, barcode):
+        """Product dict for `barcode`, or None if no such product."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(barcode)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+
+        product = Product.query.filter_by(barcode=barcode).first()
+        data = product.to_dict() if product else None
+
+        if self.enabled:
+            with self._lock:
+                if generation == self.generation:
+                    self._entries[barcode] = (now + self.ttl, data)
+                    self._entries.move_to_end(barcode)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+        return data
+
+    def invalidate(self, barcodes=None):
+        """Drop the given barcodes, or everything when called without arguments.
+
+        Call after the transaction that changed the products has committed.
+        """
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if barcodes is None:
+                self._entries.clear()
+            else:
+                for barcode in barcodes:
+                    self._entries.pop(barcode, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+
+product_cache = ProductCatalogCache()
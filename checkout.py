@@ -0,0 +1,312 @@
+import logging
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Product, Bill, BillItem
+from rollups import add_to_summary, record_bill
+from catalog_cache import product_cache
+from analytics import analytics_cache
+from bill_numbers import bill_numbers
+from store_calendar import store_calendar
+from stock_ledger import lock_products, movement, pending_stock, record_movements, stock_folder
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bills accepted per /api/checkout/batch request
+MAX_BATCH_SIZE = 100
+
+# Length of bills.client_ref
+MAX_CLIENT_REF = 64
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def bill_result(bill):
+    return {
+        'bill_id': bill.id,
+        'bill_number': bill.bill_number,
+        'client_ref': bill.client_ref,
+        'date': bill.date.strftime('%Y-%m-%d %H:%M')
+    }
+
+
+def _sale_date(value):
+    # Queued offline bills carry the time the sale happened at the till
+    if not value:
+        return datetime.now()
+    try:
+        date = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise CheckoutError('Invalid sale date')
+    if date.tzinfo:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _client_ref(data):
+    """The till's id for a checkout payload, or None; raises CheckoutError if it isn't a short string."""
+    ref = data.get('client_ref')
+    if ref is None or ref == '':
+        return None
+    if not isinstance(ref, str) or len(ref) > MAX_CLIENT_REF:
+        raise CheckoutError(f'client_ref must be a string of at most {MAX_CLIENT_REF} characters')
+    return ref
+
+
+def _saved_bill(ref):
+    """The bill already saved under client_ref `ref`, or None.
+
+    A locking read, so inside a transaction it sees a bill another request
+    committed after this one's snapshot was taken.
+    """
+    return Bill.query.filter_by(client_ref=ref).with_for_update(read=True).first()
+
+
+def _valid_ref(data):
+    try:
+        _client_ref(data)
+    except CheckoutError:
+        return False
+    return True
+
+
+def _cart(data):
+    """(lines, {product_id: total quantity}) for a checkout payload; raises CheckoutError if it is malformed."""
+    items = data.get('items', [])
+    if not isinstance(items, list):
+        raise CheckoutError('items must be a list')
+    if not _is_number(data.get('total_amount')):
+        raise CheckoutError('total_amount must be a number')
+    for field in ('subtotal', 'tax_amount', 'discount_amount'):
+        if data.get(field) is not None and not _is_number(data[field]):
+            raise CheckoutError(f'{field} must be a number')
+
+    # Total quantity per product, so a product on two cart lines is checked and decremented once
+    quantities = {}
+    for n, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise CheckoutError(f'Line {n} must be an object')
+        if not isinstance(item.get('product_id'), int) or isinstance(item['product_id'], bool):
+            raise CheckoutError(f'Line {n}: product_id must be a whole number')
+        if not isinstance(item.get('quantity'), int) or isinstance(item['quantity'], bool):
+            raise CheckoutError(f'Line {n}: quantity must be a whole number')
+        if item['quantity'] <= 0:
+            raise CheckoutError('Quantity must be positive')
+        for field in ('price', 'subtotal'):
+            if not _is_number(item.get(field)):
+                raise CheckoutError(f'Line {n}: {field} must be a number')
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return items, quantities
+
+
+def _sell(data, bill_number=None, allow_shortfall=False):
+    """Add a bill for a checkout payload to the session without committing.
+
+    Returns (bill, cost of goods sold, shortfalls); raises CheckoutError when
+    the cart can't be sold. Stock is taken by appending pending sale movements
+    dated at the bill; the product rows are locked and read, not updated (see
+    stock_ledger.py).
+
+    With allow_shortfall the bill is saved even if it sells more than the
+    recorded stock, which goes negative: a till that queued the sale offline
+    has already handed the goods over. Each shortfall, a
+    {'product_id', 'name', 'quantity'} dict, is also noted on the sale's stock
+    movement so it can be reviewed.
+    """
+    items, quantities = _cart(data)
+    date = _sale_date(data.get('date'))
+    bill_number = bill_number or bill_numbers.next_number(store_calendar.business_day(date))
+
+    # Lock every cart product in one query. Locking in id order means two tills
+    # selling overlapping carts queue behind each other instead of deadlocking.
+    # What is on hand includes sales not yet folded into stock_quantity, this
+    # batch's earlier bills among them.
+    products = lock_products(list(quantities))
+    pending = pending_stock(list(products))
+
+    shortfalls = {}
+    for product_id, qty in quantities.items():
+        product = products.get(product_id)
+        if not product:
+            continue
+        available = product.stock_quantity + pending.get(product_id, 0)
+        if available < qty:
+            if not allow_shortfall:
+                raise CheckoutError(f'Insufficient stock for {product.name}')
+            shortfalls[product_id] = qty - max(available, 0)
+
+    new_bill = Bill(
+        bill_number=bill_number,
+        client_ref=_client_ref(data),
+        customer_name=data.get('customer_name', 'Walk-in'),
+        subtotal=data.get('subtotal', 0),
+        tax_amount=data.get('tax_amount', 0),
+        discount_amount=data.get('discount_amount', 0),
+        total_amount=data.get('total_amount'),
+        payment_mode=data.get('payment_mode', 'Cash'),
+        date=date
+    )
+    db.session.add(new_bill)
+    db.session.flush()
+
+    lines = []
+    cogs = 0
+    for item in items:
+        product = products.get(item['product_id'])
+        if product:
+            cogs += product.cost_price * item['quantity']
+            lines.append({
+                'bill_id': new_bill.id,
+                'product_id': product.id,
+                'quantity': item['quantity'],
+                'price_at_sale': item['price'],
+                'subtotal': item['subtotal'],
+                'cost_at_sale': product.cost_price,
+                'product_name': product.name,
+                'category': product.category
+            })
+    if lines:
+        db.session.execute(db.insert(BillItem), lines)
+
+    record_movements([movement(pid, -qty, 'sale', new_bill.id,
+                               f'Sold {shortfalls[pid]} beyond recorded stock' if pid in shortfalls else None,
+                               at=date, pending=True)
+                      for pid, qty in quantities.items() if pid in products])
+    short = [{'product_id': pid, 'name': products[pid].name, 'quantity': n} for pid, n in shortfalls.items()]
+    return new_bill, cogs, short
+
+
+def save_bill(data):
+    """Create and commit a bill from a checkout payload; returns the Bill.
+
+    A payload whose client_ref was already saved, by an earlier attempt or a
+    concurrent one, returns that bill instead of selling again. Raises
+    CheckoutError (after rolling back) when the cart can't be sold.
+    """
+    ref = _client_ref(data)
+    existing = Bill.query.filter_by(client_ref=ref).first() if ref else None
+    if existing:
+        return existing
+    try:
+        bill, cogs, _ = _sell(data)
+        record_bill(bill, cogs)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Lost a race with a resend of the same sale, which has committed by now
+        existing = Bill.query.filter_by(client_ref=ref).first() if ref else None
+        if existing:
+            return existing
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+    analytics_cache.invalidate([store_calendar.business_day(bill.date)])
+    product_cache.invalidate(stock_folder.after_sale())
+    return bill
+
+
+def save_bills(payloads):
+    """Save a batch of queued bills in one transaction, idempotently by client_ref.
+
+    Each bill runs in its own savepoint, so one that can't be sold is rolled
+    back alone, and the batch pays for a single commit and one rollup upsert
+    per sale day. Bills whose client_ref
+    was already saved (an earlier sync whose response was lost, say) are
+    reported as duplicates instead of being sold twice. A bill marked
+    'offline' was sold while the till couldn't reach the server and the goods
+    are gone, so it is saved even when stock runs short; its result lists the
+    shortfalls under 'short'. Returns one result dict per payload, in order.
+    """
+    # A payload that isn't an object, or whose client_ref isn't a short string, is reported as missing its client_ref
+    payloads = [p if isinstance(p, dict) and _valid_ref(p) else {} for p in payloads]
+    refs = [p.get('client_ref') for p in payloads if p.get('client_ref')]
+    existing = {b.client_ref: b for b in Bill.query.filter(Bill.client_ref.in_(refs))} if refs else {}
+
+    # Take numbers for the whole batch up front: reserving a block later would
+    # need a second connection while this transaction holds its write locks
+    wanted = {}
+    seen = set(existing)
+    for payload in payloads:
+        ref = payload.get('client_ref')
+        if ref and ref not in seen:
+            seen.add(ref)
+            try:
+                day = store_calendar.business_day(_sale_date(payload.get('date')))
+            except CheckoutError:
+                continue
+            wanted.setdefault(day, []).append(ref)
+    numbers = {}
+    for day, day_refs in wanted.items():
+        numbers.update(zip(day_refs, bill_numbers.take(day, len(day_refs))))
+
+    results = []
+    created = []
+    days = {}
+    for payload in payloads:
+        ref = payload.get('client_ref')
+        if not ref:
+            results.append({'client_ref': None, 'status': 'error', 'error': 'client_ref is required'})
+            continue
+        if ref in existing:
+            results.append({'status': 'duplicate', **bill_result(existing[ref])})
+            continue
+        try:
+            # Each bill repeats the same statements by design; only repeats within one are an N+1
+            with metrics.unit_of_work(), db.session.begin_nested():
+                bill, cogs, short = _sell(payload, numbers.get(ref), allow_shortfall=payload.get('offline') is True)
+        except CheckoutError as e:
+            results.append({'client_ref': ref, 'status': 'error', 'error': e.message, 'retry': False})
+            continue
+        except IntegrityError as e:
+            # Another request may have saved the same client_ref after our lookup;
+            # any other constraint failure would fail again
+            duplicate = _saved_bill(ref)
+            if duplicate:
+                existing[ref] = duplicate
+                results.append({'status': 'duplicate', **bill_result(duplicate)})
+            else:
+                results.append({'client_ref': ref, 'status': 'error', 'error': str(e.orig), 'retry': False})
+            continue
+        except OperationalError as e:
+            # Lock timeout, deadlock or lost connection: worth sending again
+            results.append({'client_ref': ref, 'status': 'error', 'error': str(e.orig), 'retry': True})
+            continue
+        except Exception as e:
+            results.append({'client_ref': ref, 'status': 'error', 'error': str(e), 'retry': False})
+            continue
+        existing[ref] = bill
+        day = days.setdefault(store_calendar.business_day(bill.date), {'sales': 0.0, 'cogs': 0.0, 'bill_count': 0})
+        day['sales'] += bill.total_amount or 0.0
+        day['cogs'] += cogs
+        day['bill_count'] += 1
+        created.append(len(results))
+        results.append({'status': 'created', **bill_result(bill)})
+        if short:
+            results[-1]['short'] = short
+
+    try:
+        for day, totals in days.items():
+            add_to_summary(day, **totals)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for i in created:
+            results[i] = {'client_ref': results[i]['client_ref'], 'status': 'error', 'error': str(e), 'retry': True}
+        return results
+    for result in results:
+        if result.get('short'):
+            logger.warning('Bill %s sold beyond recorded stock: %s', result['bill_number'],
+                           ', '.join(f"{s['quantity']} x {s['name']}" for s in result['short']))
+    analytics_cache.invalidate(days)
+    product_cache.invalidate(stock_folder.after_sale())
+    return results
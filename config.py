@@ -2,10 +2,71 @@ import os
 
 class Config:
     # Database Configuration
-    # Replace 'root', 'password', 'localhost', 'grocery_billing_db' with your actual credentials
+    # Set DATABASE_URL, or replace 'root', 'password', 'localhost', 'grocery_billing_db' with your actual credentials
     # For now, we assume a standard local MySQL setup: user='root', password='', db='grocery_billing_db'
-    # NOTE: You must create the database `grocery_billing_db` in MySQL manually before running the app.
-    SQLALCHEMY_DATABASE_URI = 'mysql+mysqlconnector://root:@localhost/grocery_billing_db'
-    
+    # NOTE: Create the database and tables with `flask --app app init-db` before running the app.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'mysql+mysqlconnector://root:@localhost/grocery_billing_db')
+
+    # Connection pool, per worker process. Keep DB_POOL_SIZE + DB_MAX_OVERFLOW times the
+    # number of workers under MySQL's max_connections, and DB_POOL_RECYCLE under its wait_timeout.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = os.urandom(24)
+    # Set SECRET_KEY when running several workers, or each one signs sessions with its own key
+    SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(24)
+
+    # Barcode lookup cache (per worker). Size 0 disables it.
+    CATALOG_CACHE_SIZE = 10000
+    CATALOG_CACHE_TTL = 60  # seconds; bounds staleness across workers
+
+    # Product search index (per worker), fully rebuilt after this many seconds
+    SEARCH_INDEX_TTL = 300
+
+    # Shop settings cache (per worker)
+    SETTINGS_CACHE_TTL = 60
+
+    # Business days: which calendar day a sale belongs to in reports, the dashboard and
+    # bill numbers. STORE_TIMEZONE is an IANA name (default: the server's local time, which
+    # is what bill timestamps are stored in); BUSINESS_DAY_START lets late-night sales
+    # count towards the evening before, e.g. '04:00'.
+    STORE_TIMEZONE = os.environ.get('STORE_TIMEZONE')
+    BUSINESS_DAY_START = os.environ.get('BUSINESS_DAY_START', '00:00')
+
+    # Bill numbers look like S1-20261018-000042: store code, sale day, sequence.
+    # Each worker reserves this many numbers per round-trip; unused ones are skipped on restart.
+    BILL_STORE_CODE = os.environ.get('BILL_STORE_CODE', 'S1')
+    BILL_NUMBER_BLOCK_SIZE = 50
+
+    # Sales are appended to the stock ledger and added into products.stock_quantity at most
+    # this often (seconds) per worker; stock lists and barcode lookups trail sales by as much
+    STOCK_FOLD_INTERVAL = int(os.environ.get('STOCK_FOLD_INTERVAL', 5))
+
+    # Request instrumentation, served at /metrics (per worker)
+    METRICS_ENABLED = True
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 100))
+    # Log a request as a likely N+1 when one statement repeats this many times in it
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+    # Add Server-Timing and X-Query-Count headers to every response
+    METRICS_DEBUG_HEADER = os.environ.get('METRICS_DEBUG_HEADER', '') == '1'
+
+    # Analytics cache (per worker), invalidated by this worker's sales and expenses. Other
+    # workers' show up after ANALYTICS_CACHE_TTL seconds for periods including today, and
+    # after ANALYTICS_HISTORY_TTL for older ones (offline backlogs, summary rebuilds).
+    ANALYTICS_CACHE_SIZE = 20000
+    ANALYTICS_CACHE_TTL = 30
+    ANALYTICS_HISTORY_TTL = 3600
+
+    # Background jobs (jobs.py): threads per worker process, how long a finished job's result
+    # is kept and handed to identical requests, and how long a job may go without progress
+    # before it is presumed lost with its worker. Export files are written to JOB_RESULTS_DIR
+    # (default: the instance folder); point every worker at the same one.
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+    JOB_STALE_AFTER = 900
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR')
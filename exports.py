@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from datetime import datetime
+from models import db, Bill, BillItem, Expense
+from pagination import keyset_batches
+from store_calendar import store_calendar
+
+FORMATS = ('csv', 'jsonl')
+# Rows fetched per query, and rows per chunk written out
+BATCH_SIZE = 1000
+
+EXPORTS = {
+    'bills': (Bill.date, [
+        Bill.id, Bill.bill_number, Bill.date, Bill.customer_name, Bill.subtotal, Bill.tax_amount,
+        Bill.discount_amount, Bill.total_amount, Bill.payment_mode
+    ]),
+    'bill_items': (Bill.date, [
+        BillItem.id, BillItem.bill_id, Bill.bill_number, Bill.date, BillItem.product_id,
+        BillItem.product_name, BillItem.category, BillItem.quantity, BillItem.price_at_sale,
+        BillItem.cost_at_sale, BillItem.subtotal
+    ]),
+    'expenses': (Expense.date, [
+        Expense.id, Expense.date, Expense.description, Expense.category, Expense.amount
+    ]),
+}
+
+
+def _export_stmt(kind, start, end, *select):
+    date_col = EXPORTS[kind][0]
+    stmt = db.select(*select)
+    if kind == 'bill_items':
+        stmt = stmt.select_from(BillItem).join(Bill, Bill.id == BillItem.bill_id)
+    return store_calendar.filter(stmt, date_col, start, end)
+
+
+def export_rows(kind, start=None, end=None, after=None, limit=None):
+    """Stream (column names, row iterator) for an export; rows are plain tuples.
+
+    Selects columns rather than ORM objects, so nothing is lazy-loaded, and
+    reads BATCH_SIZE rows per query, seeking past the last id, so memory stays
+    flat however many rows match. Rows come in id order; `after` and `limit`
+    read one page of them.
+    """
+    columns = EXPORTS[kind][1]
+    names = [col.key for col in columns]
+    if kind == 'bill_items':
+        names[names.index('date')] = 'bill_date'
+    rows = keyset_batches(_export_stmt(kind, start, end, *columns), columns[0], BATCH_SIZE, after, limit)
+    return names, rows
+
+
+def export_count(kind, start=None, end=None):
+    return db.session.execute(_export_stmt(kind, start, end, db.func.count())).scalar()
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def write_csv(names, rows, header=True):
+    """Yield CSV text in chunks of BATCH_SIZE rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(names)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_value(v) for v in row])
+        if i % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_jsonl(names, rows, header=True):
+    """Yield one JSON object per line, in chunks of BATCH_SIZE rows; there is no header line."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, (_value(v) for v in row)))))
+        if len(lines) == BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def generate_export(kind, fmt='csv', start=None, end=None):
+    names, rows = export_rows(kind, start, end)
+    writer = write_jsonl if fmt == 'jsonl' else write_csv
+    return writer(names, rows)
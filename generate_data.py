@@ -0,0 +1,257 @@
+"""Synthetic dataset generator for load tests and benchmarks.
+
+Bulk-inserts products, bills with their line items, and expenses with
+executemany on the raw DB-API connection, committing every --chunk bills, so
+large volumes load quickly on SQLite or a local MySQL:
+
+    python generate_data.py --db sqlite:///load.db --products 50000 --bills 1000000 --expenses 100000
+    python generate_data.py --db mysql+mysqlconnector://root:@localhost/load --bills 20000
+
+--db is required and may not be the database the app is configured with, so
+synthetic data never lands in the shop's own records.
+
+Bills average (1 + --max-lines) / 2 lines, so the defaults give about 5M
+bill_items for 1M bills. The same --seed produces the same rows. Data is
+appended: barcodes continue the GEN range and bills take real numbers from
+bill_sequences, so the app keeps selling on top of a generated database. The
+daily summary is rebuilt for the generated days at the end.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+
+NAME_WORDS = ['organic', 'fresh', 'whole', 'milk', 'bread', 'brown', 'rice', 'basmati', 'apple', 'juice',
+              'green', 'tea', 'coffee', 'chocolate', 'biscuit', 'butter', 'cheese', 'yogurt', 'tomato',
+              'sauce', 'pasta', 'olive', 'oil', 'sugar', 'salt', 'honey', 'oats', 'corn', 'flakes', 'soap']
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sa', 'bel', 'qui', 'nor', 'da', 'fi', 'zen', 'pu', 'gra']
+
+CATEGORIES = ['Dairy', 'Bakery', 'Fruits', 'Vegetables', 'Grains', 'Beverages', 'Snacks', 'Household',
+              'Personal Care', 'Frozen', 'Meat', 'Spices']
+PAYMENT_MODES = ['Cash', 'Card', 'UPI']
+CUSTOMERS = ['Asha Rao', 'Ben Okafor', 'Chen Li', 'Dana Cruz', 'Eli Haddad', 'Farah Khan', 'Gus Moreno']
+EXPENSE_CATEGORIES = ['Operational', 'Stock', 'Salary', 'Other']
+
+
+def scratch_db(url):
+    """`url`, provided it names a database other than the one the app is configured with; exits otherwise."""
+    from sqlalchemy.engine import make_url
+
+    def identity(value):
+        u = make_url(value)
+        return u.get_backend_name(), u.host, u.port, u.database
+
+    if not url:
+        raise SystemExit('--db is required: give a scratch database, e.g. --db sqlite:///load.db')
+    if identity(url) == identity(Config.SQLALCHEMY_DATABASE_URI):
+        raise SystemExit('--db is the database the app is configured with; give a scratch database instead')
+    return url
+
+
+def product_name(i):
+    # Brand + 1-2 generic words + pack size, e.g. "Ravenmi Basmati Rice 500g"
+    rng = random.Random(i)
+    brand = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    words = ' '.join(rng.sample(NAME_WORDS, rng.randint(1, 2)))
+    return f'{brand} {words}'.title() + f' {rng.choice([100, 250, 500, 1000])}g'
+
+
+class BulkWriter:
+    """executemany straight on a DB-API connection, skipping the ORM and Core
+    per-row overhead that dominates at millions of rows."""
+
+    def __init__(self, engine):
+        self.raw = engine.raw_connection()
+        self.cursor = self.raw.cursor()
+        self.mark = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+        # sqlite3's built-in datetime adapter is deprecated; store the text SQLAlchemy would
+        self.sqlite = engine.dialect.name == 'sqlite'
+        if self.sqlite:
+            # A throwaway bulk load: a bigger page cache keeps the indexes in
+            # memory, and there is no point syncing every chunk to disk
+            self.cursor.execute('PRAGMA cache_size = -262144')
+            self.cursor.execute('PRAGMA synchronous = OFF')
+
+    def datetime(self, value):
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f') if self.sqlite else value
+
+    def insert(self, table, columns, rows):
+        if rows:
+            marks = ', '.join([self.mark] * len(columns))
+            self.cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows)
+
+    def scalar(self, sql):
+        self.cursor.execute(sql)
+        return self.cursor.fetchone()[0]
+
+    def commit(self):
+        self.raw.commit()
+
+    def close(self):
+        self.cursor.close()
+        self.raw.close()
+
+
+def generate_products(writer, n, rng, chunk=10000):
+    """Insert `n` products with barcodes GEN00000000, GEN00000001, ... after any already generated.
+
+    Each gets an opening restock in the stock ledger, so `flask check-stock` agrees with it.
+    """
+    first = writer.scalar("SELECT COUNT(*) FROM products WHERE barcode LIKE 'GEN%'")
+    next_id = (writer.scalar("SELECT MAX(id) FROM products") or 0) + 1
+    opened = writer.datetime(datetime.now().replace(microsecond=0))
+    for start in range(first, first + n, chunk):
+        rows, moves = [], []
+        for i in range(start, min(start + chunk, first + n)):
+            cost = round(rng.uniform(0.5, 30), 2)
+            # A few percent start low on stock so the low-stock alerts have something to show
+            stock = rng.randint(0, 4) if rng.random() < 0.03 else rng.randint(50, 5000)
+            rows.append((next_id, product_name(i), f'GEN{i:08d}', round(cost * rng.uniform(1.1, 1.6), 2), cost,
+                         stock, CATEGORIES[i % len(CATEGORIES)]))
+            if stock:
+                moves.append((next_id, 'restock', stock, 'Generated', opened, opened, False))
+            next_id += 1
+        writer.insert('products', ('id', 'name', 'barcode', 'price', 'cost_price', 'stock_quantity', 'category'), rows)
+        writer.insert('stock_movements', ('product_id', 'kind', 'quantity', 'note', 'created_at', 'occurred_at', 'pending'),
+                      moves)
+        writer.commit()
+
+
+def generate_bills(writer, n, days, max_lines, rng, chunk=10000):
+    """Insert `n` bills spread over the last `days` business days, oldest first, with 1..max_lines items each.
+
+    Popular products sell more often (weights fall off with catalog position),
+    weekends are busier, and bill ids increase with the sale time as they do
+    in production.
+    """
+    from models import db, Product
+    from bill_numbers import bill_numbers
+    from store_calendar import store_calendar
+
+    products = db.session.execute(
+        db.select(Product.id, Product.price, Product.cost_price, Product.name, Product.category).order_by(Product.id)
+    ).all()
+    if not products:
+        raise SystemExit('No products to sell; generate some with --products')
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(products)):
+        total += 1.0 / (rank + 1) ** 0.8
+        cum_weights.append(total)
+
+    now = datetime.now()
+    today = store_calendar.today()
+    calendar = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    weights = [1.5 if day.weekday() >= 5 else 1.0 for day in calendar]
+    per_day = [0] * days
+    for i in rng.choices(range(days), weights, k=n):
+        per_day[i] += 1
+
+    next_id = (writer.scalar("SELECT MAX(id) FROM bills") or 0) + 1
+    bills, items = [], []
+    for day, count in zip(calendar, per_day):
+        if not count:
+            continue
+        start = store_calendar.start_of(day)
+        span = min(86400, (now - start).total_seconds()) if day == today else 86400
+        moments = sorted(start + timedelta(seconds=rng.uniform(0, span)) for _ in range(count))
+        for moment, number in zip(moments, bill_numbers.take(day, count)):
+            subtotal = 0.0
+            for product_id, price, cost, name, category in rng.choices(
+                    products, cum_weights=cum_weights, k=rng.randint(1, max_lines)):
+                qty = 1 + int(rng.random() * 3)
+                line = round(price * qty, 2)
+                subtotal += line
+                items.append((next_id, product_id, qty, price, line, cost, name, category))
+            customer = rng.choice(CUSTOMERS) if rng.random() < 0.1 else 'Walk-in'
+            subtotal = round(subtotal, 2)
+            bills.append((next_id, number, writer.datetime(moment), customer, subtotal, 0.0, 0.0, subtotal,
+                          rng.choice(PAYMENT_MODES)))
+            next_id += 1
+            if len(bills) >= chunk:
+                _flush_bills(writer, bills, items)
+                bills, items = [], []
+    _flush_bills(writer, bills, items)
+
+
+def _flush_bills(writer, bills, items):
+    writer.insert('bills', ('id', 'bill_number', 'date', 'customer_name', 'subtotal', 'tax_amount',
+                            'discount_amount', 'total_amount', 'payment_mode'), bills)
+    writer.insert('bill_items', ('bill_id', 'product_id', 'quantity', 'price_at_sale', 'subtotal',
+                                 'cost_at_sale', 'product_name', 'category'), items)
+    writer.commit()
+
+
+def generate_expenses(writer, n, days, rng, chunk=10000):
+    now = datetime.now()
+    for start in range(0, n, chunk):
+        rows = [(f'Expense {i}', round(rng.uniform(5, 500), 2), rng.choice(EXPENSE_CATEGORIES),
+                 writer.datetime(now - timedelta(seconds=rng.uniform(0, days * 86400))))
+                for i in range(start, min(start + chunk, n))]
+        writer.insert('expenses', ('description', 'amount', 'category', 'date'), rows)
+        writer.commit()
+
+
+def generate(products=0, bills=0, expenses=0, days=365, max_lines=9, seed=42, chunk=10000, echo=print):
+    """Append synthetic data inside an app context; returns seconds taken per table."""
+    from models import db
+    from rollups import rebuild_daily_summary
+    from store_calendar import store_calendar
+
+    rng = random.Random(seed)
+    timings = {}
+    writer = BulkWriter(db.engine)
+    try:
+        for label, count, fn in (
+            ('products', products, lambda: generate_products(writer, products, rng, chunk)),
+            ('bills', bills, lambda: generate_bills(writer, bills, days, max_lines, rng, chunk)),
+            ('expenses', expenses, lambda: generate_expenses(writer, expenses, days, rng, chunk)),
+        ):
+            if not count:
+                continue
+            start = time.perf_counter()
+            fn()
+            timings[label] = time.perf_counter() - start
+            echo(f"  {label:<10} {count:>10} rows in {timings[label]:>7.1f} s ({count / timings[label]:,.0f}/s)")
+    finally:
+        writer.close()
+
+    if bills or expenses:
+        start = time.perf_counter()
+        today = store_calendar.today()
+        rebuild_daily_summary(today - timedelta(days=days), today)
+        timings['daily_summary'] = time.perf_counter() - start
+        echo(f"  daily_summary rebuilt in {timings['daily_summary']:.1f} s")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True,
+                        help='SQLAlchemy URL of a scratch database (not the one the app is configured with)')
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--bills', type=int, default=1000000)
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=365, help='Spread bills and expenses over this many days')
+    parser.add_argument('--max-lines', type=int, default=9, help='Most line items on one bill')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk', type=int, default=10000, help='Rows per executemany/commit')
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = scratch_db(args.db)
+    from app import create_app
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f"Generating into {db.engine.url.render_as_string()}:")
+        start = time.perf_counter()
+        generate(args.products, args.bills, args.expenses, args.days, args.max_lines, args.seed, args.chunk)
+        print(f"Done in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Request latency buckets in seconds, and queries-per-request buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+# Distinct slow statements kept as metric series
+MAX_FINGERPRINTS = 200
+
+_NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)')
+
+
+def fingerprint(statement):
+    """SQL with literals and expanded IN lists collapsed, so repeats of one query compare equal."""
+    sql = _STRING.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?)', sql)
+    return ' '.join(sql.split())
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class RequestMetrics:
+    """Per-route latency, query counts, DB time and slow queries for this worker.
+
+    Hooks every SQLAlchemy engine's cursor events and Flask's request signals.
+    Statements run inside a request are attributed to its endpoint; a statement
+    slower than SLOW_QUERY_MS is logged (with its fingerprint) wherever it runs.
+    When one fingerprint runs N_PLUS_ONE_THRESHOLD or more times in a request
+    (or in one unit_of_work() block), the endpoint is logged as a likely N+1. Figures are per process, like the
+    caches, so scrape each worker (or sum them) to see the whole server.
+    """
+
+    def __init__(self, slow_query_ms=100, n_plus_one_threshold=10, debug_header=False):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.debug_header = debug_header
+        self._lock = threading.Lock()
+        self._latency = {}       # (endpoint, method) -> Histogram
+        self._queries = {}       # endpoint -> Histogram
+        self._requests = Counter()   # (endpoint, method, status)
+        self._db_seconds = Counter()  # endpoint
+        self._n_plus_one = Counter()  # endpoint
+        self._slow = Counter()        # fingerprint -> count
+        self._slow_seconds = Counter()
+        self._hooked = False
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.debug_header = app.config.get('METRICS_DEBUG_HEADER', self.debug_header)
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        if not self._hooked:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+            self._hooked = True
+
+    # -- hooks ----------------------------------------------------------------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        in_request = has_request_context() and 'metrics' in g
+        if in_request:
+            stats = g.metrics
+            stats['queries'] += 1
+            stats['db_seconds'] += elapsed
+        if not in_request and elapsed * 1000 < self.slow_query_ms:
+            return
+        fp = fingerprint(statement)
+        if in_request:
+            stats['fingerprints'][fp] += 1
+        if elapsed * 1000 >= self.slow_query_ms:
+            endpoint = request.endpoint if has_request_context() else None
+            logger.warning("Slow query (%.0f ms) in %s: %s", elapsed * 1000, endpoint or '-', fp)
+            with self._lock:
+                if fp in self._slow or len(self._slow) < MAX_FINGERPRINTS:
+                    self._slow[fp] += 1
+                    self._slow_seconds[fp] += elapsed
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its start
+        # time, or the pooled connection's list would grow with every error
+        conn = context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    def _request_started(self, sender, **extra):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'fingerprints': Counter(),
+                     'repeated': []}
+
+    def _request_finished(self, sender, response, **extra):
+        stats = g.get('metrics')
+        if stats is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        method, status = request.method, response.status_code
+        if response.is_streamed:
+            # The body (an export, say) runs its queries after this signal, still
+            # attributed through g.metrics; record the request once it has been sent
+            response.call_on_close(lambda: self._record(stats, endpoint, method, status))
+            return
+        g.pop('metrics')
+        elapsed = self._record(stats, endpoint, method, status)
+        if self.debug_header:
+            # Shows up in the browser's network panel under Timing
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats["db_seconds"] * 1000:.1f};desc="{stats["queries"]} queries", '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+            response.headers['X-Query-Count'] = str(stats['queries'])
+
+    def _record(self, stats, endpoint, method, status):
+        elapsed = time.perf_counter() - stats['start']
+        repeated = stats['repeated'] + self._repeated(stats['fingerprints'])
+        with self._lock:
+            self._latency.setdefault((endpoint, method), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self._queries.setdefault(endpoint, Histogram(QUERY_BUCKETS)).observe(stats['queries'])
+            self._requests[(endpoint, method, status)] += 1
+            self._db_seconds[endpoint] += stats['db_seconds']
+            if repeated:
+                self._n_plus_one[endpoint] += 1
+        for n, fp in repeated:
+            logger.warning("Possible N+1 in %s: %d x %s", endpoint, n, fp)
+        return elapsed
+
+    def _repeated(self, fingerprints):
+        return [(n, fp) for fp, n in fingerprints.items() if n >= self.n_plus_one_threshold]
+
+    @contextmanager
+    def unit_of_work(self):
+        """Check for N+1 within this block rather than across the whole request.
+
+        For endpoints that run the same statements once per item by design,
+        like a batch of bills: wrap each item, and only a statement repeated
+        within one item counts.
+        """
+        stats = g.get('metrics') if has_request_context() else None
+        if stats is None:
+            yield
+            return
+        outer = stats['fingerprints']
+        stats['fingerprints'] = Counter()
+        try:
+            yield
+        finally:
+            stats['repeated'] += self._repeated(stats['fingerprints'])
+            stats['fingerprints'] = outer
+
+    # -- exposition -----------------------------------------------------------
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, labels, hist):
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.total}')
+            lines.append(f'{name}_sum{{{labels}}} {hist.sum:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {hist.total}')
+
+        with self._lock:
+            header('http_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+            for (endpoint, method), hist in sorted(self._latency.items()):
+                histogram('http_request_duration_seconds', f'endpoint="{endpoint}",method="{method}"', hist)
+
+            header('http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+            for (endpoint, method, status), n in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {n}')
+
+            header('db_queries_per_request', 'histogram', 'SQL statements executed per request.')
+            for endpoint, hist in sorted(self._queries.items()):
+                histogram('db_queries_per_request', f'endpoint="{endpoint}"', hist)
+
+            header('db_time_seconds_total', 'counter', 'Time spent in SQL statements by endpoint.')
+            for endpoint, seconds in sorted(self._db_seconds.items()):
+                lines.append(f'db_time_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+
+            header('db_n_plus_one_requests_total', 'counter',
+                   'Requests that repeated one statement at least N_PLUS_ONE_THRESHOLD times.')
+            for endpoint, n in sorted(self._n_plus_one.items()):
+                lines.append(f'db_n_plus_one_requests_total{{endpoint="{endpoint}"}} {n}')
+
+            header('db_slow_queries_total', 'counter', f'Statements slower than {self.slow_query_ms} ms, by fingerprint.')
+            for fp, n in self._slow.most_common():
+                lines.append(f'db_slow_queries_total{{{_statement_labels(fp)}}} {n}')
+            header('db_slow_query_seconds_total', 'counter', 'Time spent in slow statements, by fingerprint.')
+            for fp, seconds in self._slow_seconds.most_common():
+                lines.append(f'db_slow_query_seconds_total{{{_statement_labels(fp)}}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _statement_labels(fp, limit=300):
+    # The id keeps series distinct when two long statements share a truncated prefix
+    fp_id = hashlib.sha1(fp.encode()).hexdigest()[:12]
+    text = fp if len(fp) <= limit else fp[:limit] + '...'
+    text = text.replace('\\', '\\\\').replace('"', '\\"')
+    return f'fingerprint="{fp_id}",statement="{text}"'
+
+
+metrics = RequestMetrics()
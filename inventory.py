@@ -0,0 +1,124 @@
+from models import db, Product
+
+# Stock below this counts as low on the dashboard and inventory page
+LOW_STOCK_THRESHOLD = 5
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _margin():
+    # Same rule as Product.margin, in SQL so the table can sort on it
+    return db.case(
+        (Product.cost_price > 0, (Product.price - Product.cost_price) * 100 / Product.cost_price),
+        (Product.price > 0, 100.0),
+        else_=0.0
+    )
+
+
+SORTS = {
+    'name': Product.name,
+    'barcode': Product.barcode,
+    'category': Product.category,
+    'cost_price': Product.cost_price,
+    'price': Product.price,
+    'stock': Product.stock_quantity,
+    'profit': Product.price - Product.cost_price,
+    'margin': _margin(),
+    'value': Product.cost_price * Product.stock_quantity,
+}
+
+
+def low_stock_filter():
+    """Indexed range predicate (ix_products_stock_quantity) for low-stock products."""
+    return Product.stock_quantity < LOW_STOCK_THRESHOLD
+
+
+def low_stock_count():
+    return db.session.query(db.func.count(Product.id)).filter(low_stock_filter()).scalar()
+
+
+def filtered_products(args):
+    """Product query with the inventory filters from request args applied.
+
+    `category` may repeat; `q` is a name prefix, so ix_products_name serves it;
+    `low_stock=1` keeps products under LOW_STOCK_THRESHOLD.
+    """
+    query = db.session.query(Product)
+    categories = [c for c in args.getlist('category') if c]
+    if categories:
+        query = query.filter(Product.category.in_(categories))
+    if args.get('q'):
+        query = query.filter(Product.name.startswith(args['q'], autoescape=True))
+    if args.get('low_stock') in ('1', 'true'):
+        query = query.filter(low_stock_filter())
+    return query
+
+
+def inventory_page(args):
+    """One page of the inventory table as a dict: rows plus, on the first page, the total row count.
+
+    Pages by offset rather than keyset because the table is virtualized and
+    the client jumps straight to whichever rows the scrollbar lands on. Sorting
+    on name (optionally within a category) or stock walks an index; the id
+    tiebreaker keeps pages stable when sort values repeat.
+    """
+    sort = args.get('sort', 'name')
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+    descending = args.get('order') == 'desc'
+    try:
+        offset = max(0, int(args.get('offset') or 0))
+        limit = max(1, min(int(args.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('offset and limit must be integers')
+
+    query = filtered_products(args)
+    column = SORTS[sort]
+    order = [column.desc(), Product.id.desc()] if descending else [column, Product.id]
+    rows = (query.with_entities(Product, (Product.price - Product.cost_price).label('profit'),
+                                _margin().label('margin'))
+            .order_by(*order).offset(offset).limit(limit).all())
+
+    result = {
+        'offset': offset,
+        'limit': limit,
+        'items': [{**product.to_dict(), 'profit': profit, 'margin': margin,
+                   'cost_value': product.cost_price * product.stock_quantity,
+                   'sell_value': product.price * product.stock_quantity}
+                  for product, profit, margin in rows],
+    }
+    # The client sizes its scrollbar from the first page and keeps the figure
+    if offset == 0:
+        result['total'] = query.order_by(None).with_entities(db.func.count(Product.id)).scalar()
+    return result
+
+
+def inventory_summary(args):
+    """Stock value and low-stock counts for the filtered catalog, aggregated in SQL."""
+    query = filtered_products(args)
+    products, units, cost_value, sell_value = query.with_entities(
+        db.func.count(Product.id),
+        db.func.coalesce(db.func.sum(Product.stock_quantity), 0),
+        db.func.coalesce(db.func.sum(Product.cost_price * Product.stock_quantity), 0.0),
+        db.func.coalesce(db.func.sum(Product.price * Product.stock_quantity), 0.0),
+    ).one()
+    low_by_category = (
+        query.filter(low_stock_filter())
+        .with_entities(Product.category, db.func.count(Product.id))
+        .group_by(Product.category).order_by(Product.category).all()
+    )
+    # Every category, not just the filtered ones, for the filter dropdown
+    categories = (
+        db.session.query(Product.category, db.func.count(Product.id))
+        .group_by(Product.category).order_by(Product.category).all()
+    )
+    return {
+        'products': products,
+        'stock_units': units,
+        'cost_value': cost_value,
+        'sell_value': sell_value,
+        'low_stock_threshold': LOW_STOCK_THRESHOLD,
+        'low_stock': sum(n for _, n in low_by_category),
+        'low_stock_by_category': [{'category': c, 'products': n} for c, n in low_by_category],
+        'categories': [{'category': c, 'products': n} for c, n in categories],
+    }
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from flask import current_app
+from models import db, Bill, Expense, Job
+from exports import EXPORTS, FORMATS as EXPORT_FORMATS, export_count, export_rows, write_csv, write_jsonl
+from reports import GROUPINGS, combine, profit_report, report_json
+from rollups import rebuild_daily_summary
+from store_calendar import store_calendar
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+# A task's progress is written, and its cancel flag read, at most this often (seconds)
+PROGRESS_INTERVAL = 1.0
+# How often a worker clears out expired jobs while accepting new ones (seconds)
+PURGE_INTERVAL = 300
+# Rows an export job reads per query; progress is reported between pages
+EXPORT_PAGE_SIZE = 20000
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """A running job as its task sees it: where to write a result file, and progress()."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self.result_path = None
+        self._reported_at = 0.0
+
+    def output_path(self, extension):
+        os.makedirs(self.runner.results_dir, exist_ok=True)
+        self.result_path = os.path.join(self.runner.results_dir, f'{self.job_id}.{extension}')
+        return self.result_path
+
+    def progress(self, done, total, message=None):
+        """Record `done` of `total`; raises JobCancelled if the job has been cancelled.
+
+        Call it between units of work with nothing uncommitted, so stopping
+        there leaves the database consistent.
+        """
+        now = time.monotonic()
+        if now - self._reported_at < PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        fraction = min(done / total, 1.0) if total else 0.0
+        if not self.runner._update(self.job_id, ('running',), live=True, progress=fraction,
+                                   message=message, updated_at=datetime.now()):
+            raise JobCancelled()
+
+
+class JobRunner:
+    """Background jobs for work too slow for a request: long reports, rollup rebuilds, exports.
+
+    Jobs are rows in the jobs table, so whichever worker a poll lands on can
+    report a job's progress, serve its result or cancel it, and no broker is
+    needed. The worker that accepted a job runs it on its own small thread
+    pool, leaving request threads free for the tills. A task reports progress
+    through its JobContext, which is also where it finds out it was cancelled.
+
+    Identical submissions (same kind and parameters) share a queued or running
+    job, and a finished one's result until it expires after `result_ttl`
+    seconds. A job that makes no progress for `stale_after` seconds is presumed
+    lost with its worker and marked failed.
+    """
+
+    def __init__(self, workers=2, result_ttl=3600, stale_after=900, results_dir='jobs'):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self.results_dir = results_dir
+        self._lock = threading.Lock()
+        self._executor = None
+        self._purge_at = 0.0
+
+    def init_app(self, app):
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.result_ttl = app.config.get('JOB_RESULT_TTL', self.result_ttl)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', self.stale_after)
+        self.results_dir = app.config.get('JOB_RESULTS_DIR') or os.path.join(app.instance_path, 'jobs')
+        app.extensions['jobs'] = self
+
+    def _pool(self):
+        # Started on first use, so importing the app (or forking workers) starts no threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+            return self._executor
+
+    def submit(self, kind, params=None):
+        """Queue a `kind` job, unless an identical one is under way or has a fresh result.
+
+        Returns (job, created). Raises ValueError for an unknown kind or bad parameters.
+        """
+        if not isinstance(kind, str) or kind not in TASKS:
+            raise ValueError(f"kind must be one of {', '.join(TASKS)}")
+        if params is None:
+            params = {}
+        if not isinstance(params, dict):
+            raise ValueError('params must be an object')
+        task = TASKS[kind]
+        params = task.parse(params)
+        key = hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+        if time.monotonic() >= self._purge_at:
+            self._purge_at = time.monotonic() + PURGE_INTERVAL
+            self.purge()
+
+        now = datetime.now()
+        reusable = db.and_(Job.status.in_(ACTIVE), db.not_(Job.cancel_requested),
+                           Job.updated_at >= now - timedelta(seconds=self.stale_after))
+        if task.cacheable:
+            reusable = db.or_(reusable, db.and_(Job.status == 'done', Job.expires_at > now))
+        existing = Job.query.filter(Job.cache_key == key, reusable).order_by(Job.created_at.desc()).first()
+        if existing:
+            return existing, False
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params), cache_key=key,
+                  status='queued', created_at=now, updated_at=now)
+        db.session.add(job)
+        db.session.commit()
+        self._pool().submit(self._run, current_app._get_current_object(), job.id, kind, params)
+        return job, True
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop at its next progress update.
+
+        Returns False if the job had already finished (or doesn't exist).
+        """
+        now = datetime.now()
+        if self._update(job_id, ('queued',), status='cancelled', updated_at=now, finished_at=now,
+                        expires_at=now + timedelta(seconds=self.result_ttl)):
+            return True
+        return bool(self._update(job_id, ('running',), cancel_requested=True))
+
+    def purge(self):
+        """Delete expired jobs and their files, and fail jobs whose worker has gone.
+
+        Returns (jobs deleted, jobs failed).
+        """
+        table = Job.__table__
+        now = datetime.now()
+        with db.engine.begin() as conn:
+            failed = conn.execute(
+                table.update()
+                .where(table.c.status.in_(ACTIVE), table.c.updated_at < now - timedelta(seconds=self.stale_after))
+                .values(status='failed', error='Stopped making progress; its worker probably restarted',
+                        updated_at=now, finished_at=now, expires_at=now + timedelta(seconds=self.result_ttl))
+            ).rowcount
+            expired = conn.execute(db.select(table.c.id, table.c.result_path).where(table.c.expires_at < now)).all()
+            if expired:
+                conn.execute(table.delete().where(table.c.id.in_([job_id for job_id, _ in expired])))
+        for _, path in expired:
+            _remove(path)
+        return len(expired), failed
+
+    def _update(self, job_id, statuses, live=False, **values):
+        # On its own connection and committed at once, like bill number blocks, so
+        # progress is visible to other workers while the task's transaction is open
+        table = Job.__table__
+        stmt = table.update().where(table.c.id == job_id, table.c.status.in_(statuses)).values(**values)
+        if live:
+            stmt = stmt.where(db.not_(table.c.cancel_requested))
+        with db.engine.begin() as conn:
+            return conn.execute(stmt).rowcount
+
+    def _run(self, app, job_id, kind, params):
+        with app.app_context():
+            now = datetime.now()
+            if not self._update(job_id, ('queued',), status='running', started_at=now, updated_at=now):
+                return  # cancelled, or given up on, while it waited
+            context = JobContext(self, job_id)
+            try:
+                result = TASKS[kind].run(context, **params)
+            except JobCancelled:
+                db.session.rollback()
+                self._finish(context, 'cancelled')
+            except Exception as e:
+                db.session.rollback()
+                logger.exception('Job %s (%s) failed', job_id, kind)
+                self._finish(context, 'failed', error=(str(e) or type(e).__name__)[:500])
+            else:
+                self._finish(context, 'done', progress=1.0, message=None, result=json.dumps(result),
+                             result_path=context.result_path)
+
+    def _finish(self, context, status, **values):
+        now = datetime.now()
+        finished = self._update(context.job_id, ('running',), status=status, updated_at=now, finished_at=now,
+                                expires_at=now + timedelta(seconds=self.result_ttl), **values)
+        if status != 'done' or not finished:
+            _remove(context.result_path)
+
+
+def _remove(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# Tasks. Each has parse(raw params) -> JSON-safe params, raising ValueError, and
+# run(context, **params) -> JSON-safe result. Cacheable tasks only read, so a
+# fresh result can answer an identical request.
+
+Task = namedtuple('Task', 'parse run cacheable')
+
+
+def _date_params(raw):
+    params = {}
+    for name in ('start', 'end'):
+        if raw.get(name):
+            try:
+                params[name] = datetime.strptime(str(raw[name]), '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                raise ValueError('Dates must be YYYY-MM-DD')
+    if 'start' in params and 'end' in params and params['start'] > params['end']:
+        raise ValueError('start must not be after end')
+    return params
+
+
+def _day(value):
+    return date.fromisoformat(value) if value else None
+
+
+def _month_chunks(start, end):
+    """[start, end] split at month boundaries into (first, last) business days.
+
+    An open start or end is bounded by the bills and expenses on record, and
+    stays open on the first or last chunk.
+    """
+    first, last = start, end
+    if first is None or last is None:
+        moments = [m for m in (*db.session.query(db.func.min(Bill.date), db.func.max(Bill.date)).one(),
+                               *db.session.query(db.func.min(Expense.date), db.func.max(Expense.date)).one()) if m]
+        if moments:
+            first = first or store_calendar.business_day(min(moments))
+            last = last or store_calendar.business_day(max(moments))
+    if first is None or last is None or first > last:
+        return [(start, end)]
+    chunks = []
+    day = first
+    while day <= last:
+        next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunks.append([day, min(next_month - timedelta(days=1), last)])
+        day = next_month
+    chunks[0][0], chunks[-1][1] = start, end
+    return chunks
+
+
+def parse_report(raw):
+    group_by = raw.get('group_by', 'day')
+    if not isinstance(group_by, str) or group_by not in GROUPINGS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+    return {'group_by': group_by, **_date_params(raw)}
+
+
+def run_report(context, group_by, start=None, end=None):
+    """profit_report() a month at a time, merged; the same rows /api/reports/profit returns."""
+    merged = {}
+    chunks = _month_chunks(_day(start), _day(end))
+    for n, (first, last) in enumerate(chunks, 1):
+        for row in profit_report(first, last, group_by):
+            key = row.pop('key')
+            # A product's name can differ between months; keep the latest spelling
+            merge_key = key[0] if group_by == 'product' else key
+            if merge_key in merged:
+                row = combine([merged[merge_key][1], row])
+            merged[merge_key] = (key, row)
+        context.progress(n, len(chunks), f'{n} of {len(chunks)} months')
+    rows = [dict(key=merged[k][0], **merged[k][1]) for k in sorted(merged, key=lambda k: (k is None, k))]
+    return report_json(rows, group_by)
+
+
+def run_rebuild_summary(context, start=None, end=None):
+    """rebuild_daily_summary() a month at a time; each month commits, so cancelling keeps those done."""
+    chunks = _month_chunks(_day(start), _day(end))
+    days = 0
+    for n, (first, last) in enumerate(chunks, 1):
+        days += rebuild_daily_summary(first, last)
+        context.progress(n, len(chunks), f'{n} of {len(chunks)} months')
+    return {'days': days}
+
+
+def parse_export(raw):
+    kind, fmt = raw.get('kind'), raw.get('format', 'csv')
+    if not isinstance(kind, str) or kind not in EXPORTS:
+        raise ValueError(f"kind must be one of {', '.join(EXPORTS)}")
+    if not isinstance(fmt, str) or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return {'kind': kind, 'format': fmt, **_date_params(raw)}
+
+
+def run_export(context, kind, format, start=None, end=None):
+    """The export /export/<kind> streams, written to a file a page of rows at a time.
+
+    Each page is read in full before the next progress update, so no read is
+    left open across it; on SQLite an open read would lock out the update.
+    """
+    first, last = _day(start), _day(end)
+    total = export_count(kind, first, last)
+    write = write_jsonl if format == 'jsonl' else write_csv
+    written, after = 0, None
+    with open(context.output_path(format), 'w', encoding='utf-8', newline='') as f:
+        while True:
+            names, result = export_rows(kind, first, last, after=after, limit=EXPORT_PAGE_SIZE)
+            rows = list(result)
+            for chunk in write(names, rows, header=after is None):
+                f.write(chunk)
+            written += len(rows)
+            if len(rows) < EXPORT_PAGE_SIZE:
+                break
+            after = rows[-1][0]
+            context.progress(written, total, f'{written} of {total} rows')
+    return {'rows': written, 'filename': f"{kind}_{start or 'all'}_{end or 'all'}.{format}"}
+
+
+TASKS = {
+    'profit_report': Task(parse_report, run_report, cacheable=True),
+    'rebuild_summary': Task(_date_params, run_rebuild_summary, cacheable=False),
+    'export': Task(parse_export, run_export, cacheable=True),
+}
+
+
+job_runner = JobRunner()
@@ -0,0 +1,134 @@
+import importlib
+import os
+import re
+from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+from models import db, SchemaVersion
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# migrations/0002_hot_query_indexes.py -> version 2, name 'hot_query_indexes'
+FILENAME = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+
+class Operations:
+    """What a migration's upgrade(op) can do to the schema.
+
+    Every operation looks at the live schema first and skips work that is
+    already done, so a migration can be re-run after a failure part-way through
+    (MySQL commits each DDL statement) and also runs cleanly on a database that
+    create_all() built from the current models. With dry_run nothing is
+    executed; the statements are only echoed.
+    """
+
+    def __init__(self, conn, dry_run=False, echo=print):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.echo = echo
+        self.dialect = conn.dialect.name
+
+    def execute(self, sql, params=None):
+        prefix = '  -- ' if self.dry_run else '  '
+        self.echo('\n'.join(prefix + line for line in sql.splitlines()))
+        if not self.dry_run:
+            return self.conn.exec_driver_sql(sql, params or ())
+
+    def commit(self):
+        """End the current transaction, e.g. between batches of a data backfill."""
+        if not self.dry_run:
+            self.conn.commit()
+
+    def has_table(self, table):
+        return inspect(self.conn).has_table(table)
+
+    def has_column(self, table, column):
+        if not self.has_table(table):
+            return False
+        return any(c['name'] == column for c in inspect(self.conn).get_columns(table))
+
+    def has_index(self, table, columns):
+        """True if an index (or the primary key) already starts with `columns`."""
+        if not self.has_table(table):
+            return False
+        inspector = inspect(self.conn)
+        prefixes = [i['column_names'] for i in inspector.get_indexes(table)]
+        prefixes += [u['column_names'] for u in inspector.get_unique_constraints(table)]
+        prefixes.append(inspector.get_pk_constraint(table)['constrained_columns'])
+        return any(p[:len(columns)] == list(columns) for p in prefixes)
+
+    def create_table(self, model):
+        table = model.__table__
+        if self.has_table(table.name):
+            return
+        self.execute(str(CreateTable(table).compile(dialect=self.conn.dialect)).strip())
+        for index in table.indexes:
+            self.create_index(index.name, table.name, [c.name for c in index.columns], index.unique)
+
+    def add_column(self, table, column, ddl):
+        if not self.has_column(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def create_index(self, name, table, columns, unique=False):
+        # An index that already leads with these columns serves the same lookups,
+        # e.g. the one InnoDB creates for a foreign key
+        if self.has_index(table, columns):
+            return
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        cols = ', '.join(columns)
+        if self.dialect == 'mysql':
+            # Built online: reads and writes to the table carry on while it builds
+            self.execute(f"ALTER TABLE {table} ADD {kind} {name} ({cols}), ALGORITHM=INPLACE, LOCK=NONE")
+        else:
+            self.execute(f"CREATE {kind} {name} ON {table} ({cols})")
+
+
+def discover():
+    """(version, name, module) for every migration file, in version order."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = FILENAME.match(filename)
+        if match:
+            module = importlib.import_module(f'migrations.{filename[:-3]}')
+            found.append((int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda m: m[0])
+    versions = [m[0] for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError('Two migrations share a version number')
+    return found
+
+
+def applied_versions(conn):
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return set()
+    return set(conn.execute(db.select(SchemaVersion.version)).scalars())
+
+
+def migrate(engine, dry_run=False, target=None, echo=print):
+    """Apply pending migrations up to `target` (default: all), each in its own
+    transaction and recorded in schema_version. Returns the versions applied,
+    or that would be with dry_run."""
+    with engine.connect() as conn:
+        if not dry_run:
+            SchemaVersion.__table__.create(conn, checkfirst=True)
+            conn.commit()
+        done = applied_versions(conn)
+
+    applied = []
+    for version, name, module in discover():
+        if version in done or (target is not None and version > target):
+            continue
+        echo(f"{version:04d} {name}{' (dry run)' if dry_run else ''}")
+        with engine.connect() as conn:
+            module.upgrade(Operations(conn, dry_run, echo))
+            if not dry_run:
+                conn.execute(db.insert(SchemaVersion).values(version=version, name=name, applied_at=datetime.now()))
+                conn.commit()
+        applied.append(version)
+    return applied
+
+
+def status(engine):
+    """[(version, name, applied?)] for every known migration."""
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    return [(version, name, version in done) for version, name, _ in discover()]
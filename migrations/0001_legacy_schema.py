@@ -0,0 +1,63 @@
+"""Everything update_schema.py used to apply to databases created by older versions."""
+from models import Settings, Expense, DailySummary, BillSequence
+
+BACKFILL_BATCH = 10000
+
+
+def upgrade(op):
+    op.add_column('bills', 'subtotal', 'FLOAT NOT NULL DEFAULT 0.0')
+    op.add_column('bills', 'tax_amount', 'FLOAT DEFAULT 0.0')
+    op.add_column('bills', 'discount_amount', 'FLOAT DEFAULT 0.0')
+    op.add_column('bills', 'payment_mode', "VARCHAR(20) DEFAULT 'Cash'")
+    op.create_table(Settings)
+
+    # Financials
+    op.add_column('products', 'cost_price', 'FLOAT DEFAULT 0.0')
+    op.create_table(Expense)
+
+    # Dashboard rollup (populate with `flask --app app rebuild-summary`)
+    op.create_table(DailySummary)
+
+    # Product snapshot on line items
+    snapshot_missing = not op.has_column('bill_items', 'product_name')
+    op.add_column('bill_items', 'cost_at_sale', 'FLOAT NOT NULL DEFAULT 0.0')
+    op.add_column('bill_items', 'product_name', 'VARCHAR(100)')
+    op.add_column('bill_items', 'category', 'VARCHAR(50)')
+    if snapshot_missing:
+        backfill_bill_item_snapshots(op)
+
+    # History pagination
+    op.create_index('ix_bills_date_id', 'bills', ['date', 'id'])
+    op.create_index('ix_bills_payment_mode_date_id', 'bills', ['payment_mode', 'date', 'id'])
+    op.create_index('ix_bills_customer_date_id', 'bills', ['customer_name', 'date', 'id'])
+
+    # Offline till sync and bill numbers
+    op.add_column('bills', 'client_ref', 'VARCHAR(64) NULL')
+    op.create_index('ux_bills_client_ref', 'bills', ['client_ref'], unique=True)
+    op.create_table(BillSequence)
+
+
+def backfill_bill_item_snapshots(op):
+    # Copy cost/name/category from products onto line items that predate the snapshot columns.
+    # Works in id ranges so a large bill_items table is not locked in one long transaction.
+    # Note: uses the product's *current* cost, which is the best record we have for old sales.
+    if op.dry_run:
+        op.echo("  -- backfill bill_items snapshot columns from products")
+        return
+    low, high = op.conn.exec_driver_sql("SELECT MIN(id), MAX(id) FROM bill_items").fetchone()
+    if low is None:
+        return
+    if op.dialect == 'mysql':
+        sql = ("UPDATE bill_items bi JOIN products p ON p.id = bi.product_id "
+               "SET bi.cost_at_sale = COALESCE(p.cost_price, 0), bi.product_name = p.name, bi.category = p.category "
+               "WHERE bi.product_name IS NULL AND bi.id >= %s AND bi.id < %s")
+    else:
+        product = "(SELECT {} FROM products p WHERE p.id = bill_items.product_id)"
+        sql = (f"UPDATE bill_items SET cost_at_sale = COALESCE({product.format('cost_price')}, 0), "
+               f"product_name = {product.format('name')}, category = {product.format('category')} "
+               "WHERE product_name IS NULL AND id >= ? AND id < ?")
+    updated = 0
+    for start in range(low, high + 1, BACKFILL_BATCH):
+        updated += op.conn.exec_driver_sql(sql, (start, start + BACKFILL_BATCH)).rowcount
+        op.commit()
+    op.echo(f"  backfilled product snapshot on {updated} bill items")
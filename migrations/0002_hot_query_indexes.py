@@ -0,0 +1,14 @@
+"""Indexes for the hot filters that were full table scans.
+
+bills.date needs no index of its own: ix_bills_date_id leads with it.
+"""
+
+
+def upgrade(op):
+    # Receipts and bill serialization load line items by bill; product deletes check by product
+    op.create_index('ix_bill_items_bill_id', 'bill_items', ['bill_id'])
+    op.create_index('ix_bill_items_product_id', 'bill_items', ['product_id'])
+    # Expense list and profit reports filter on a date range
+    op.create_index('ix_expenses_date', 'expenses', ['date'])
+    # Low-stock counts on the dashboard and inventory page
+    op.create_index('ix_products_stock_quantity', 'products', ['stock_quantity'])
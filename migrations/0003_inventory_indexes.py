@@ -0,0 +1,8 @@
+"""Indexes for the paginated inventory table and its category filter."""
+
+
+def upgrade(op):
+    # Default sort, and the name-prefix filter
+    op.create_index('ix_products_name', 'products', ['name'])
+    # Category filter sorted by name; also serves the category counts
+    op.create_index('ix_products_category_name', 'products', ['category', 'name'])
@@ -0,0 +1,18 @@
+"""Stock movement ledger and on-hand snapshots."""
+from datetime import datetime
+from models import StockMovement, StockSnapshot
+
+
+def upgrade(op):
+    op.create_table(StockMovement)
+    op.create_table(StockSnapshot)
+
+    # The ledger starts from what is on hand now: an opening snapshot, so stock
+    # as of any later moment is this plus the movements after it
+    if op.dry_run or not op.conn.exec_driver_sql('SELECT 1 FROM stock_snapshots LIMIT 1').first():
+        mark = '%s' if op.dialect == 'mysql' else '?'
+        # In the text format SQLAlchemy stores DateTime as on SQLite, so it compares equal
+        opened = datetime.now().replace(microsecond=0)
+        opened = opened.strftime('%Y-%m-%d %H:%M:%S.%f' if op.dialect == 'sqlite' else '%Y-%m-%d %H:%M:%S')
+        op.execute("INSERT INTO stock_snapshots (taken_at, product_id, quantity)\n"
+                   f"SELECT {mark}, id, stock_quantity FROM products WHERE stock_quantity <> 0", (opened,))
@@ -0,0 +1,6 @@
+"""Table for background jobs."""
+from models import Job
+
+
+def upgrade(op):
+    op.create_table(Job)
@@ -0,0 +1,30 @@
+"""Pending sale movements and the time each stock movement happened."""
+
+BACKFILL_BATCH = 10000
+
+
+def upgrade(op):
+    op.add_column('stock_movements', 'pending', 'BOOLEAN NOT NULL DEFAULT 0')
+    op.create_index('ix_stock_movements_pending_product', 'stock_movements', ['pending', 'product_id'])
+
+    backfill = not op.has_column('stock_movements', 'occurred_at')
+    op.add_column('stock_movements', 'occurred_at', 'DATETIME NULL')
+    if backfill:
+        backfill_occurred_at(op)
+
+
+def backfill_occurred_at(op):
+    # Rows written so far were stamped when the stock moved, in id ranges so a
+    # long ledger isn't locked in one transaction
+    if op.dry_run:
+        op.echo("  -- backfill stock_movements.occurred_at from created_at")
+        return
+    low, high = op.conn.exec_driver_sql("SELECT MIN(id), MAX(id) FROM stock_movements").fetchone()
+    if low is None:
+        return
+    mark = '%s' if op.dialect == 'mysql' else '?'
+    sql = ("UPDATE stock_movements SET occurred_at = created_at "
+           f"WHERE occurred_at IS NULL AND id >= {mark} AND id < {mark}")
+    for start in range(low, high + 1, BACKFILL_BATCH):
+        op.conn.exec_driver_sql(sql, (start, start + BACKFILL_BATCH))
+        op.commit()
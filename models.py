@@ -1,10 +1,19 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.mysql import LONGTEXT
 from datetime import datetime
 
 db = SQLAlchemy()
 
 class Product(db.Model):
     __tablename__ = 'products'
+    # Low-stock checks on the dashboard and inventory page are range scans on the
+    # first; the inventory table sorts by name, optionally within a category
+    __table_args__ = (
+        db.Index('ix_products_stock_quantity', 'stock_quantity'),
+        db.Index('ix_products_name', 'name'),
+        db.Index('ix_products_category_name', 'category', 'name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     barcode = db.Column(db.String(50), unique=True, nullable=False)
@@ -45,12 +54,129 @@ class Product(db.Model):
 
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (db.Index('ix_expenses_date', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(50), default='Operational')
     date = db.Column(db.DateTime, default=datetime.now)
 
+class DailySummary(db.Model):
+    # One row per calendar day, maintained incrementally by checkout/expenses
+    # and rebuilt from history with `flask rebuild-summary`
+    __tablename__ = 'daily_summary'
+    date = db.Column(db.Date, primary_key=True)
+    sales = db.Column(db.Float, nullable=False, default=0.0)
+    cogs = db.Column(db.Float, nullable=False, default=0.0)
+    expenses = db.Column(db.Float, nullable=False, default=0.0)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def profit(self):
+        return self.sales - self.cogs - self.expenses
+
+class BillSequence(db.Model):
+    # High-water mark of bill numbers handed out per store and day; workers
+    # reserve blocks of numbers from it (see bill_numbers.py)
+    __tablename__ = 'bill_sequences'
+    store_code = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+class StockMovement(db.Model):
+    # Append-only ledger of stock changes. Sales are only written here, as pending
+    # rows; products.stock_quantity materializes the rest (see stock_ledger.py)
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_created_at', 'created_at'),
+        db.Index('ix_stock_movements_product_created', 'product_id', 'created_at'),
+        db.Index('ix_stock_movements_pending_product', 'pending', 'product_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the history outlives a deleted product
+    product_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)  # signed, sales are negative
+    bill_id = db.Column(db.Integer, nullable=True)
+    note = db.Column(db.String(200))
+    # When the row was written, and when the stock moved: a sale synced from an
+    # offline till happened at its bill's date
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # Not yet added to products.stock_quantity
+    pending = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'kind': self.kind,
+            'quantity': self.quantity,
+            'bill_id': self.bill_id,
+            'note': self.note,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'occurred_at': self.occurred_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+class StockSnapshot(db.Model):
+    # On-hand quantity per product at taken_at, compacted from stock_movements
+    # with `flask compact-stock`; products with nothing on hand are left out
+    __tablename__ = 'stock_snapshots'
+    taken_at = db.Column(db.DateTime, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+class Job(db.Model):
+    # Background work run by jobs.py. Rows live until expires_at, and
+    # identical requests share one job while it runs and its result while fresh
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_cache_key', 'cache_key'),
+        db.Index('ix_jobs_created_at', 'created_at'),
+    )
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    cache_key = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    message = db.Column(db.String(200))
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    # JSON result; files (exports) are written under JOB_RESULTS_DIR instead
+    result = db.Column(db.Text().with_variant(LONGTEXT(), 'mysql'))
+    result_path = db.Column(db.String(255))
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        def when(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': json.loads(self.params),
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'message': self.message,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': when(self.created_at),
+            'started_at': when(self.started_at),
+            'finished_at': when(self.finished_at),
+            'expires_at': when(self.expires_at)
+        }
+
+class SchemaVersion(db.Model):
+    # One row per migration applied by migrate.py
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+
 class Settings(db.Model):
     __tablename__ = 'settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -62,8 +188,16 @@ class Settings(db.Model):
 
 class Bill(db.Model):
     __tablename__ = 'bills'
+    # Back the keyset-paginated history: newest-first by (date, id), optionally per payment mode/customer
+    __table_args__ = (
+        db.Index('ix_bills_date_id', 'date', 'id'),
+        db.Index('ix_bills_payment_mode_date_id', 'payment_mode', 'date', 'id'),
+        db.Index('ix_bills_customer_date_id', 'customer_name', 'date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     bill_number = db.Column(db.String(50), unique=True, nullable=False)
+    # Id generated by the till for offline-queued bills, makes sync retries idempotent
+    client_ref = db.Column(db.String(64), unique=True, nullable=True)
     date = db.Column(db.DateTime, default=datetime.now)
     customer_name = db.Column(db.String(100), nullable=True)
     
@@ -76,6 +210,7 @@ class Bill(db.Model):
     items = db.relationship('BillItem', backref='bill', lazy=True)
 
     def to_dict(self):
+        # Load items with selectinload(Bill.items) when serializing more than one bill
         return {
             'id': self.id,
             'bill_number': self.bill_number,
@@ -91,18 +226,26 @@ class Bill(db.Model):
 
 class BillItem(db.Model):
     __tablename__ = 'bill_items'
+    __table_args__ = (
+        db.Index('ix_bill_items_bill_id', 'bill_id'),
+        db.Index('ix_bill_items_product_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     bill_id = db.Column(db.Integer, db.ForeignKey('bills.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price_at_sale = db.Column(db.Float, nullable=False) # Price at the time of purchase
     subtotal = db.Column(db.Float, nullable=False)
+    # Product snapshot at the time of purchase, so reports never join back to products
+    cost_at_sale = db.Column(db.Float, nullable=False, default=0.0)
+    product_name = db.Column(db.String(100))
+    category = db.Column(db.String(50))
 
     product = db.relationship('Product', backref='bill_items')
 
     def to_dict(self):
         return {
-            'product_name': self.product.name,
+            'product_name': self.product_name,
             'quantity': self.quantity,
             'price': self.price_at_sale,
             'subtotal': self.subtotal
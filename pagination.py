@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+from models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(raw) != len(columns):
+            raise InvalidCursor('Malformed cursor')
+        return [
+            datetime.fromisoformat(v) if isinstance(col.type, db.DateTime) else v
+            for col, v in zip(columns, raw)
+        ]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Malformed cursor') from e
+
+
+def page_size(value):
+    try:
+        size = int(value) if value else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page of `query` ordered newest-first by `columns` and the cursor for the next page.
+
+    Seeks past the cursor with a range predicate instead of OFFSET, so every page
+    is a bounded index scan on `columns` however deep the client has paged.
+    `columns` must end in a unique column (usually the primary key).
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        # (a, b) < (x, y) written out so MySQL can use the composite index as a range
+        seek = None
+        for i in range(len(columns) - 1, -1, -1):
+            term = columns[i] < values[i]
+            seek = term if seek is None else db.or_(term, db.and_(columns[i] == values[i], seek))
+        query = query.filter(seek)
+
+    rows = query.order_by(*[col.desc() for col in columns]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, col.key) for col in columns])
+    return rows, next_cursor
+
+
+def keyset_batches(stmt, key, batch_size, after=None, limit=None):
+    """Yield the rows of select `stmt` in ascending `key` order, reading `batch_size` rows per query.
+
+    Each batch is fetched in full and the next one seeks past its last key, so
+    memory stays bounded whether or not the driver can stream a result (MySQL
+    Connector buffers every row client-side) and no cursor is left open
+    between batches. `key` must be unique and the first selected column.
+    `after` starts past a key; `limit` stops after that many rows.
+    """
+    stmt = stmt.order_by(key)
+    while limit is None or limit > 0:
+        size = batch_size if limit is None else min(batch_size, limit)
+        page = stmt if after is None else stmt.where(key > after)
+        rows = db.session.execute(page.limit(size)).all()
+        yield from rows
+        if len(rows) < size:
+            return
+        after = rows[-1][0]
+        if limit is not None:
+            limit -= len(rows)
@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+from models import db, Product
+from stock_ledger import fold, movement, record_movements
+
+MODES = ('upsert', 'stock_delta')
+CHUNK_SIZE = 1000
+# Cap per-row error details so a wholly wrong file doesn't produce a huge response
+MAX_ERRORS = 1000
+
+UPSERT_FIELDS = ('name', 'price', 'cost_price', 'stock_quantity', 'category')
+# Used for new products only; an existing product keeps its value when the column is omitted
+INSERT_DEFAULTS = {'cost_price': 0.0, 'category': 'General'}
+
+
+def read_rows(stream, fmt):
+    """Yield dicts from a CSV, JSON array or JSON-lines text stream."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == 'json':
+        yield from json.load(stream)
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+
+def _text(row, key, required=False, max_length=None):
+    value = row.get(key)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise ValueError(f'{key} is required')
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{key} longer than {max_length} characters')
+    return value
+
+
+def _number(row, key, cast, required=False):
+    value = row.get(key)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ValueError(f'{key} is required')
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be a number')
+
+
+def validate_upsert(row):
+    """Clean product row; optional columns left out are not overwritten on existing products."""
+    product = {
+        'barcode': _text(row, 'barcode', required=True, max_length=50),
+        'name': _text(row, 'name', required=True, max_length=100),
+        'price': _number(row, 'price', float, required=True),
+        'stock_quantity': _number(row, 'stock_quantity', int, required=True),
+    }
+    if product['price'] < 0:
+        raise ValueError('price must not be negative')
+    if product['stock_quantity'] < 0:
+        raise ValueError('stock_quantity must not be negative')
+    cost_price = _number(row, 'cost_price', float)
+    if cost_price is not None:
+        product['cost_price'] = cost_price
+    if _text(row, 'category'):
+        product['category'] = _text(row, 'category', max_length=50)
+    return product
+
+
+def validate_delta(row):
+    quantity = row.get('quantity', row.get('stock_quantity'))
+    return {
+        'barcode': _text(row, 'barcode', required=True, max_length=50),
+        'quantity': _number({'quantity': quantity}, 'quantity', int, required=True),
+    }
+
+
+def _upsert_stmt(fields):
+    """INSERT ... ON DUPLICATE KEY UPDATE `fields`, executed with a list of rows (executemany)."""
+    table = Product.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update(**{f: stmt.inserted[f] for f in fields})
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.barcode],
+        set_={f: stmt.excluded[f] for f in fields}
+    )
+
+
+def _fold_pending(barcodes):
+    fold([pid for (pid,) in db.session.query(Product.id).filter(Product.barcode.in_(barcodes))])
+
+
+def _apply_upserts(chunk):
+    # Last row wins for a barcode repeated within a chunk (one statement can't touch a row twice)
+    by_barcode = {}
+    for _, product in chunk:
+        by_barcode[product['barcode']] = product
+    # One statement per column set, so omitted optional columns keep their stored value
+    groups = {}
+    for product in by_barcode.values():
+        groups.setdefault(tuple(sorted(product)), []).append(product)
+    # Stock before the upsert, locked and with pending sales folded in, so the
+    # ledger gets the change and not just the new count
+    _fold_pending(by_barcode)
+    before = {b: (pid, qty) for b, pid, qty in db.session.query(Product.barcode, Product.id, Product.stock_quantity)
+              .filter(Product.barcode.in_(by_barcode)).order_by(Product.id).with_for_update()}
+    for keys, rows in groups.items():
+        fields = [f for f in UPSERT_FIELDS if f in keys]
+        db.session.execute(_upsert_stmt(fields), [{**INSERT_DEFAULTS, **row} for row in rows])
+
+    new = [b for b in by_barcode if b not in before]
+    ids = dict(db.session.query(Product.barcode, Product.id).filter(Product.barcode.in_(new))) if new else {}
+    moves = [movement(ids[b], by_barcode[b]['stock_quantity'], 'restock', note='Imported') for b in new if b in ids]
+    moves += [movement(pid, by_barcode[b]['stock_quantity'] - (qty or 0), 'adjustment', note='Imported')
+              for b, (pid, qty) in before.items()]
+    record_movements(moves)
+    return []
+
+
+def _apply_deltas(chunk):
+    deltas = {}
+    for _, row in chunk:
+        deltas[row['barcode']] = deltas.get(row['barcode'], 0) + row['quantity']
+    # Locked in id order like checkout, with pending sales folded in, so the floor
+    # check below holds until commit
+    _fold_pending(deltas)
+    locked = {b: (pid, qty) for b, pid, qty in db.session.query(Product.barcode, Product.id, Product.stock_quantity)
+              .filter(Product.barcode.in_(deltas)).order_by(Product.id).with_for_update()}
+    known = {b: pid for b, (pid, _) in locked.items()}
+    # A delta may not take stock below zero; one that adds stock is always applied
+    short = {b for b, q in deltas.items() if b in locked and q < 0 and (locked[b][1] or 0) + q < 0}
+    errors = []
+    for n, row in chunk:
+        if row['barcode'] not in known:
+            errors.append((n, f"Unknown barcode {row['barcode']}"))
+        elif row['barcode'] in short:
+            errors.append((n, f"Would take stock of {row['barcode']} below zero"))
+    deltas = {b: q for b, q in deltas.items() if b in known and b not in short}
+    if deltas:
+        table = Product.__table__
+        delta = db.bindparam('b_delta')
+        db.session.execute(
+            db.update(table)
+            .where(table.c.barcode == db.bindparam('b_barcode'),
+                   db.or_(delta >= 0, table.c.stock_quantity + delta >= 0))
+            .values(stock_quantity=table.c.stock_quantity + delta),
+            [{'b_barcode': b, 'b_delta': q} for b, q in deltas.items()]
+        )
+        record_movements([movement(known[b], q, 'restock' if q > 0 else 'adjustment', note='Imported')
+                          for b, q in deltas.items()])
+    return errors
+
+
+def import_products(rows, mode='upsert', chunk_size=CHUNK_SIZE):
+    """Validate and write product rows in chunked transactions.
+
+    `upsert` inserts new barcodes and updates existing ones with
+    INSERT ... ON DUPLICATE KEY UPDATE; `stock_delta` adds `quantity` (which
+    may be negative, though not past zero stock) to the stock of existing
+    barcodes. Each chunk commits on its own, so a bad chunk doesn't roll back
+    the ones before it.
+
+    Returns {'processed', 'imported', 'failed', 'errors': [{'row', 'error'}]},
+    where row numbers are 1-based data rows.
+    """
+    validate = validate_upsert if mode == 'upsert' else validate_delta
+    apply = _apply_upserts if mode == 'upsert' else _apply_deltas
+    result = {'processed': 0, 'imported': 0, 'failed': 0, 'errors': []}
+
+    def fail(row_number, message):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_ERRORS:
+            result['errors'].append({'row': row_number, 'error': message})
+
+    def flush(chunk):
+        if not chunk:
+            return
+        try:
+            errors = apply(chunk)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for row_number, _ in chunk:
+                fail(row_number, f'Chunk rejected by database: {e}')
+            return
+        for row_number, message in errors:
+            fail(row_number, message)
+        result['imported'] += len(chunk) - len(errors)
+
+    chunk = []
+    for row_number, row in enumerate(rows, 1):
+        result['processed'] += 1
+        try:
+            if not isinstance(row, dict):
+                raise ValueError('Row must be an object')
+            chunk.append((row_number, validate(row)))
+        except ValueError as e:
+            fail(row_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    flush(chunk)
+    return result
+
+
+def import_file(stream, fmt, mode='upsert', chunk_size=CHUNK_SIZE):
+    return import_products(read_rows(stream, fmt), mode, chunk_size)
+
+
+def detect_format(filename, content_type=''):
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or 'ndjson' in content_type:
+        return 'jsonl'
+    if name.endswith('.json') or 'json' in content_type:
+        return 'json'
+    return 'csv'
+
+
+def as_text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
@@ -0,0 +1,301 @@
+import bisect
+import functools
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from models import db, Product
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Share of the query's trigrams a product must contain to count as a substring candidate
+MIN_SIMILARITY = 0.3
+# ... and to count as a typo-tolerant (fuzzy) match when it isn't a substring (4+ character queries)
+FUZZY_SIMILARITY = 0.5
+# Shortest word matched with one typo (a letter wrong, missing or extra, or two swapped).
+# Trigrams miss these in short words: "mlik" shares one of its five with "milk"
+MIN_TYPO_WORD = 3
+
+_non_word = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    return _non_word.sub(' ', (text or '').lower()).strip()
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_trigrams(word):
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams = set()
+    for word in normalize(text).split():
+        grams |= _word_trigrams(word)
+    return grams
+
+
+def _deletions(word):
+    """`word` and every string one letter shorter than it."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _one_edit(a, b):
+    """True if `b` is `a` with at most one letter changed, removed or added, or two neighbours swapped."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return (a[i + 1:] == b[i + 1:]
+            or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]))
+
+
+def _prefix_scan(sorted_entries, prefix):
+    """Yield entries of a sorted list of tuples whose first element starts with `prefix`."""
+    i = bisect.bisect_left(sorted_entries, (prefix,))
+    while i < len(sorted_entries) and sorted_entries[i][0].startswith(prefix):
+        yield sorted_entries[i]
+        i += 1
+
+
+class ProductSearchIndex:
+    """In-memory product search index replacing `ILIKE '%q%'` scans.
+
+    Results are ranked in tiers: exact barcode, barcode prefix, name prefix,
+    word prefix, then name substring and typo-tolerant name matches. The prefix tiers are
+    bisect lookups over sorted lists and usually fill a page on their own; the
+    trigram posting lists are only consulted when they don't, e.g. for a
+    misspelt or mid-word query. Typos in short words, which share too few
+    trigrams, are found through each word's one-letter deletions instead.
+
+    Only ids and the searchable text are held here; callers load the matching
+    rows by primary key so price and stock are always current, and checkout
+    never touches the index. Product add/update/delete patch it in place. Other
+    workers pick those changes up on their next full rebuild, which runs in a
+    background thread once the index is older than `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.app = None
+        self._lock = threading.RLock()
+        self._rebuilding = False
+        self._built_at = None
+        self._docs = {}  # id -> (normalized name, barcode, name trigrams)
+        self._postings = defaultdict(set)  # trigram -> ids
+        self._barcodes = {}  # barcode -> id
+        self._barcode_keys = []  # sorted (barcode, id)
+        self._names = []  # sorted (name, id)
+        self._words = []  # sorted (word, name, id)
+        self._deletions = defaultdict(set)  # word, or word less one letter -> words
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('SEARCH_INDEX_TTL', self.ttl)
+        app.extensions['product_search'] = self
+
+    # -- building -----------------------------------------------------------
+
+    def rebuild(self):
+        rows = db.session.query(Product.id, Product.name, Product.barcode).all()
+        docs, postings, barcodes = {}, defaultdict(set), {}
+        for product_id, name, barcode in rows:
+            doc = self._doc(name, barcode)
+            docs[product_id] = doc
+            barcodes[doc[1]] = product_id
+            for gram in doc[2]:
+                postings[gram].add(product_id)
+        deletions = defaultdict(set)
+        for word in {w for doc in docs.values() for w in doc[0].split()}:
+            self._add_deletions(deletions, word)
+        with self._lock:
+            self._docs, self._postings, self._barcodes = docs, postings, barcodes
+            self._barcode_keys = sorted((b, i) for b, i in barcodes.items())
+            self._names = sorted((doc[0], i) for i, doc in docs.items())
+            self._words = sorted((w, doc[0], i) for i, doc in docs.items() for w in set(doc[0].split()))
+            self._deletions = deletions
+            self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        finally:
+            self._rebuilding = False
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._built_at is None:
+                stale, blocking = True, True
+            else:
+                stale, blocking = time.monotonic() - self._built_at > self.ttl, False
+            if stale and not blocking:
+                # Keep serving the current index while a fresh one is built
+                if self._rebuilding or self.app is None:
+                    return
+                self._rebuilding = True
+        if blocking:
+            self.rebuild()
+        elif stale:
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def invalidate(self):
+        """Force a full rebuild on the next search."""
+        with self._lock:
+            self._built_at = None
+
+    @staticmethod
+    def _add_deletions(deletions, word):
+        if len(word) >= MIN_TYPO_WORD:
+            for key in _deletions(word):
+                deletions[key].add(word)
+
+    @staticmethod
+    def _doc(name, barcode):
+        return (normalize(name), (barcode or '').strip().lower(), trigrams(name))
+
+    def upsert(self, product):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(product.id)
+            doc = self._doc(product.name, product.barcode)
+            self._docs[product.id] = doc
+            self._barcodes[doc[1]] = product.id
+            bisect.insort(self._barcode_keys, (doc[1], product.id))
+            bisect.insort(self._names, (doc[0], product.id))
+            for word in set(doc[0].split()):
+                bisect.insort(self._words, (word, doc[0], product.id))
+                # Never removed: a word no product has any more just finds no ids
+                self._add_deletions(self._deletions, word)
+            for gram in doc[2]:
+                self._postings[gram].add(product.id)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(product_id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if not doc:
+            return
+        name, barcode, grams = doc
+        if self._barcodes.get(barcode) == product_id:
+            del self._barcodes[barcode]
+        self._discard(self._barcode_keys, (barcode, product_id))
+        self._discard(self._names, (name, product_id))
+        for word in set(name.split()):
+            self._discard(self._words, (word, name, product_id))
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[gram]
+
+    @staticmethod
+    def _discard(sorted_entries, entry):
+        i = bisect.bisect_left(sorted_entries, entry)
+        if i < len(sorted_entries) and sorted_entries[i] == entry:
+            del sorted_entries[i]
+
+    # -- querying -----------------------------------------------------------
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Ranked product ids matching `query`, best first, at most `limit`."""
+        raw = (query or '').strip().lower()
+        q = normalize(query)
+        if not raw:
+            return []
+        self._ensure_built()
+
+        results, seen = [], set()
+
+        def take(ids):
+            for product_id in ids:
+                if product_id not in seen:
+                    seen.add(product_id)
+                    results.append(product_id)
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        with self._lock:
+            # 1-2. Exact barcode, then barcode prefix
+            if raw in self._barcodes and take([self._barcodes[raw]]):
+                return results
+            if take(i for _, i in _prefix_scan(self._barcode_keys, raw)):
+                return results
+            if not q:
+                return results
+
+            # 3. Name prefix
+            if take(i for _, i in _prefix_scan(self._names, q)):
+                return results
+
+            # 4. Every query word starts a word of the name; scan on the longest (most selective)
+            q_words = q.split()
+            lead = max(q_words, key=len)
+            others = [w for w in q_words if w is not lead]
+            if take(i for _, name, i in _prefix_scan(self._words, lead)
+                    if all(any(w.startswith(o) for w in name.split()) for o in others)):
+                return results
+
+            # 5-6. Substring, then fuzzy, from the trigram postings
+            q_grams = trigrams(q)
+            needed = max(1, math.ceil(MIN_SIMILARITY * len(q_grams)))
+            # A product sharing `needed` grams must appear in at least one of the
+            # len - needed + 1 rarest posting lists, so only those seed candidates
+            rarest = sorted((self._postings.get(g, ()) for g in q_grams), key=len)
+            candidates = set().union(*rarest[:len(q_grams) - needed + 1])
+            counts = Counter()
+            for gram in q_grams:
+                ids = self._postings.get(gram)
+                if ids:
+                    counts.update(candidates & ids if len(ids) > len(candidates) else ids & candidates)
+
+            ranked = []
+            for product_id, shared in counts.items():
+                if product_id in seen or shared < needed:
+                    continue
+                similarity = shared / len(q_grams)
+                name, barcode, _ = self._docs[product_id]
+                if q in name:
+                    ranked.append((0, -similarity, name, product_id))
+                elif similarity >= FUZZY_SIMILARITY and len(q) >= 4:
+                    ranked.append((1, -similarity, name, product_id))
+            fuzzy = {entry[3] for entry in ranked}
+            for product_id in self._typo_matches(q_words) - seen - fuzzy:
+                name = self._docs[product_id][0]
+                if q not in name:
+                    ranked.append((1, -counts.get(product_id, 0) / len(q_grams), name, product_id))
+            ranked.sort()
+            take(i for *_, i in ranked)
+        return results
+
+    def _typo_matches(self, q_words):
+        """Ids of products where every query word is one typo from a word of the name, or starts one."""
+        matched = None
+        for q_word in q_words:
+            words = set()
+            if len(q_word) >= MIN_TYPO_WORD:
+                for key in _deletions(q_word):
+                    words.update(w for w in self._deletions.get(key, ()) if _one_edit(q_word, w))
+            ids = {i for w in words for word, _, i in _prefix_scan(self._words, w) if word == w}
+            ids.update(i for _, _, i in _prefix_scan(self._words, q_word))
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched
+
+
+search_index = ProductSearchIndex()
@@ -0,0 +1,179 @@
+from datetime import date, datetime, timedelta
+from models import db, Bill, BillItem, Expense, DailySummary
+from store_calendar import store_calendar
+
+GROUPINGS = ('day', 'week', 'month', 'category', 'product')
+TOTAL_FIELDS = ('sales', 'cogs', 'expenses', 'profit', 'bill_count')
+
+
+def as_date(value):
+    # DATE() comes back as a string on SQLite and as a date on MySQL
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def empty_totals():
+    return dict.fromkeys(TOTAL_FIELDS, 0)
+
+
+def combine(rows):
+    """Sum a sequence of totals dicts into one."""
+    result = empty_totals()
+    for row in rows:
+        for field in TOTAL_FIELDS:
+            result[field] += row[field]
+    return result
+
+
+def _in_range(query, column, start, end):
+    # start/end are inclusive business days; filter on the raw column so it can use an index
+    return store_calendar.filter(query, column, start, end)
+
+
+def period_bucket(column, group_by):
+    """SQL expression mapping a datetime column to the first business day of its period.
+
+    'hour' maps it to the start of its clock hour instead, as 'YYYY-MM-DD HH:00:00'.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if group_by == 'hour':
+        if dialect == 'mysql':
+            return db.func.date_format(column, '%Y-%m-%d %H:00:00')
+        return db.func.strftime('%Y-%m-%d %H:00:00', column)
+    seconds = int(store_calendar.shift().total_seconds())
+    if seconds:
+        # Move the business day start to midnight before truncating
+        if dialect == 'mysql':
+            column = db.func.date_sub(column, db.text(f'INTERVAL {seconds} SECOND'))
+        else:
+            column = db.func.datetime(column, f'{-seconds} seconds')
+    if group_by == 'day':
+        return db.func.date(column)
+    if group_by == 'week':
+        if dialect == 'mysql':
+            return db.func.subdate(db.func.date(column), db.func.weekday(column))
+        return db.func.date(column, 'weekday 0', '-6 days')
+    if group_by == 'month':
+        if dialect == 'mysql':
+            return db.func.date_format(column, '%Y-%m-01')
+        return db.func.date(column, 'start of month')
+    raise ValueError(f"Unknown grouping '{group_by}'")
+
+
+def profit_report(start=None, end=None, group_by='day'):
+    """Sales, COGS, expenses and profit for [start, end] grouped by period, category or product.
+
+    Every figure is computed with a GROUP BY in the database, so the number of
+    queries is fixed (three) no matter how many bills fall in the range. COGS
+    comes from the cost snapshot on each line item, never from the products table.
+    Expenses are not attributable to a category or product, so those groupings
+    report gross profit with expenses left at zero.
+
+    Returns a list of dicts ordered by key.
+    """
+    if group_by not in GROUPINGS:
+        raise ValueError(f"Unknown grouping '{group_by}'")
+
+    rows = {}
+
+    def row_for(key):
+        return rows.setdefault(key, empty_totals())
+
+    if group_by in ('category', 'product'):
+        if group_by == 'category':
+            key_cols, group_cols = (BillItem.category,), (BillItem.category,)
+        else:
+            # Name is a snapshot and may vary between sales, report the latest spelling
+            key_cols, group_cols = (BillItem.product_id, db.func.max(BillItem.product_name)), (BillItem.product_id,)
+        q = _in_range(
+            db.session.query(
+                *key_cols,
+                db.func.sum(BillItem.subtotal),
+                db.func.sum(BillItem.cost_at_sale * BillItem.quantity),
+                db.func.count(db.distinct(BillItem.bill_id))
+            )
+            .select_from(BillItem)
+            .join(Bill, Bill.id == BillItem.bill_id),
+            Bill.date, start, end
+        ).group_by(*group_cols)
+        for *key, sales, cogs, count in q:
+            row = row_for(tuple(key) if len(key) > 1 else key[0])
+            row['sales'] = sales or 0.0
+            row['cogs'] = cogs or 0.0
+            row['bill_count'] = count
+    else:
+        bill_bucket = period_bucket(Bill.date, group_by)
+        expense_bucket = period_bucket(Expense.date, group_by)
+
+        sales_q = _in_range(
+            db.session.query(bill_bucket, db.func.sum(Bill.total_amount), db.func.count(Bill.id)),
+            Bill.date, start, end
+        ).group_by(bill_bucket)
+        for key, sales, count in sales_q:
+            row = row_for(as_date(key))
+            row['sales'] = sales or 0.0
+            row['bill_count'] = count
+
+        cogs_q = _in_range(
+            db.session.query(bill_bucket, db.func.sum(BillItem.cost_at_sale * BillItem.quantity))
+            .select_from(BillItem)
+            .join(Bill, Bill.id == BillItem.bill_id),
+            Bill.date, start, end
+        ).group_by(bill_bucket)
+        for key, cogs in cogs_q:
+            row_for(as_date(key))['cogs'] = cogs or 0.0
+
+        expense_q = _in_range(
+            db.session.query(expense_bucket, db.func.sum(Expense.amount)),
+            Expense.date, start, end
+        ).group_by(expense_bucket)
+        for key, amount in expense_q:
+            row_for(as_date(key))['expenses'] = amount or 0.0
+
+    result = []
+    for key in sorted(rows, key=lambda k: (k is None, k)):
+        row = rows[key]
+        row['profit'] = row['sales'] - row['cogs'] - row['expenses']
+        result.append(dict(key=key, **row))
+    return result
+
+
+def report_json(rows, group_by):
+    """profit_report() rows ready for JSON, with the key spelled out as period, category or product."""
+    for row in rows:
+        key = row.pop('key')
+        if group_by == 'product':
+            row['product_id'], row['product_name'] = key
+        elif group_by == 'category':
+            row['category'] = key
+        else:
+            row['period'] = key.isoformat()
+    return rows
+
+
+def daily_totals(start, end):
+    """Per-day totals for [start, end] read from the daily_summary rollup.
+
+    Returns a dict keyed by date with an entry (zero-filled) for every day.
+    """
+    summaries = DailySummary.query.filter(
+        DailySummary.date >= start,
+        DailySummary.date <= end
+    ).all()
+    days = {}
+    d = start
+    while d <= end:
+        days[d] = empty_totals()
+        d += timedelta(days=1)
+    for row in summaries:
+        days[row.date] = {
+            'sales': row.sales,
+            'cogs': row.cogs,
+            'expenses': row.expenses,
+            'profit': row.profit,
+            'bill_count': row.bill_count
+        }
+    return days
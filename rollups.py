@@ -0,0 +1,79 @@
+from models import db, DailySummary
+from reports import as_date, profit_report
+from store_calendar import store_calendar
+
+SUMMARY_FIELDS = ('sales', 'cogs', 'expenses', 'bill_count')
+
+
+def _upsert_stmt(values):
+    """Build an INSERT that adds `values` onto an existing row for the same day."""
+    table = DailySummary.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**values)
+        return stmt.on_duplicate_key_update(
+            **{f: table.c[f] + stmt.inserted[f] for f in SUMMARY_FIELDS}
+        )
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.date],
+        set_={f: table.c[f] + stmt.excluded[f] for f in SUMMARY_FIELDS}
+    )
+
+
+def add_to_summary(day, sales=0.0, cogs=0.0, expenses=0.0, bill_count=0):
+    """Apply deltas to a day's rollup row inside the caller's transaction."""
+    db.session.execute(_upsert_stmt({
+        'date': as_date(day),
+        'sales': sales or 0.0,
+        'cogs': cogs or 0.0,
+        'expenses': expenses or 0.0,
+        'bill_count': bill_count
+    }))
+
+
+def record_bill(bill, cogs):
+    add_to_summary(store_calendar.business_day(bill.date), sales=bill.total_amount, cogs=cogs, bill_count=1)
+
+
+def record_expense(expense):
+    add_to_summary(store_calendar.business_day(expense.date), expenses=expense.amount)
+
+
+def rebuild_daily_summary(start=None, end=None):
+    """Recompute rollup rows for [start, end] (inclusive dates) from bills and expenses.
+
+    The old rows are deleted before the totals are read. The delete's locks
+    (InnoDB row and gap locks on those days, or SQLite's write lock) make a
+    checkout or expense that would update them wait until the rebuild commits,
+    so the totals include every bill committed before it and a later bill's
+    upsert lands on the new row instead of being overwritten. That makes it
+    safe to run while trading, at the cost of those checkouts waiting for it;
+    rebuild a month at a time (as the rebuild_summary job does) to keep the
+    wait short.
+
+    Returns the number of days written.
+    """
+    try:
+        stale = DailySummary.query
+        if start:
+            stale = stale.filter(DailySummary.date >= start)
+        if end:
+            stale = stale.filter(DailySummary.date <= end)
+        stale.delete(synchronize_session=False)
+
+        days = profit_report(start, end, group_by='day')
+        if days:
+            db.session.execute(
+                DailySummary.__table__.insert(),
+                [{'date': row['key'], **{f: row[f] for f in SUMMARY_FIELDS}} for row in days]
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(days)
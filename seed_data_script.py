@@ -1,7 +1,13 @@
-from app import app, db, Product, Bill, BillItem, Expense
+from app import create_app, db, Product, Bill, BillItem, Expense
+from bill_numbers import bill_numbers
+from rollups import record_bill, record_expense
+from stock_ledger import movement, record_movements
+from store_calendar import store_calendar
 from datetime import datetime, timedelta
 import random
 
+app = create_app()
+
 def seed_data():
     with app.app_context():
         print("Seeding data...")
@@ -16,6 +22,8 @@ def seed_data():
                 Product(name="Rice (1kg)", barcode="1005", price=5.00, cost_price=3.50, stock_quantity=20, category="Grains")
             ]
             db.session.add_all(products)
+            db.session.flush()
+            record_movements([movement(p.id, p.stock_quantity, 'restock', note='Seed data') for p in products])
             db.session.commit()
             print("Added Products.")
         
@@ -24,31 +32,40 @@ def seed_data():
         # Generate Sales for last 7 days
         for i in range(7):
             day = datetime.now() - timedelta(days=i)
-            # Create 3-8 bills per day
-            for _ in range(random.randint(3, 8)):
-                bill = Bill(customer_name="Walk-in Customer", total_amount=0, date=day)
+            # Create 3-8 bills per day; numbers are taken before this day's writes,
+            # the allocator commits on its own connection
+            numbers = bill_numbers.take(store_calendar.business_day(day), random.randint(3, 8))
+            for number in numbers:
+                bill = Bill(bill_number=number, customer_name="Walk-in Customer", total_amount=0, date=day)
                 db.session.add(bill)
                 db.session.flush() # get ID
                 
                 total = 0
+                cogs = 0
                 # Add 1-5 items
                 for _ in range(random.randint(1, 5)):
                     p = random.choice(products)
                     qty = random.randint(1, 3)
-                    item = BillItem(bill_id=bill.id, product_id=p.id, product_name=p.name, 
-                                    quantity=qty, price=p.price, total=p.price*qty)
-                    total += item.total
+                    item = BillItem(bill_id=bill.id, product_id=p.id, quantity=qty,
+                                    price_at_sale=p.price, subtotal=p.price*qty, cost_at_sale=p.cost_price,
+                                    product_name=p.name, category=p.category)
+                    total += item.subtotal
+                    cogs += p.cost_price * qty
                     db.session.add(item)
                 
+                bill.subtotal = total
                 bill.total_amount = total
+                record_bill(bill, cogs)
             
             # Add Expenses
             if random.choice([True, False]):
                 exp = Expense(description="Daily Maintenance", amount=random.uniform(10, 50), category="Operational", date=day)
                 db.session.add(exp)
+                record_expense(exp)
+            db.session.commit()
         
-        db.session.commit()
         print("Seeding Complete! Dashboard should now show data.")
+        print("For load-test volumes use generate_data.py instead.")
 
 if __name__ == "__main__":
     seed_data()
@@ -0,0 +1,49 @@
+import threading
+import time
+from models import Settings
+
+SETTINGS_FIELDS = ('shop_name', 'address', 'phone', 'currency_symbol', 'default_tax_rate')
+
+
+class SettingsCache:
+    """Process-wide copy of the single Settings row.
+
+    Receipts and /api/settings read it on every request, but it changes only
+    through the settings form, which calls invalidate(). The copy is a plain
+    dict (templates read it with the same `settings.shop_name` syntax), so it
+    is safe to share between threads. Other workers refresh after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0
+        self._generation = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SETTINGS_CACHE_TTL', self.ttl)
+        app.extensions['settings_cache'] = self
+
+    def get(self):
+        """Settings as a dict, or None if the shop hasn't saved any yet."""
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._value
+            generation = self._generation
+        row = Settings.query.first()
+        value = {f: getattr(row, f) for f in SETTINGS_FIELDS} if row else None
+        with self._lock:
+            # Don't cache a read that raced with a settings save
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._expires_at = 0
+
+
+settings_cache = SettingsCache()
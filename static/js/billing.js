@@ -1,7 +1,86 @@
 let billItems = [];
 let shopSettings = { currency_symbol: '$', default_tax_rate: 0 };
 
-document.addEventListener('DOMContentLoaded', loadSettings);
+// Offline till: products are looked up in a local snapshot. Finished bills go to
+// /api/checkout; when the server can't be reached they are queued in IndexedDB
+// and sent to /api/checkout/batch in the background.
+const SYNC_BATCH_SIZE = 50;
+const SYNC_INTERVAL_MS = 15000;
+const SNAPSHOT_INTERVAL_MS = 5 * 60 * 1000;
+// How long a sale waits for the server before the till queues it offline
+const CHECKOUT_TIMEOUT_MS = 8000;
+
+let tillDb = null;
+let catalog = new Map();
+let syncing = null;
+
+document.addEventListener('DOMContentLoaded', async () => {
+    loadSettings();
+    try {
+        tillDb = await openTillDb();
+        await loadSnapshot();
+    } catch (e) { console.error('Offline storage unavailable', e); }
+    refreshSnapshot();
+    syncOutbox();
+    setInterval(syncOutbox, SYNC_INTERVAL_MS);
+    setInterval(refreshSnapshot, SNAPSHOT_INTERVAL_MS);
+    window.addEventListener('online', syncOutbox);
+});
+
+function openTillDb() {
+    return new Promise((resolve, reject) => {
+        const req = indexedDB.open('till', 1);
+        req.onupgradeneeded = () => {
+            req.result.createObjectStore('products', { keyPath: 'barcode' });
+            req.result.createObjectStore('outbox', { keyPath: 'client_ref' });
+            req.result.createObjectStore('rejected', { keyPath: 'client_ref' });
+        };
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+// Run fn(store) in a transaction; resolves with the last request's result once committed
+function withStore(name, mode, fn) {
+    return new Promise((resolve, reject) => {
+        const tx = tillDb.transaction(name, mode);
+        const req = fn(tx.objectStore(name));
+        tx.oncomplete = () => resolve(req ? req.result : undefined);
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+async function loadSnapshot() {
+    const products = await withStore('products', 'readonly', s => s.getAll());
+    catalog = new Map(products.map(p => [p.barcode, p]));
+}
+
+async function refreshSnapshot() {
+    try {
+        const response = await fetch('/api/products');
+        if (!response.ok) return;
+        const products = await response.json();
+        catalog = new Map(products.map(p => [p.barcode, p]));
+        if (tillDb) {
+            await withStore('products', 'readwrite', s => {
+                s.clear();
+                products.forEach(p => s.put(p));
+            });
+        }
+    } catch (e) { console.warn('Product snapshot not refreshed', e); }
+}
+
+function searchSnapshot(query) {
+    const q = query.toLowerCase();
+    const matches = [];
+    for (const p of catalog.values()) {
+        if (p.name.toLowerCase().includes(q) || p.barcode.startsWith(query)) {
+            matches.push(p);
+            if (matches.length === 20) break;
+        }
+    }
+    return matches;
+}
 
 async function loadSettings() {
     try {
@@ -28,24 +107,35 @@ async function searchProduct() {
     const query = document.getElementById('productSearch').value;
     if (!query) return;
 
+    const addScanned = (product) => {
+        addItemToBill(product);
+        document.getElementById('productSearch').value = '';
+        document.getElementById('searchResults').innerHTML = '';
+    };
+
+    // Scans hit the local snapshot first, so they don't wait on the server
+    const local = catalog.get(query.trim());
+    if (local) {
+        addScanned(local);
+        return;
+    }
+
     try {
         // Try exact barcode match first
-        let response = await fetch(`/api/product/${query}`);
+        let response = await fetch(`/api/product/${encodeURIComponent(query)}`);
         if (response.ok) {
-            const product = await response.json();
-            addItemToBill(product);
-            document.getElementById('productSearch').value = '';
-            document.getElementById('searchResults').innerHTML = '';
+            addScanned(await response.json());
             return;
         }
 
         // Fallback to name search
-        response = await fetch(`/api/products?q=${query}`);
+        response = await fetch(`/api/products?q=${encodeURIComponent(query)}&limit=20`);
         const products = await response.json();
         displaySearchResults(products);
 
     } catch (e) {
-        console.error('Error searching:', e);
+        console.warn('Server unreachable, searching offline snapshot', e);
+        displaySearchResults(searchSnapshot(query));
     }
 }
 
@@ -170,6 +260,8 @@ async function processCheckout() {
     const paymentMode = document.getElementById('paymentMode').value;
 
     const payload = {
+        client_ref: crypto.randomUUID(),
+        date: new Date().toISOString(),
         customer_name: customerName,
         subtotal: subtotal,
         tax_amount: taxAmount,
@@ -179,31 +271,196 @@ async function processCheckout() {
         items: billItems
     };
 
+    let response;
+    try {
+        response = await postCheckout(payload);
+    } catch (e) {
+        console.warn('Server unreachable, queueing the sale on this till', e);
+        await queueOffline(payload);
+        return;
+    }
+
+    if (response.ok) {
+        clearTill();
+        saleComplete(await response.json());
+    } else {
+        const err = await response.json().catch(() => ({ error: response.statusText }));
+        alert('Checkout Failed: ' + err.error);
+    }
+}
+
+// POST the sale; rejects on a network failure or when the server doesn't answer in time
+async function postCheckout(payload) {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), CHECKOUT_TIMEOUT_MS);
     try {
-        const response = await fetch('/api/checkout', {
+        return await fetch('/api/checkout', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload)
+            body: JSON.stringify(payload),
+            signal: controller.signal
         });
+    } finally {
+        clearTimeout(timer);
+    }
+}
 
-        if (response.ok) {
-            const result = await response.json();
-            // Ask to print
-            if (confirm('Sale Complete! Print Receipt?')) {
-                window.open(`/receipt/${result.bill_id}`, '_blank', 'width=400,height=600');
-            }
-
-            // Reset
-            billItems = [];
-            renderBill();
-            document.getElementById('customerName').value = '';
-            document.getElementById('discountAmount').value = 0;
-        } else {
-            const err = await response.json();
-            alert('Checkout Failed: ' + err.error);
-        }
-    } catch (e) {
-        console.error(e);
+// Keep a sale the server couldn't take. It is marked offline: the customer already has
+// the goods, so the server saves it on sync even if stock has run short meanwhile. A
+// request that timed out may have been saved after all; its client_ref makes the sync
+// report it as a duplicate instead of selling it twice.
+async function queueOffline(payload) {
+    if (!tillDb) {
         alert('Network error during checkout');
+        return;
+    }
+    try {
+        await withStore('outbox', 'readwrite', s => s.put({ ...payload, offline: true }));
+    } catch (e) {
+        console.error('Could not queue the sale on this till', e);
+        alert('Network error during checkout, and the sale could not be saved on this till');
+        return;
+    }
+    clearTill();
+    updateSyncStatus();
+    alert('Server unreachable. Sale saved on this till; it will sync when the server is reachable.');
+}
+
+function clearTill() {
+    billItems = [];
+    renderBill();
+    document.getElementById('customerName').value = '';
+    document.getElementById('discountAmount').value = 0;
+}
+
+function saleComplete(result) {
+    // Ask to print
+    if (confirm('Sale Complete! Print Receipt?')) {
+        window.open(`/receipt/${result.bill_id}`, '_blank', 'width=400,height=600');
+    }
+}
+
+// Send queued bills in batches. Saved and duplicate bills leave the outbox; bills the
+// server refuses for good move to `rejected`. Resolves with results by client_ref.
+function syncOutbox() {
+    if (!syncing) {
+        syncing = drainOutbox().finally(() => {
+            syncing = null;
+            updateSyncStatus();
+        });
+    }
+    return syncing;
+}
+
+async function drainOutbox() {
+    const results = {};
+    if (!tillDb) return results;
+    const queued = await withStore('outbox', 'readonly', s => s.getAll());
+    queued.sort((a, b) => a.date.localeCompare(b.date));
+
+    for (let i = 0; i < queued.length; i += SYNC_BATCH_SIZE) {
+        const batch = queued.slice(i, i + SYNC_BATCH_SIZE);
+        let response;
+        try {
+            response = await fetch('/api/checkout/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ bills: batch })
+            });
+        } catch (e) {
+            break; // Offline; try again on the next tick
+        }
+        if (!response.ok) break;
+
+        const { results: batchResults } = await response.json();
+        await new Promise((resolve, reject) => {
+            const tx = tillDb.transaction(['outbox', 'rejected'], 'readwrite');
+            batchResults.forEach((result, n) => {
+                const bill = batch[n];
+                results[bill.client_ref] = result;
+                if (result.status !== 'error') {
+                    tx.objectStore('outbox').delete(bill.client_ref);
+                } else if (!result.retry) {
+                    tx.objectStore('rejected').put({ ...bill, error: result.error });
+                    tx.objectStore('outbox').delete(bill.client_ref);
+                }
+            });
+            tx.oncomplete = resolve;
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+    return results;
+}
+
+async function updateSyncStatus() {
+    const el = document.getElementById('syncStatus');
+    if (!el || !tillDb) return;
+    const pending = await withStore('outbox', 'readonly', s => s.count());
+    const rejected = await withStore('rejected', 'readonly', s => s.getAll());
+    const parts = [];
+    if (pending) parts.push(`${pending} sale(s) waiting to sync`);
+    if (rejected.length) parts.push(`${rejected.length} rejected by server`);
+    el.textContent = parts.length ? parts.join(', ') : 'All sales synced';
+    el.style.color = rejected.length ? 'var(--danger-color)' : (pending ? 'var(--warning-color)' : 'var(--success-color)');
+    renderRejected(rejected);
+}
+
+// Sales the server refused stay on the till until the cashier resubmits or discards them
+function renderRejected(rejected) {
+    const container = document.getElementById('rejectedSales');
+    if (!container) return;
+    container.innerHTML = '';
+    rejected.forEach(bill => {
+        const row = document.createElement('div');
+        row.style.padding = '6px 0';
+        row.style.borderBottom = '1px solid #eee';
+        row.style.fontSize = '0.85rem';
+
+        const text = document.createElement('div');
+        const total = Number(bill.total_amount || 0).toFixed(2);
+        text.textContent = `${new Date(bill.date).toLocaleString()} · ${shopSettings.currency_symbol}${total} · ${bill.error}`;
+        row.appendChild(text);
+
+        const resubmit = document.createElement('button');
+        resubmit.className = 'btn btn-sm btn-primary';
+        resubmit.style.padding = '2px 8px';
+        resubmit.textContent = 'Resubmit';
+        resubmit.onclick = () => resubmitRejected(bill.client_ref);
+
+        const discard = document.createElement('button');
+        discard.className = 'btn btn-sm btn-danger';
+        discard.style.padding = '2px 8px';
+        discard.style.marginLeft = '6px';
+        discard.textContent = 'Discard';
+        discard.onclick = () => discardRejected(bill.client_ref);
+
+        row.append(resubmit, discard);
+        container.appendChild(row);
+    });
+}
+
+// Move a rejected sale back to the outbox, keeping its client_ref so it can't be sold twice
+async function resubmitRejected(clientRef) {
+    await new Promise((resolve, reject) => {
+        const tx = tillDb.transaction(['outbox', 'rejected'], 'readwrite');
+        const req = tx.objectStore('rejected').get(clientRef);
+        req.onsuccess = () => {
+            if (!req.result) return;
+            const { error, ...bill } = req.result;
+            tx.objectStore('outbox').put(bill);
+            tx.objectStore('rejected').delete(clientRef);
+        };
+        tx.oncomplete = resolve;
+        tx.onerror = () => reject(tx.error);
+    });
+    const result = (await syncOutbox())[clientRef];
+    if (result && result.status === 'error') {
+        alert('Still rejected: ' + result.error);
     }
 }
+
+async function discardRejected(clientRef) {
+    if (!confirm('Discard this sale? It will not be recorded.')) return;
+    await withStore('rejected', 'readwrite', s => s.delete(clientRef));
+    updateSyncStatus();
+}
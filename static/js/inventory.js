@@ -0,0 +1,198 @@
+// Inventory table: rows come from /api/inventory a page at a time and only the
+// rows in view (plus a margin) are in the DOM, so a large catalog costs the
+// browser no more than a small one. Totals come from /api/inventory/summary.
+
+const ROW_HEIGHT = 61;
+const PAGE_SIZE = 100;
+const OVERSCAN = 10;
+
+const view = { sort: 'name', order: 'asc', category: '', q: '', lowStock: false };
+let total = 0;
+let loaded = false;
+let pages = new Map();     // page index -> rows; null while the request is in flight
+let byId = new Map();
+let generation = 0;        // bumped whenever the filters change, so stale responses are dropped
+let lowStockThreshold = 5;
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => (
+        { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
+function money(value) {
+    return '$' + Number(value || 0).toFixed(2);
+}
+
+function filterParams(extra = {}) {
+    const params = new URLSearchParams(extra);
+    if (view.category) params.set('category', view.category);
+    if (view.q) params.set('q', view.q);
+    if (view.lowStock) params.set('low_stock', '1');
+    return params;
+}
+
+async function loadPage(index) {
+    if (pages.has(index)) return;
+    const gen = generation;
+    pages.set(index, null);
+    const params = filterParams({ offset: index * PAGE_SIZE, limit: PAGE_SIZE, sort: view.sort, order: view.order });
+    try {
+        const response = await fetch(`/api/inventory?${params}`);
+        const data = await response.json();
+        if (gen !== generation) return;
+        if (!response.ok) throw new Error(data.error);
+        if (data.total !== undefined) {
+            total = data.total;
+            loaded = true;
+        }
+        data.items.forEach(p => byId.set(p.id, p));
+        pages.set(index, data.items);
+        render();
+    } catch (e) {
+        // Forget the page so the next scroll asks again
+        if (gen === generation) pages.delete(index);
+    }
+}
+
+async function loadSummary() {
+    const gen = generation;
+    try {
+        const response = await fetch(`/api/inventory/summary?${filterParams()}`);
+        const summary = await response.json();
+        if (gen !== generation || !response.ok) return;
+        lowStockThreshold = summary.low_stock_threshold;
+        document.getElementById('costValue').textContent = money(summary.cost_value);
+        document.getElementById('sellValue').textContent = money(summary.sell_value);
+        document.getElementById('productCount').textContent = `${summary.products} products`;
+
+        const alert = document.getElementById('lowStockAlert');
+        alert.style.display = summary.low_stock ? 'block' : 'none';
+        document.getElementById('lowStockCount').textContent = summary.low_stock;
+        document.getElementById('lowStockCategories').textContent = summary.low_stock_by_category
+            .map(c => `${c.category || 'Uncategorized'}: ${c.products}`).join(', ');
+
+        const select = document.getElementById('categoryFilter');
+        select.innerHTML = '<option value="">All categories</option>' + summary.categories
+            .filter(c => c.category)
+            .map(c => `<option value="${escapeHtml(c.category)}">${escapeHtml(c.category)} (${c.products})</option>`)
+            .join('');
+        select.value = view.category;
+    } catch (e) {
+        // Totals are informational; the table still works without them
+    }
+}
+
+function rowHtml(p) {
+    const low = p.stock_quantity < lowStockThreshold;
+    return `
+        <tr style="height: ${ROW_HEIGHT}px;" onmouseover="this.style.background='#f8fafc'"
+            onmouseout="this.style.background='transparent'">
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">
+                <div style="font-weight: 500; color: #1e293b;">${escapeHtml(p.name)}</div>
+                <div style="font-size: 0.85rem; color: #94a3b8;">${escapeHtml(p.barcode)}</div>
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; text-align: right; font-family: monospace; font-size: 1rem;">
+                ${money(p.cost_price)}
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; text-align: right; font-family: monospace; font-size: 1rem; font-weight: bold;">
+                ${money(p.price)}
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; text-align: right;">
+                <div style="color: ${p.profit > 0 ? 'var(--success-color)' : 'var(--danger-color)'}; font-weight: bold;">
+                    ${money(p.profit)}
+                </div>
+                <div style="font-size: 0.8rem; color: #64748b;">${Number(p.margin).toFixed(1)}%</div>
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; text-align: center;">
+                <span style="padding: 4px 10px; border-radius: 99px; font-weight: bold; font-size: 0.85rem;
+                    background: ${low ? '#fee2e2' : '#dcfce7'}; color: ${low ? '#991b1b' : '#166534'};">
+                    ${p.stock_quantity}
+                </span>
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; white-space: nowrap; overflow: hidden;">
+                <span style="background: #f1f5f9; color: #475569; padding: 2px 8px; border-radius: 4px; font-size: 0.85rem;">
+                    ${escapeHtml(p.category)}</span>
+            </td>
+            <td style="padding: 0 12px; border-bottom: 1px solid #eee; text-align: right; white-space: nowrap;">
+                <button class="btn btn-sm btn-primary" onclick="openEditModal(byId.get(${p.id}))"
+                    style="margin-right: 5px;">Edit</button>
+                <button class="btn btn-sm btn-danger" onclick="deleteProduct(${p.id})">Del</button>
+            </td>
+        </tr>`;
+}
+
+function spacer(height) {
+    return height > 0 ? `<tr style="height: ${height}px;"><td colspan="7" style="padding: 0; border: 0;"></td></tr>` : '';
+}
+
+function render() {
+    const scroller = document.getElementById('inventoryScroll');
+    const tbody = document.getElementById('inventoryRows');
+    if (loaded && total === 0) {
+        tbody.innerHTML = `<tr><td colspan="7" style="text-align: center; padding: 30px; color: #94a3b8;">
+            No products found. Start adding inventory above!</td></tr>`;
+        return;
+    }
+    const first = Math.max(0, Math.floor(scroller.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(total, Math.ceil((scroller.scrollTop + scroller.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    const rows = [];
+    for (let i = first; i < last; i++) {
+        const page = pages.get(Math.floor(i / PAGE_SIZE));
+        const product = page && page[i % PAGE_SIZE];
+        rows.push(product ? rowHtml(product) : `<tr style="height: ${ROW_HEIGHT}px;">
+            <td colspan="7" style="padding: 0 12px; color: #cbd5e1; border-bottom: 1px solid #eee;">Loading...</td></tr>`);
+    }
+    tbody.innerHTML = spacer(first * ROW_HEIGHT) + rows.join('') + spacer((total - last) * ROW_HEIGHT);
+    for (let p = Math.floor(first / PAGE_SIZE); p * PAGE_SIZE < last; p++) {
+        loadPage(p);
+    }
+}
+
+function refreshInventory() {
+    generation++;
+    pages = new Map();
+    byId = new Map();
+    loaded = false;
+    document.getElementById('inventoryScroll').scrollTop = 0;
+    loadPage(0);
+    loadSummary();
+}
+
+function sortBy(column) {
+    view.order = view.sort === column && view.order === 'asc' ? 'desc' : 'asc';
+    view.sort = column;
+    document.querySelectorAll('#inventoryScroll th[data-sort]').forEach(th => {
+        th.querySelector('.sort-arrow').textContent =
+            th.dataset.sort === view.sort ? (view.order === 'asc' ? ' ▲' : ' ▼') : '';
+    });
+    refreshInventory();
+}
+
+function showLowStock() {
+    document.getElementById('lowStockFilter').checked = true;
+    view.lowStock = true;
+    refreshInventory();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    let frame = null;
+    document.getElementById('inventoryScroll').addEventListener('scroll', () => {
+        if (!frame) frame = requestAnimationFrame(() => { frame = null; render(); });
+    });
+
+    let typing = null;
+    document.getElementById('nameFilter').addEventListener('input', e => {
+        clearTimeout(typing);
+        typing = setTimeout(() => { view.q = e.target.value.trim(); refreshInventory(); }, 250);
+    });
+    document.getElementById('categoryFilter').addEventListener('change', e => {
+        view.category = e.target.value;
+        refreshInventory();
+    });
+    document.getElementById('lowStockFilter').addEventListener('change', e => {
+        view.lowStock = e.target.checked;
+        refreshInventory();
+    });
+
+    refreshInventory();
+});
@@ -0,0 +1,308 @@
+"""Stock movement ledger: every stock change, and the source of truth for sales.
+
+A sale only appends 'pending' rows to stock_movements; it never updates the
+product rows. Checkout still locks its products (in id order), but reads what
+is on hand as products.stock_quantity plus the product's pending movements,
+so the hot rows are locked and read rather than rewritten on every bill.
+fold() adds pending movements into products.stock_quantity in one UPDATE per
+batch, on the StockFolder's interval and before anything else writes the
+column (restocks, edits, imports), so stock lists and lookups trail sales by
+at most STOCK_FOLD_INTERVAL seconds while checkout always checks the exact
+figure.
+
+The ledger also answers "what was on hand at a past moment" (snapshots plus
+the movements since), and drift() checks it still agrees with the products.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from models import db, Product, StockMovement, StockSnapshot
+from pagination import keyset_batches
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('sale', 'restock', 'adjustment', 'return')
+# Kinds that can be entered by hand through the API; sales come from checkout
+MANUAL_KINDS = ('restock', 'adjustment', 'return')
+# A snapshot leaves out the most recent movements: one stamped a moment ago may
+# belong to a checkout that hasn't committed yet
+SNAPSHOT_LAG = timedelta(minutes=5)
+SNAPSHOT_CHUNK = 5000
+
+
+def movement(product_id, quantity, kind, bill_id=None, note=None, at=None, pending=False):
+    """A stock_movements row. `at` is when the stock moved if not now, e.g. an
+    offline sale's bill date; a time in the future (a till's clock running
+    fast) is taken as now."""
+    # Whole seconds everywhere: MySQL DATETIME columns would round the fraction,
+    # which can move a movement past a snapshot cutoff
+    now = datetime.now().replace(microsecond=0)
+    occurred = min(at.replace(microsecond=0), now) if at else now
+    return {'product_id': product_id, 'quantity': quantity, 'kind': kind, 'bill_id': bill_id,
+            'note': note, 'created_at': now, 'occurred_at': occurred, 'pending': pending}
+
+
+def record_movements(rows):
+    """Append movements inside the caller's transaction with one executemany INSERT.
+
+    Whoever changes products.stock_quantity records the change here in the same
+    transaction, so the ledger and the on-hand column commit or roll back together.
+    """
+    rows = [row for row in rows if row['quantity']]
+    if rows:
+        db.session.execute(db.insert(StockMovement), rows)
+
+
+def lock_products(product_ids):
+    """{id: Product} for `product_ids`, locked FOR UPDATE and freshly read.
+
+    Every stock writer locks its products first, in id order, so two of them
+    touching the same products queue behind each other instead of deadlocking.
+    """
+    if not product_ids:
+        return {}
+    locked = (Product.query.filter(Product.id.in_(product_ids)).order_by(Product.id)
+              .with_for_update().populate_existing().all())
+    return {p.id: p for p in locked}
+
+
+def pending_stock(product_ids=None):
+    """{product_id: sum of its pending movements} for `product_ids` (default: all) that have any.
+
+    Read after lock_products(): no sale can add to them while the locks are
+    held, and at READ COMMITTED (see create_app) this sees every one committed
+    before.
+    """
+    query = db.session.query(StockMovement.product_id, db.func.sum(StockMovement.quantity)) \
+        .filter(StockMovement.pending.is_(True))
+    if product_ids is not None:
+        if not product_ids:
+            return {}
+        query = query.filter(StockMovement.product_id.in_(product_ids))
+    return {pid: int(qty) for pid, qty in query.group_by(StockMovement.product_id)}
+
+
+def on_hand(product_ids):
+    """{product_id: stock on hand, pending sales included} for existing products."""
+    stock = dict(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(product_ids)))
+    pending = pending_stock(list(stock))
+    return {pid: (qty or 0) + pending.get(pid, 0) for pid, qty in stock.items()}
+
+
+def fold(product_ids=None):
+    """Add pending movements into products.stock_quantity inside the caller's transaction.
+
+    Folds the given products, or every product with pending movements. Call it
+    before changing stock_quantity any other way, so the change starts from the
+    exact figure. Returns {product_id: quantity folded}.
+    """
+    if product_ids is None:
+        product_ids = [pid for (pid,) in db.session.query(StockMovement.product_id)
+                       .filter(StockMovement.pending.is_(True)).distinct()]
+    lock_products(product_ids)
+    deltas = pending_stock(product_ids)
+    if not deltas:
+        return {}
+    table = Product.__table__
+    db.session.execute(
+        db.update(table).where(table.c.id == db.bindparam('b_id'))
+        .values(stock_quantity=table.c.stock_quantity + db.bindparam('b_delta')),
+        [{'b_id': pid, 'b_delta': delta} for pid, delta in deltas.items()]
+    )
+    # Exactly the rows just summed: more for these products wait on the locks
+    db.session.execute(
+        db.update(StockMovement).where(StockMovement.pending.is_(True), StockMovement.product_id.in_(deltas))
+        .values(pending=False).execution_options(synchronize_session=False)
+    )
+    db.session.expire_all()
+    return deltas
+
+
+class StockFolder:
+    """Folds pending sales into products.stock_quantity at most every `interval` seconds.
+
+    after_sale() runs in the request that just committed a sale, in its own
+    transaction. Only one thread per worker folds at a time, and a sale that
+    arrives while one is folding doesn't wait for it.
+    """
+
+    def __init__(self, interval=5):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = 0.0
+        self.folds = 0
+
+    def init_app(self, app):
+        self.interval = app.config.get('STOCK_FOLD_INTERVAL', self.interval)
+        app.extensions['stock_folder'] = self
+
+    def after_sale(self):
+        """Fold if the interval has passed; returns the barcodes whose stock changed.
+
+        The sale has already committed, so a fold that fails is logged and left
+        for the next one.
+        """
+        if time.monotonic() - self._last < self.interval or not self._lock.acquire(blocking=False):
+            return []
+        try:
+            self._last = time.monotonic()
+            return self.fold()
+        except Exception:
+            logger.exception('Folding pending sales into stock failed')
+            return []
+        finally:
+            self._lock.release()
+
+    def fold(self):
+        try:
+            folded = fold()
+            barcodes = [b for (b,) in db.session.query(Product.barcode).filter(Product.id.in_(folded))]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.folds += 1
+        return barcodes
+
+
+stock_folder = StockFolder()
+
+
+def apply_movements(entries):
+    """Restocks, returns and adjustments entered by hand, applied as one transaction.
+
+    Each entry is {'product_id' or 'barcode', 'kind', 'quantity', 'note'?}.
+    Raises ValueError, with nothing written, if any entry is invalid or would
+    take a product's stock below zero. Returns the movements written.
+    """
+    rows = []
+    barcodes = {e.get('barcode') for e in entries if not e.get('product_id') and e.get('barcode')}
+    ids = {}
+    if barcodes:
+        ids = dict(db.session.query(Product.barcode, Product.id).filter(Product.barcode.in_(barcodes)))
+    for n, entry in enumerate(entries, 1):
+        kind = entry.get('kind')
+        if kind not in MANUAL_KINDS:
+            raise ValueError(f"Entry {n}: kind must be one of {', '.join(MANUAL_KINDS)}")
+        try:
+            quantity = int(entry.get('quantity'))
+        except (TypeError, ValueError):
+            raise ValueError(f'Entry {n}: quantity must be a whole number')
+        if quantity == 0 or (kind != 'adjustment' and quantity < 0):
+            raise ValueError(f'Entry {n}: quantity must be positive' if kind != 'adjustment'
+                             else f'Entry {n}: quantity must not be zero')
+        product_id = entry.get('product_id') or ids.get(entry.get('barcode'))
+        if not product_id:
+            raise ValueError(f'Entry {n}: unknown product')
+        rows.append(movement(product_id, quantity, kind, note=str(entry.get('note') or '')[:200] or None))
+
+    deltas = {}
+    for row in rows:
+        deltas[row['product_id']] = deltas.get(row['product_id'], 0) + row['quantity']
+    try:
+        fold(list(deltas))
+        locked = {pid: p.stock_quantity for pid, p in lock_products(list(deltas)).items()}
+        for product_id, delta in deltas.items():
+            if product_id not in locked:
+                raise ValueError(f'Unknown product {product_id}')
+            # Stock an oversold offline sale left negative can still be counted back up
+            if delta < 0 and locked[product_id] + delta < 0:
+                raise ValueError(f'Product {product_id} would go below zero stock')
+        table = Product.__table__
+        db.session.execute(
+            db.update(table).where(table.c.id == db.bindparam('b_id'))
+            .values(stock_quantity=table.c.stock_quantity + db.bindparam('b_delta')),
+            [{'b_id': pid, 'b_delta': delta} for pid, delta in deltas.items()]
+        )
+        record_movements(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return rows
+
+
+def latest_snapshot(moment=None):
+    """taken_at of the newest snapshot at or before `moment` (default: any), or None."""
+    query = db.session.query(db.func.max(StockSnapshot.taken_at))
+    if moment:
+        query = query.filter(StockSnapshot.taken_at <= moment)
+    return query.scalar()
+
+
+def stock_as_of(moment, product_ids=None, recorded_by=None):
+    """{product_id: quantity on hand} at `moment`.
+
+    Read from the newest snapshot taken by then plus the movements after it,
+    so the cost is bounded by how often compact() runs, not by history length.
+    A movement counts from when the stock moved (occurred_at), so an offline
+    sale synced later still lands at its bill's time; one recorded after the
+    snapshot but dated before it is added in too. With `recorded_by`, only
+    movements recorded by then count. Products with nothing on hand are left
+    out.
+    """
+    base = latest_snapshot(moment)
+    quantities = {}
+    if base:
+        snapshot = db.session.query(StockSnapshot.product_id, StockSnapshot.quantity) \
+            .filter(StockSnapshot.taken_at == base)
+        if product_ids is not None:
+            snapshot = snapshot.filter(StockSnapshot.product_id.in_(product_ids))
+        quantities = dict(snapshot.all())
+
+    deltas = db.session.query(StockMovement.product_id, db.func.sum(StockMovement.quantity)) \
+        .filter(StockMovement.occurred_at <= moment)
+    if base:
+        deltas = deltas.filter(StockMovement.created_at > base)
+    if recorded_by:
+        deltas = deltas.filter(StockMovement.created_at <= recorded_by)
+    if product_ids is not None:
+        deltas = deltas.filter(StockMovement.product_id.in_(product_ids))
+    for product_id, delta in deltas.group_by(StockMovement.product_id):
+        quantities[product_id] = quantities.get(product_id, 0) + int(delta)
+    return {pid: qty for pid, qty in quantities.items() if qty}
+
+
+def compact(cutoff=None):
+    """Fold the movements up to `cutoff` (default: SNAPSHOT_LAG ago) into a new snapshot.
+
+    Returns (taken_at, products in the snapshot), or (None, 0) if there is
+    already a snapshot at or after `cutoff`. Run it periodically, e.g. nightly
+    from cron with `flask compact-stock`.
+    """
+    cutoff = (cutoff or datetime.now() - SNAPSHOT_LAG).replace(microsecond=0)
+    latest = latest_snapshot()
+    if latest and latest >= cutoff:
+        return None, 0
+    rows = [{'taken_at': cutoff, 'product_id': pid, 'quantity': qty} for pid, qty in stock_as_of(cutoff, recorded_by=cutoff).items()]
+    try:
+        for start in range(0, len(rows), SNAPSHOT_CHUNK):
+            db.session.execute(db.insert(StockSnapshot), rows[start:start + SNAPSHOT_CHUNK])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return cutoff, len(rows)
+
+
+def drift():
+    """Products whose stock on hand (stock_quantity plus pending sales) disagrees with the ledger.
+
+    Returns [{'product_id', 'barcode', 'stock_quantity', 'ledger'}]; empty when
+    every stock change went through the ledger.
+    """
+    ledger = stock_as_of(datetime.now())
+    pending = pending_stock()
+    mismatches = []
+    products = db.select(Product.id, Product.barcode, Product.stock_quantity)
+    for product_id, barcode, quantity in keyset_batches(products, Product.id, 5000):
+        quantity = (quantity or 0) + pending.get(product_id, 0)
+        expected = ledger.pop(product_id, 0)
+        if quantity != expected:
+            mismatches.append({'product_id': product_id, 'barcode': barcode,
+                               'stock_quantity': quantity, 'ledger': expected})
+    # Stock the ledger still holds for products that no longer exist
+    mismatches.extend({'product_id': pid, 'barcode': None, 'stock_quantity': None, 'ledger': qty}
+                      for pid, qty in ledger.items())
+    return mismatches
@@ -0,0 +1,132 @@
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import Date, DateTime, event
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.functions import FunctionElement
+from models import db
+
+
+class StoreCalendar:
+    """Maps the shop's business days onto the naive datetimes stored in bills/expenses.
+
+    A business day starts at `day_start` (e.g. 04:00, so sales after midnight
+    count towards the evening before) in the store's timezone. Stored datetimes
+    are naive server-local time, which is what datetime.now() writes, so each
+    boundary is converted once in Python and the query compares the raw column
+    against it: `column >= start AND column < end`, which an index can serve.
+    Never filter with DATE(column) or similar; see sargable_guard().
+    """
+
+    def __init__(self, timezone=None, day_start=time.min):
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self.day_start = day_start
+
+    def init_app(self, app):
+        tz = app.config.get('STORE_TIMEZONE')
+        self.timezone = ZoneInfo(tz) if tz else None
+        self.day_start = time.fromisoformat(app.config.get('BUSINESS_DAY_START', '00:00'))
+        app.extensions['store_calendar'] = self
+
+    def start_of(self, day):
+        """Stored-time datetime at which business day `day` begins."""
+        start = datetime.combine(day, self.day_start)
+        if self.timezone:
+            start = start.replace(tzinfo=self.timezone).astimezone().replace(tzinfo=None)
+        return start
+
+    def business_day(self, moment):
+        """The business day a stored datetime falls in."""
+        if self.timezone:
+            moment = moment.astimezone(self.timezone).replace(tzinfo=None)
+        return (moment - timedelta(hours=self.day_start.hour, minutes=self.day_start.minute)).date()
+
+    def today(self):
+        return self.business_day(datetime.now())
+
+    def bounds(self, start=None, end=None):
+        """Half-open [from, to) stored-time bounds covering business days start..end inclusive.
+
+        Either side may be None for an open range.
+        """
+        return (self.start_of(start) if start else None,
+                self.start_of(end + timedelta(days=1)) if end else None)
+
+    def filter(self, query, column, start=None, end=None):
+        """Restrict a Query or Select to business days start..end (inclusive dates)."""
+        low, high = self.bounds(start, end)
+        if low:
+            query = query.filter(column >= low)
+        if high:
+            query = query.filter(column < high)
+        return query
+
+    def shift(self):
+        """How far business days are offset from server-local midnight, for bucketing in SQL.
+
+        Taken at today's date, so a period spanning a DST change in the store's
+        zone buckets the hour around it by the current offset.
+        """
+        today = date.today()
+        return self.start_of(today) - datetime.combine(today, time.min)
+
+
+store_calendar = StoreCalendar()
+
+
+def indexed_date_columns(metadata=db.metadata):
+    """Date/datetime columns that are the leading column of some index or primary key."""
+    columns = set()
+    for table in metadata.tables.values():
+        leading = [list(index.columns)[0] for index in table.indexes]
+        leading += list(table.primary_key.columns)[:1]
+        columns.update(c for c in leading if isinstance(c.type, (Date, DateTime)))
+    return columns
+
+
+def unsargable_filters(statement, columns=None):
+    """Functions wrapped around an indexed date column in a statement's WHERE/ON clauses.
+
+    Returns a list of strings like 'date(bills.date)'; empty when the statement
+    is fine. SELECT-list and GROUP BY expressions are allowed, only filtering matters.
+    """
+    columns = indexed_date_columns() if columns is None else columns
+    if not hasattr(statement, 'get_children'):
+        return []
+    # Subqueries and joins included, e.g. Query.count() wraps the filter in a subquery
+    clauses = []
+    for node in visitors.iterate(statement):
+        for attr in ('whereclause', 'onclause'):
+            clause = getattr(node, attr, None)
+            if clause is not None:
+                clauses.append(clause)
+
+    found = []
+    for clause in clauses:
+        for node in visitors.iterate(clause):
+            if isinstance(node, FunctionElement):
+                wrapped = [c for c in visitors.iterate(node) if c in columns]
+                found.extend(f'{node.name}({c.table.name}.{c.name})' for c in wrapped)
+    return found
+
+
+@contextmanager
+def sargable_guard(engine):
+    """Record every statement run on `engine` inside the block that filters on a
+    function of an indexed date column. Yields the list of (problem, SQL) pairs."""
+    columns = indexed_date_columns()
+    violations = []
+    lock = threading.Lock()
+
+    def before_execute(conn, clauseelement, multiparams, params, execution_options):
+        found = unsargable_filters(clauseelement, columns)
+        if found:
+            with lock:
+                violations.extend((problem, str(clauseelement)) for problem in found)
+
+    event.listen(engine, 'before_execute', before_execute)
+    try:
+        yield violations
+    finally:
+        event.remove(engine, 'before_execute', before_execute)
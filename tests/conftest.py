@@ -0,0 +1,110 @@
+"""Fixtures for the correctness tests.
+
+Each test gets a fresh database: a SQLite file in its tmp_path, or the server
+in TEST_DATABASE_URL (e.g. a scratch MySQL database, where row locks are real)
+emptied afterwards. Timing lives in benchmark.py; these check invariants.
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from models import db
+    from migrate import migrate
+    from analytics import analytics_cache
+    from bill_numbers import bill_numbers
+    from catalog_cache import product_cache
+    from product_search import search_index
+    from shop_settings import settings_cache
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'test.db'}"
+        JOB_RESULTS_DIR = str(tmp_path / 'jobs')
+        # A connection for every thread in the concurrency tests, and one more each for bill number blocks
+        SQLALCHEMY_ENGINE_OPTIONS = {**Config.SQLALCHEMY_ENGINE_OPTIONS, 'pool_size': 50, 'max_overflow': 60}
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine, echo=lambda *a: None)
+        # The singletons outlive an app; forget what they learnt from the last test's database
+        bill_numbers._blocks.clear()
+        analytics_cache._entries.clear()
+        analytics_cache._versions.clear()
+        product_cache.invalidate()
+        settings_cache.invalidate()
+        search_index.invalidate()
+        yield app
+        db.session.remove()
+        if os.environ.get('TEST_DATABASE_URL'):
+            db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_products(app):
+    """make_products(n, stock=...) -> [product ids], added with a restock movement like the API does."""
+    from models import db, Product
+    from stock_ledger import movement, record_movements
+
+    def make(n, stock=100, price=2.0):
+        start = db.session.query(db.func.count(Product.id)).scalar()
+        products = [Product(name=f'Product {i}', barcode=f'T{i:06d}', price=price, cost_price=price / 2,
+                            stock_quantity=stock, category=f'Category {i % 3}') for i in range(start, start + n)]
+        db.session.add_all(products)
+        db.session.flush()
+        record_movements([movement(p.id, stock, 'restock') for p in products])
+        db.session.commit()
+        return [p.id for p in products]
+
+    return make
+
+
+def sold_and_on_hand(product_ids):
+    """{product id: (units sold, on hand)} as committed."""
+    from models import db, BillItem
+    from stock_ledger import on_hand
+
+    db.session.expire_all()
+    sold = dict(db.session.query(BillItem.product_id, db.func.sum(BillItem.quantity))
+                .filter(BillItem.product_id.in_(product_ids)).group_by(BillItem.product_id))
+    stock = on_hand(product_ids)
+    return {pid: (sold.get(pid, 0), stock[pid]) for pid in product_ids}
+
+
+def bill(product_ids, quantity=1, price=2.0, **fields):
+    """A checkout payload selling `quantity` of each product."""
+    items = [{'product_id': pid, 'quantity': quantity, 'price': price, 'subtotal': price * quantity}
+             for pid in product_ids]
+    total = sum(item['subtotal'] for item in items)
+    return {'subtotal': total, 'total_amount': total, 'items': items, **fields}
+
+
+@contextmanager
+def count_queries(engine):
+    """Count statements sent to the database inside the block."""
+    stats = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        stats['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime, timedelta
+
+from analytics import analytics_cache, top_sellers
+from conftest import bill
+from store_calendar import store_calendar
+
+
+def sell(client, product_ids, quantity, days_ago=0):
+    payload = bill(product_ids, quantity=quantity)
+    if not days_ago:
+        assert client.post('/api/checkout', json=payload).status_code == 200
+        return
+    payload.update(client_ref=str(uuid.uuid4()), offline=True,
+                   date=(datetime.now() - timedelta(days=days_ago)).isoformat())
+    assert client.post('/api/checkout/batch', json={'bills': [payload]}).json['results'][0]['status'] == 'created'
+
+
+def misses_for(client, url):
+    before = analytics_cache.misses
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.json, analytics_cache.misses - before
+
+
+def test_a_sale_only_rereads_its_own_day(client, make_products):
+    product_ids = make_products(1)
+    sell(client, product_ids, 1, days_ago=3)
+    url = '/api/analytics?days=7&top=1'
+
+    first, misses = misses_for(client, url)
+    assert misses > 0
+    assert first['totals']['sales'] == 2.0
+    assert misses_for(client, url)[1] == 0
+
+    # Today's sale: today's bucket and today's sellers, never the earlier days or the period before
+    sell(client, product_ids, 2)
+    after, misses = misses_for(client, url)
+    assert misses == 3
+    assert after['totals']['sales'] == 6.0
+    assert [p['quantity'] for p in after['top_products']] == [3]
+    assert after['previous'] == first['previous']
+
+    # An offline sale synced for three days ago: that day's bucket and the earlier days' sellers
+    sell(client, product_ids, 1, days_ago=3)
+    synced, misses = misses_for(client, url)
+    assert synced['totals']['sales'] == 8.0
+    assert misses == 3
+    analytics_cache._entries.clear()
+    assert misses_for(client, url)[0] == synced
+
+
+def test_top_sellers_merge_today_into_earlier_days(client, make_products):
+    product_ids = make_products(7)
+    # Yesterday product n sold 10 - n units
+    for n, pid in enumerate(product_ids):
+        sell(client, [pid], 10 - n, days_ago=1)
+    today = store_calendar.today()
+    start = today - timedelta(days=6)
+
+    def top():
+        return [(p['product_id'], p['quantity']) for p in top_sellers(start, today, limit=1)['products']]
+
+    # Today lifts a candidate from yesterday's top five past the leader: the merge is exact
+    sell(client, [product_ids[1]], 2)
+    assert top() == [(product_ids[1], 11)]
+    assert ('sellers', 'product', start, today, 1) not in analytics_cache._entries
+
+    # Today lifts a product outside yesterday's top five past the leader: the merge
+    # can't be trusted, so the whole range is read
+    sell(client, [product_ids[6]], 8)
+    assert top() == [(product_ids[6], 12)]
+    analytics_cache._entries.clear()
+    assert top() == [(product_ids[6], 12)]
+
+
+def test_dashboard_renders_the_week_before(client, make_products):
+    product_ids = make_products(1)
+    sell(client, product_ids, 2, days_ago=8)
+    sell(client, product_ids, 3)
+
+    page = client.get('/').get_data(as_text=True)
+    assert 'const previousSalesData = [0, 0, 0, 0, 0, 4.0, 0];' in page
+    assert 'Sales +50.0% vs previous period' in page
+    # The same comparison the period picker would fetch
+    assert client.get('/api/analytics?days=7').json['change']['sales'] == 50.0
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from bill_numbers import BillNumberAllocator
+from conftest import bill
+from models import Bill
+
+
+def test_workers_never_issue_the_same_number(app):
+    # Two allocators stand in for two worker processes sharing bill_sequences
+    workers = [BillNumberAllocator(block_size=5), BillNumberAllocator(block_size=5)]
+
+    def draw(n):
+        with app.app_context():
+            return [workers[n % 2].next_number(date(2026, 1, 1)) for _ in range(40)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        drawn = list(pool.map(draw, range(8)))
+
+    issued = [number for numbers in drawn for number in numbers]
+    assert len(issued) == len(set(issued)) == 320
+    # Within a worker, numbers only go up
+    assert all(numbers == sorted(numbers) for numbers in drawn)
+    assert all(number.startswith('S1-20260101-') for number in issued)
+
+
+def test_checkouts_get_unique_numbers_per_sale_day(client, make_products):
+    product_ids = make_products(1, stock=1000)
+    for day in ('2026-03-01T10:00:00', '2026-03-02T10:00:00'):
+        for n in range(3):
+            batch = [bill(product_ids, client_ref=f'{day}-{n}-{i}', date=day) for i in range(4)]
+            client.post('/api/checkout/batch', json={'bills': batch})
+    for _ in range(3):
+        client.post('/api/checkout', json=bill(product_ids))
+
+    numbers = [number for (number,) in Bill.query.with_entities(Bill.bill_number)]
+    assert len(numbers) == len(set(numbers)) == 27
+    assert sum(n.startswith('S1-20260301-') for n in numbers) == 12
+    assert sum(n.startswith('S1-20260302-') for n in numbers) == 12
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import bill, sold_and_on_hand
+from stock_ledger import drift
+
+# SQLite ignores FOR UPDATE and lets one writer at a time hold the file, so only a
+# server with row locks exercises the checkout's locking
+ROW_LOCKS = (os.environ.get('TEST_DATABASE_URL') or '').startswith('mysql')
+
+
+@pytest.mark.skipif(not ROW_LOCKS, reason='needs TEST_DATABASE_URL set to a scratch MySQL database')
+def test_concurrent_checkouts_never_oversell(app, make_products):
+    stock, quantity, tills = 100, 3, 50
+    product_ids = make_products(3, stock=stock)
+
+    def checkout(n):
+        # Each till lists the lines in its own order; the server must still lock consistently
+        lines = product_ids[n % 3:] + product_ids[:n % 3]
+        with app.test_client() as client:
+            return client.post('/api/checkout', json=bill(lines, quantity=quantity)).status_code
+
+    with ThreadPoolExecutor(max_workers=tills) as pool:
+        codes = list(pool.map(checkout, range(tills)))
+
+    assert set(codes) <= {200, 400}
+    assert codes.count(200) == stock // quantity
+    for sold, on_hand in sold_and_on_hand(product_ids).values():
+        assert on_hand >= 0
+        assert sold + on_hand == stock
+    assert drift() == []
+
+
+def test_checkout_refuses_more_than_in_stock(client, make_products):
+    product_ids = make_products(1, stock=2)
+    response = client.post('/api/checkout', json=bill(product_ids, quantity=3))
+    assert response.status_code == 400
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (0, 2)}
+
+
+def test_checkout_rejects_bad_client_ref_and_total(client, make_products):
+    product_ids = make_products(1)
+    for fields in ({'client_ref': {'id': 1}}, {'client_ref': 5}, {'client_ref': 'x' * 65}):
+        response = client.post('/api/checkout', json=bill(product_ids, **fields))
+        assert response.status_code == 400
+        assert 'client_ref' in response.json['error']
+    no_total = bill(product_ids)
+    del no_total['total_amount']
+    response = client.post('/api/checkout', json=no_total)
+    assert response.status_code == 400
+    assert response.json == {'error': 'total_amount must be a number'}
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (0, 100)}
+
+
+def test_checkout_resent_with_the_same_client_ref_returns_the_saved_bill(client, make_products):
+    product_ids = make_products(1)
+    first = client.post('/api/checkout', json=bill(product_ids, client_ref='till-1'))
+    again = client.post('/api/checkout', json=bill(product_ids, client_ref='till-1'))
+    assert again.status_code == 200
+    assert again.json['bill_id'] == first.json['bill_id']
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (1, 99)}
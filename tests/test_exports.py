@@ -0,0 +1,48 @@
+import resource
+from datetime import datetime, timedelta
+
+from exports import generate_export
+from models import db, Bill, BillItem
+
+ROWS = 1_000_000
+LINES_PER_BILL = 10
+
+
+def seed_bill_items(rows, chunk=20_000):
+    """`rows` bill items, LINES_PER_BILL to a bill, one bill a minute up to now."""
+    now = datetime.now().replace(microsecond=0)
+    bills = rows // LINES_PER_BILL
+    for start in range(0, bills, chunk):
+        db.session.execute(Bill.__table__.insert(), [
+            {'id': i + 1, 'bill_number': f'T-{i}', 'date': now - timedelta(minutes=bills - i),
+             'subtotal': 20.0, 'total_amount': 20.0} for i in range(start, min(start + chunk, bills))])
+    for start in range(0, rows, chunk):
+        db.session.execute(BillItem.__table__.insert(), [
+            {'bill_id': i // LINES_PER_BILL + 1, 'product_id': i % 500 + 1, 'product_name': f'Product {i % 500}',
+             'category': 'Category', 'quantity': 1, 'price_at_sale': 2.0, 'cost_at_sale': 1.0, 'subtotal': 2.0}
+            for i in range(start, min(start + chunk, rows))])
+    db.session.commit()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+def export(fmt):
+    """(rows written, MB the process's peak memory grew by while exporting)."""
+    before = peak_rss_mb()
+    lines = 0
+    for chunk in generate_export('bill_items', fmt):
+        lines += chunk.count('\n')
+    return lines, peak_rss_mb() - before
+
+
+def test_export_memory_does_not_grow_with_rows(app):
+    seed_bill_items(ROWS)
+    db.session.expunge_all()
+
+    for fmt, header in (('csv', 1), ('jsonl', 0)):
+        lines, grown = export(fmt)
+        assert lines == ROWS + header
+        # Buffering the result would hold every row: hundreds of MB for a million
+        assert grown < 50, f'{fmt} export grew peak memory by {grown:.0f} MB'
@@ -0,0 +1,99 @@
+import io
+import json
+
+from conftest import bill, sold_and_on_hand
+from models import db, Product, StockMovement
+from product_import import import_products
+from stock_ledger import drift
+
+
+def products():
+    db.session.expire_all()
+    return {p.barcode: (p.name, p.price, p.cost_price, p.stock_quantity, p.category) for p in Product.query}
+
+
+def test_upsert_inserts_and_updates(app):
+    result = import_products([
+        {'barcode': 'A1', 'name': 'Apples', 'price': '1.50', 'stock_quantity': '10', 'cost_price': '1', 'category': 'Fruit'},
+        {'barcode': 'B1', 'name': 'Bread', 'price': 2, 'stock_quantity': 5},
+    ])
+    assert result == {'processed': 2, 'imported': 2, 'failed': 0, 'errors': []}
+
+    # Omitted optional columns keep their stored value; a barcode repeated in a file: the last row wins
+    result = import_products([
+        {'barcode': 'A1', 'name': 'Red Apples', 'price': 1.75, 'stock_quantity': 4},
+        {'barcode': 'B1', 'name': 'Bread', 'price': 2, 'stock_quantity': 6},
+        {'barcode': 'B1', 'name': 'Bread', 'price': 2.25, 'stock_quantity': 8},
+    ], chunk_size=2)
+    assert result['imported'] == 3
+    assert products() == {'A1': ('Red Apples', 1.75, 1.0, 4, 'Fruit'), 'B1': ('Bread', 2.25, 0.0, 8, 'General')}
+    assert drift() == []
+
+
+def test_upsert_reports_bad_rows_and_keeps_the_rest(app):
+    result = import_products([
+        {'barcode': 'A1', 'name': 'Apples', 'price': 1, 'stock_quantity': 1},
+        {'barcode': '', 'name': 'No barcode', 'price': 1, 'stock_quantity': 1},
+        {'barcode': 'C1', 'name': 'Cheese', 'price': 'cheap', 'stock_quantity': 1},
+        {'barcode': 'D1', 'name': 'Dates', 'price': -1, 'stock_quantity': 1},
+        {'barcode': 'E1', 'name': 'Eggs', 'price': 1, 'stock_quantity': -3},
+        {'barcode': 'F1', 'name': 'F' * 101, 'price': 1, 'stock_quantity': 1},
+        ['G1', 'Grapes'],
+        {'barcode': 'H1', 'name': 'Honey', 'price': 1},
+    ])
+    assert (result['processed'], result['imported'], result['failed']) == (8, 1, 7)
+    assert result['errors'] == [
+        {'row': 2, 'error': 'barcode is required'},
+        {'row': 3, 'error': 'price must be a number'},
+        {'row': 4, 'error': 'price must not be negative'},
+        {'row': 5, 'error': 'stock_quantity must not be negative'},
+        {'row': 6, 'error': 'name longer than 100 characters'},
+        {'row': 7, 'error': 'Row must be an object'},
+        {'row': 8, 'error': 'stock_quantity is required'},
+    ]
+    assert list(products()) == ['A1']
+
+
+def test_stock_delta_adjusts_known_products_down_to_zero(client, make_products):
+    product_ids = make_products(3, stock=10)
+    # Sold but maybe not yet folded into stock_quantity: deltas are measured against what is on hand
+    client.post('/api/checkout', json=bill(product_ids[1:2], quantity=8))
+
+    result = import_products([
+        {'barcode': 'T000000', 'quantity': 5},
+        {'barcode': 'T000000', 'quantity': -12},  # deltas for a barcode add up: 10 + 5 - 12
+        {'barcode': 'T000001', 'quantity': -5},   # 2 on hand
+        {'barcode': 'T000002', 'stock_quantity': '-10'},
+        {'barcode': 'NOPE', 'quantity': 1},
+        {'barcode': 'T000002', 'quantity': 'lots'},
+    ], mode='stock_delta')
+    assert result['imported'] == 3
+    assert result['errors'] == [
+        {'row': 6, 'error': 'quantity must be a number'},
+        {'row': 3, 'error': 'Would take stock of T000001 below zero'},
+        {'row': 5, 'error': 'Unknown barcode NOPE'},
+    ]
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (0, 3), product_ids[1]: (8, 2), product_ids[2]: (0, 0)}
+    assert sorted(m.quantity for m in StockMovement.query.filter_by(note='Imported')) == [-10, -7]
+    assert drift() == []
+
+
+def test_import_api_reads_files_and_rejects_bad_requests(client):
+    csv_file = b'\xef\xbb\xbfbarcode,name,price,stock_quantity\nA1,Apples,1.5,10\nB1,Bread,2,oops\n'
+    response = client.post('/api/products/import', data={'file': (io.BytesIO(csv_file), 'products.csv')})
+    assert response.json['imported'] == 1
+    assert response.json['errors'] == [{'row': 2, 'error': 'stock_quantity must be a number'}]
+
+    jsonl = b'{"barcode": "A1", "quantity": 2}\n\n{"barcode": "A1", "quantity": 3}\n'
+    response = client.post('/api/products/import?mode=stock_delta',
+                           data={'file': (io.BytesIO(jsonl), 'deltas.jsonl')})
+    assert response.json['imported'] == 2
+    assert products()['A1'][3] == 15
+
+    assert client.post('/api/products/import?mode=replace', json=[]).status_code == 400
+    assert client.post('/api/products/import', json={'barcode': 'A1'}).status_code == 400
+    broken = client.post('/api/products/import', data={'file': (io.BytesIO(b'[{"barcode": '), 'products.json')})
+    assert broken.status_code == 400
+    assert client.post('/api/products/import', data={
+        'file': (io.BytesIO(json.dumps([{'barcode': 'C1', 'name': 'Cheese', 'price': 4, 'stock_quantity': 1}]).encode()),
+                 'products.json')}).json['imported'] == 1
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from inventory import low_stock_filter
+from migrate import migrate
+from models import db, Bill, BillItem, Expense, Product
+
+INDEXES = (('bill_items', 'ix_bill_items_bill_id'), ('bill_items', 'ix_bill_items_product_id'),
+           ('expenses', 'ix_expenses_date'), ('products', 'ix_products_stock_quantity'),
+           ('products', 'ix_products_name'), ('products', 'ix_products_category_name'))
+
+
+def explain(stmt):
+    """(plan lines, full table scan?) for a select, from the database's own EXPLAIN."""
+    conn = db.session.connection()
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if conn.dialect.name == 'mysql':
+        result = conn.exec_driver_sql('EXPLAIN ' + str(compiled), params)
+        rows = [dict(zip(result.keys(), row)) for row in result]
+        lines = [f"{r['table']}: type={r['type']} key={r['key']} rows={r['rows']}" for r in rows]
+        return lines, any(r['type'] == 'ALL' for r in rows)
+    lines = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+    return lines, any(line.startswith('SCAN') and 'INDEX' not in line for line in lines)
+
+
+def seed(products=2000, bills=2000, expenses=500):
+    now = datetime.now()
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f'Product {i}', 'barcode': f'T{i:06d}', 'price': 2.0, 'cost_price': 1.0,
+         'stock_quantity': i % 50, 'category': f'Category {i % 10}'} for i in range(products)])
+    db.session.execute(Bill.__table__.insert(), [
+        {'bill_number': f'T-{i}', 'date': now - timedelta(minutes=i), 'subtotal': 2.0, 'total_amount': 2.0}
+        for i in range(bills)])
+    db.session.execute(BillItem.__table__.insert(), [
+        {'bill_id': i + 1, 'product_id': i % products + 1, 'quantity': 1, 'price_at_sale': 2.0, 'subtotal': 2.0}
+        for i in range(bills)])
+    db.session.execute(Expense.__table__.insert(), [
+        {'description': f'Expense {i}', 'amount': 10.0, 'category': 'Operational', 'date': now - timedelta(hours=i)}
+        for i in range(expenses)])
+    db.session.commit()
+
+
+def test_migrations_index_the_hot_queries(app):
+    seed()
+    mysql = db.engine.dialect.name == 'mysql'
+    start, end = datetime.now() - timedelta(days=7), datetime.now()
+    queries = {
+        'low-stock count': db.select(db.func.count()).select_from(Product).where(low_stock_filter()),
+        'inventory page by name': db.select(Product.id).order_by(Product.name, Product.id).offset(1000).limit(100),
+        'inventory page in category': db.select(Product.id).where(Product.category == 'Category 1')
+        .order_by(Product.name, Product.id).limit(100),
+        'recent bills': db.select(Bill.id).order_by(Bill.date.desc()).limit(5),
+        'bills in date range': db.select(db.func.sum(Bill.total_amount)).where(Bill.date >= start, Bill.date < end),
+        'expenses in date range': db.select(db.func.sum(Expense.amount)).where(Expense.date >= start, Expense.date < end),
+        'receipt line items': db.select(BillItem.id).where(BillItem.bill_id.in_([1, 2, 3])),
+        'line items of a product': db.select(BillItem.id).where(BillItem.product_id == 1),
+    }
+
+    def full_scans():
+        tables = ('products', 'bills', 'bill_items', 'expenses')
+        db.session.execute(db.text('ANALYZE TABLE ' + ', '.join(tables) if mysql else 'ANALYZE'))
+        db.session.commit()
+        return {label for label, stmt in queries.items() if explain(stmt)[1]}
+
+    # Put the database back to how it was before the index migrations, then apply them again
+    for table, name in INDEXES:
+        try:
+            db.session.execute(db.text(f'DROP INDEX {name} ON {table}' if mysql else f'DROP INDEX IF EXISTS {name}'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()  # MySQL keeps an index a foreign key needs
+    db.session.execute(db.text('DELETE FROM schema_version WHERE version >= 2'))
+    db.session.commit()
+    assert full_scans()  # otherwise this test proves nothing
+
+    migrate(db.engine, echo=lambda *a: None)
+    assert full_scans() == set()
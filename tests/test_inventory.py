@@ -0,0 +1,73 @@
+import pytest
+
+from models import db, Product
+
+# name, category, price, cost, stock
+CATALOG = [('Apples', 'Fruit', 3.0, 2.0, 10), ('Bananas', 'Fruit', 1.0, 0.5, 2), ('Bread', 'Bakery', 2.5, 2.0, 0),
+           ('Cherries', 'Fruit', 6.0, 0.0, 4), ('Croissant', 'Bakery', 1.5, 1.0, 30), ('Tea 50%', 'Drinks', 4.0, 3.0, 7)]
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all(Product(name=name, barcode=f'B{n}', category=category, price=price, cost_price=cost,
+                               stock_quantity=stock) for n, (name, category, price, cost, stock) in enumerate(CATALOG))
+    db.session.commit()
+
+
+def page(client, **args):
+    response = client.get('/api/inventory', query_string=args)
+    assert response.status_code == 200
+    return response.json
+
+
+def names(client, **args):
+    return [item['name'] for item in page(client, **args)['items']]
+
+
+def test_sorts_and_pages(client, catalog):
+    assert names(client) == ['Apples', 'Bananas', 'Bread', 'Cherries', 'Croissant', 'Tea 50%']
+    assert names(client, sort='stock', order='desc') == ['Croissant', 'Apples', 'Tea 50%', 'Cherries', 'Bananas', 'Bread']
+    # Margin is on cost, and 100% with no cost; descending ties fall back to the newest first
+    assert names(client, sort='margin', order='desc', limit=3) == ['Cherries', 'Bananas', 'Croissant']
+    assert names(client, sort='value') == ['Bread', 'Cherries', 'Bananas', 'Apples', 'Tea 50%', 'Croissant']
+
+    first = page(client, limit=4)
+    assert (first['total'], len(first['items'])) == (6, 4)
+    rest = page(client, offset=4, limit=4)
+    assert 'total' not in rest
+    assert [i['name'] for i in rest['items']] == ['Croissant', 'Tea 50%']
+
+    apples = first['items'][0]
+    assert (apples['profit'], apples['margin'], apples['cost_value'], apples['sell_value']) == (1.0, 50.0, 20.0, 30.0)
+
+
+def test_filters(client, catalog):
+    assert names(client, category='Bakery') == ['Bread', 'Croissant']
+    assert names(client, category=['Bakery', 'Drinks']) == ['Bread', 'Croissant', 'Tea 50%']
+    assert names(client, q='b') == ['Bananas', 'Bread']
+    assert names(client, q='Tea 5') == ['Tea 50%']
+    assert names(client, q='Tea_') == []  # wildcards are matched literally
+    assert names(client, low_stock=1) == ['Bananas', 'Bread', 'Cherries']
+    assert page(client, category='Fruit', low_stock='true')['total'] == 2
+
+
+@pytest.mark.parametrize('args', [{'sort': 'stock_quantity; DROP TABLE products'}, {'offset': 'x'}, {'limit': '1.5'}])
+def test_bad_arguments_get_a_400(client, catalog, args):
+    response = client.get('/api/inventory', query_string=args)
+    assert response.status_code == 400
+    assert response.json['error']
+
+
+def test_summary_totals_the_filtered_catalog(client, catalog):
+    summary = client.get('/api/inventory/summary').json
+    assert summary == {
+        'products': 6, 'stock_units': 53, 'cost_value': 72.0, 'sell_value': 129.0,
+        'low_stock_threshold': 5, 'low_stock': 3,
+        'low_stock_by_category': [{'category': 'Bakery', 'products': 1}, {'category': 'Fruit', 'products': 2}],
+        'categories': [{'category': 'Bakery', 'products': 2}, {'category': 'Drinks', 'products': 1},
+                       {'category': 'Fruit', 'products': 3}],
+    }
+    fruit = client.get('/api/inventory/summary?category=Fruit').json
+    assert (fruit['products'], fruit['stock_units'], fruit['cost_value'], fruit['low_stock']) == (3, 16, 21.0, 2)
+    # The category list for the filter dropdown stays whole
+    assert len(fruit['categories']) == 3
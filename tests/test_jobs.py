@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from conftest import bill
+from jobs import Task, job_runner
+from models import db, Job
+
+
+def wait_for(client, job_id, statuses=('done', 'failed', 'cancelled'), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').json
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} still {job["status"]}')
+
+
+def add_job(**fields):
+    now = datetime.now()
+    job = Job(**{'kind': 'export', 'params': '{}', 'cache_key': 'key', 'created_at': now, 'updated_at': now,
+                 **fields})
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+@pytest.fixture
+def slow_task(monkeypatch):
+    """A 'slow' job kind that reports progress until released, then returns {'steps': n}."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(context):
+        started.set()
+        steps = 0
+        while not release.is_set():
+            steps += 1
+            context.progress(steps, 1000)
+            time.sleep(0.01)
+        return {'steps': steps}
+
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL', 0)
+    monkeypatch.setitem(jobs.TASKS, 'slow', Task(lambda raw: {}, run, cacheable=False))
+    yield started, release
+    release.set()
+
+
+@pytest.mark.parametrize('body', [
+    [], 'export', {'kind': 'export', 'params': ['bill_items']}, {'kind': 'export', 'params': 'bill_items'},
+    {'kind': 'export', 'params': 5}, {'kind': ['export']}, {'kind': 'export', 'params': {'kind': ['bills']}},
+    {'kind': 'profit_report', 'params': {'group_by': {'day': 1}}}, {'kind': 'export', 'params': {'kind': 'nope'}},
+    {'kind': 'rebuild_summary', 'params': {'start': '2026-02-30'}},
+])
+def test_bad_job_requests_get_a_400(client, body):
+    response = client.post('/api/jobs', json=body)
+    assert response.status_code == 400
+    assert response.json['error']
+    assert Job.query.count() == 0
+
+
+def test_identical_export_reuses_the_finished_result(client, make_products):
+    product_ids = make_products(2)
+    client.post('/api/checkout', json=bill(product_ids))
+    request = {'kind': 'export', 'params': {'kind': 'bill_items', 'format': 'csv'}}
+
+    first = client.post('/api/jobs', json=request)
+    assert first.status_code == 202
+    job = wait_for(client, first.json['id'])
+    assert job['status'] == 'done'
+    result = client.get(job['result_url'])
+    assert result.status_code == 200
+    assert len(result.data.decode().strip().splitlines()) == 3  # header and two lines
+
+    again = client.post('/api/jobs', json=request)
+    assert again.status_code == 200
+    assert again.json['id'] == job['id']
+    # Other parameters are another job; a rollup rebuild writes, so it never reuses a result
+    assert client.post('/api/jobs', json={'kind': 'export', 'params': {'kind': 'bill_items', 'format': 'jsonl'}}) \
+        .json['id'] != job['id']
+    rebuild = client.post('/api/jobs', json={'kind': 'rebuild_summary'}).json['id']
+    wait_for(client, rebuild)
+    assert client.post('/api/jobs', json={'kind': 'rebuild_summary'}).json['id'] != rebuild
+
+
+def test_cancelling_a_running_job_stops_it(client, slow_task):
+    started, release = slow_task
+    job_id = client.post('/api/jobs', json={'kind': 'slow'}).json['id']
+    assert started.wait(5)
+    # Submitting it again while it runs shares the job
+    assert client.post('/api/jobs', json={'kind': 'slow'}).json['id'] == job_id
+
+    assert client.delete(f'/api/jobs/{job_id}').status_code == 202
+    job = wait_for(client, job_id)
+    assert job['status'] == 'cancelled'
+    assert client.delete(f'/api/jobs/{job_id}').status_code == 409
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
+
+
+def test_cancelling_a_queued_job_is_immediate(client):
+    job_id = add_job(id='queued', status='queued')
+    response = client.delete(f'/api/jobs/{job_id}')
+    assert response.status_code == 202
+    assert response.json['status'] == 'cancelled'
+    assert client.delete('/api/jobs/missing').status_code == 404
+
+
+def test_purge_deletes_expired_jobs_and_fails_lost_ones(app, tmp_path):
+    now = datetime.now()
+    path = tmp_path / 'expired.csv'
+    path.write_text('id\n')
+    add_job(id='expired', status='done', result_path=str(path), expires_at=now - timedelta(seconds=1))
+    add_job(id='fresh', status='done', expires_at=now + timedelta(hours=1))
+    add_job(id='lost', status='running', updated_at=now - timedelta(seconds=job_runner.stale_after + 1))
+
+    assert job_runner.purge() == (1, 1)
+    db.session.expire_all()
+    assert {job.id: job.status for job in Job.query} == {'fresh': 'done', 'lost': 'failed'}
+    assert not os.path.exists(path)
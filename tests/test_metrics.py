@@ -0,0 +1,100 @@
+import logging
+import re
+import uuid
+
+from conftest import bill
+from instrumentation import fingerprint, metrics
+from models import db, Product
+
+SAMPLE = re.compile(r'^(\w+)(\{.*\})? (\S+)$')
+
+
+def scrape(client):
+    """{'name{labels}': value} from /metrics, checking every line parses."""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('#'):
+            assert re.match(r'^# (HELP|TYPE) \w+ ', line)
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        samples[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+    return samples
+
+
+def test_fingerprint_collapses_literals():
+    assert fingerprint("SELECT * FROM products WHERE id IN (?, ?, ?) AND name = 'Tea' LIMIT 10") \
+        == fingerprint("SELECT * FROM products  WHERE id IN (?) AND name = 'Milk''s' LIMIT 5") \
+        == 'SELECT * FROM products WHERE id IN (?) AND name = ? LIMIT ?'
+
+
+def test_metrics_count_requests_queries_and_latency(client, make_products):
+    make_products(3)
+    before = scrape(client)
+    for _ in range(3):
+        assert client.get('/api/products?q=product').status_code == 200
+    # An error page is sent as a streamed body, so it is recorded once the server closes it
+    client.get('/no-such-page').close()
+    after = scrape(client)
+
+    def grew(key):
+        return after.get(key, 0) - before.get(key, 0)
+
+    labels = 'endpoint="main.get_products",method="GET"'
+    assert grew(f'http_requests_total{{{labels},status="200"}}') == 3
+    assert grew(f'http_request_duration_seconds_count{{{labels}}}') == 3
+    assert grew(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == 3
+    assert grew('db_queries_per_request_count{endpoint="main.get_products"}') == 3
+    # The search rebuilds its index on the first request, then loads three products per search
+    assert grew('db_queries_per_request_sum{endpoint="main.get_products"}') >= 3
+    assert grew('db_time_seconds_total{endpoint="main.get_products"}') > 0
+    assert grew('http_requests_total{endpoint="unmatched",method="GET",status="404"}') == 1
+    # Cumulative buckets never go down as the bound goes up
+    buckets = [v for k, v in after.items() if k.startswith(f'http_request_duration_seconds_bucket{{{labels}')]
+    assert buckets == sorted(buckets)
+
+
+def test_repeated_statement_is_reported_as_n_plus_one(app, client, make_products, caplog):
+    product_ids = make_products(metrics.n_plus_one_threshold)
+
+    def one_at_a_time():
+        return {'names': [db.session.execute(db.select(Product.name).where(Product.id == pid)).scalar()
+                          for pid in product_ids]}
+
+    app.add_url_rule('/n-plus-one', 'n_plus_one', one_at_a_time)
+    before = scrape(client)
+    with caplog.at_level(logging.WARNING, logger='instrumentation'):
+        client.get('/n-plus-one')
+        # A batch of bills repeats the same statements once per bill, which isn't an N+1
+        client.post('/api/checkout/batch', json={'bills': [
+            bill(product_ids[:1], client_ref=str(uuid.uuid4())) for _ in range(metrics.n_plus_one_threshold)]})
+    after = scrape(client)
+
+    assert after['db_n_plus_one_requests_total{endpoint="n_plus_one"}'] == 1
+    assert after.get('db_n_plus_one_requests_total{endpoint="main.checkout_batch"}', 0) \
+        == before.get('db_n_plus_one_requests_total{endpoint="main.checkout_batch"}', 0)
+    warnings = [r.getMessage() for r in caplog.records if 'N+1' in r.getMessage()]
+    assert warnings == [f'Possible N+1 in n_plus_one: {len(product_ids)} x '
+                        'SELECT products.name FROM products WHERE products.id = ?']
+
+
+def test_slow_queries_are_logged_and_counted(client, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, 'slow_query_ms', 0)
+    with caplog.at_level(logging.WARNING, logger='instrumentation'):
+        client.get('/api/inventory/summary')
+    assert any(r.getMessage().startswith('Slow query') and 'main.get_inventory_summary' in r.getMessage()
+               for r in caplog.records)
+    samples = scrape(client)
+    slow = [k for k in samples if k.startswith('db_slow_queries_total{') and 'FROM products' in k]
+    assert slow
+    assert all(re.search(r'fingerprint="[0-9a-f]{12}",statement="', k) for k in slow)
+
+
+def test_debug_header_breaks_down_the_request(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'debug_header', True)
+    response = client.get('/api/inventory/summary')
+    assert int(response.headers['X-Query-Count']) >= 1
+    assert re.match(r'db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$', response.headers['Server-Timing'])
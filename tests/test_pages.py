@@ -0,0 +1,11 @@
+import re
+
+import pytest
+
+
+@pytest.mark.parametrize('url', ['/', '/billing', '/inventory', '/history', '/expenses', '/settings'])
+def test_nav_highlights_the_current_page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    active = re.findall(r'<a href="([^"]*)"\s+class="nav-link active"', response.get_data(as_text=True))
+    assert active == [url]
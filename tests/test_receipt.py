@@ -0,0 +1,23 @@
+from conftest import bill, count_queries
+from models import db, Bill
+from shop_settings import settings_cache
+
+
+def test_receipt_queries_do_not_grow_with_lines(client, make_products):
+    product_ids = make_products(40)
+    settings_cache.get()  # warm, as on a running till
+
+    counts = {}
+    for lines in (1, 10, 40):
+        bill_id = client.post('/api/checkout', json=bill(product_ids[:lines])).json['bill_id']
+        db.session.expunge_all()
+        with count_queries(db.engine) as receipt:
+            assert client.get(f'/receipt/{bill_id}').status_code == 200
+        with count_queries(db.engine) as api:
+            assert len(client.get('/api/bills', query_string={'limit': 1}).json['bills'][0]['items']) == lines
+        db.session.expunge_all()
+        with count_queries(db.engine) as to_dict:
+            assert len(db.session.get(Bill, bill_id).to_dict()['items']) == lines
+        counts[lines] = (receipt['queries'], api['queries'], to_dict['queries'])
+
+    assert len(set(counts.values())) == 1, counts
@@ -0,0 +1,53 @@
+import pytest
+
+from models import db, Product
+
+CATALOG = [('1001', 'Milk'), ('10011', 'Milkshake'), ('2001', 'Almond Milk'), ('3001', 'Buttermilk'),
+           ('4001', 'Rice'), ('4002', 'Brown Rice'), ('4003', 'Price Tags'), ('5001', 'Tea')]
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all(Product(name=name, barcode=barcode, price=1.0, stock_quantity=10)
+                       for barcode, name in CATALOG)
+    db.session.commit()
+
+
+def names(client, query):
+    response = client.get('/api/products', query_string={'q': query})
+    assert response.status_code == 200
+    return [p['name'] for p in response.json]
+
+
+def test_exact_then_prefix_then_substring(client, catalog):
+    # Exact barcode, then barcode prefix
+    assert names(client, '1001') == ['Milk', 'Milkshake']
+    # Name prefix, then a word starting with it, then the name containing it
+    assert names(client, 'milk') == ['Milk', 'Milkshake', 'Almond Milk', 'Buttermilk']
+    assert names(client, 'rice') == ['Rice', 'Brown Rice', 'Price Tags']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('mlik', ['Almond Milk', 'Milk']),  # swapped letters
+    ('rcie', ['Brown Rice', 'Rice']),
+    ('mlk', ['Almond Milk', 'Milk']),  # a letter missing
+    ('tae', ['Tea']),
+    ('almnd mlik', ['Almond Milk']),
+    ('brown rcie', ['Brown Rice']),
+    ('mkli', []),  # two typos
+])
+def test_short_queries_tolerate_one_typo(client, catalog, query, expected):
+    assert names(client, query) == expected
+
+
+def test_typos_rank_after_exact_matches(client, catalog):
+    assert names(client, 'price') == ['Price Tags', 'Brown Rice', 'Rice']
+    assert names(client, 'tea') == ['Tea']
+
+
+def test_new_products_are_found_with_typos(client, catalog):
+    names(client, 'milk')  # build the index before the product is added
+    response = client.post('/api/products', json={'name': 'Oat Milk', 'barcode': '6001', 'price': 2.0,
+                                                  'stock_quantity': 5})
+    assert response.status_code == 200
+    assert names(client, 'mlik') == ['Almond Milk', 'Milk', 'Oat Milk']
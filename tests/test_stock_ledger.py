@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from conftest import bill, sold_and_on_hand
+from models import db, Product, StockMovement
+from stock_ledger import compact, drift, fold, movement, record_movements, stock_as_of, stock_folder
+
+
+@pytest.fixture
+def no_folding(monkeypatch):
+    """Sales stay pending until a test folds them."""
+    monkeypatch.setattr(stock_folder, 'interval', 3600)
+    monkeypatch.setattr(stock_folder, '_last', time.monotonic())
+
+
+def pending(product_ids):
+    return db.session.query(db.func.count(StockMovement.id)).filter(
+        StockMovement.pending.is_(True), StockMovement.product_id.in_(product_ids)).scalar()
+
+
+def test_a_sale_appends_to_the_ledger_without_updating_products(client, make_products, no_folding):
+    product_ids = make_products(2)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().upper())
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.post('/api/checkout', json=bill(product_ids, quantity=3)).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert not [s for s in statements if s.startswith('UPDATE PRODUCTS')]
+    db.session.expire_all()
+    assert {p.stock_quantity for p in Product.query.filter(Product.id.in_(product_ids))} == {100}
+    assert pending(product_ids) == 2
+    assert sold_and_on_hand(product_ids) == {pid: (3, 97) for pid in product_ids}
+    assert drift() == []
+
+
+def test_checkout_counts_pending_sales(client, make_products, no_folding):
+    product_ids = make_products(1, stock=100)
+    results = client.post('/api/checkout/batch', json={'bills': [
+        bill(product_ids, quantity=40, client_ref=f'bill-{n}') for n in range(3)]}).json['results']
+    assert [r['status'] for r in results] == ['created', 'created', 'error']
+    assert client.post('/api/checkout', json=bill(product_ids, quantity=21)).status_code == 400
+    assert client.post('/api/checkout', json=bill(product_ids, quantity=20)).status_code == 200
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (100, 0)}
+
+
+def test_fold_moves_pending_sales_into_stock(client, make_products, no_folding):
+    product_ids = make_products(2)
+    client.post('/api/checkout', json=bill(product_ids, quantity=3))
+    client.post('/api/checkout', json=bill(product_ids[:1], quantity=2))
+
+    assert stock_folder.fold() == ['T000000', 'T000001']
+    db.session.expire_all()
+    assert dict(db.session.query(Product.id, Product.stock_quantity)) == {product_ids[0]: 95, product_ids[1]: 97}
+    assert pending(product_ids) == 0
+    assert fold() == {}
+    assert drift() == []
+
+
+def test_editing_stock_starts_from_pending_sales(client, make_products, no_folding):
+    product_ids = make_products(1)
+    client.post('/api/checkout', json=bill(product_ids, quantity=3))
+
+    assert client.put(f'/api/product/{product_ids[0]}', json={'stock_quantity': 50}).status_code == 200
+    edit = StockMovement.query.filter_by(kind='adjustment').one()
+    assert edit.quantity == -47
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (3, 50)}
+    assert drift() == []
+
+
+def test_an_offline_sale_lands_at_its_bill_date(client, app, no_folding):
+    now = datetime.now().replace(microsecond=0)
+    product = Product(name='Milk', barcode='MILK', price=2.0, cost_price=1.0, stock_quantity=100)
+    db.session.add(product)
+    db.session.flush()
+    restock = movement(product.id, 100, 'restock')
+    restock['created_at'] = restock['occurred_at'] = now - timedelta(hours=3)
+    record_movements([restock])
+    db.session.commit()
+    pid = product.id
+    assert compact(now - timedelta(hours=2)) == (now - timedelta(hours=2), 1)
+
+    # Synced now, sold before and after the snapshot
+    results = client.post('/api/checkout/batch', json={'bills': [
+        bill([pid], quantity=2, client_ref='early', offline=True, date=(now - timedelta(minutes=150)).isoformat()),
+        bill([pid], quantity=5, client_ref='late', offline=True, date=(now - timedelta(minutes=60)).isoformat()),
+    ]}).json['results']
+    assert [r['status'] for r in results] == ['created', 'created']
+
+    assert stock_as_of(now - timedelta(minutes=160), [pid]) == {pid: 100}
+    assert stock_as_of(now - timedelta(minutes=90), [pid]) == {pid: 98}
+    assert stock_as_of(now - timedelta(minutes=30), [pid]) == {pid: 93}
+    assert stock_as_of(now + timedelta(seconds=1), [pid]) == {pid: 93}
+    assert drift() == []
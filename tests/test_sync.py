@@ -0,0 +1,83 @@
+import uuid
+
+from conftest import bill, sold_and_on_hand
+from models import db, Bill
+from stock_ledger import drift
+
+
+def test_resending_a_batch_reports_duplicates(client, make_products):
+    product_ids = make_products(5)
+    bills = [bill(product_ids[:n + 1], client_ref=str(uuid.uuid4())) for n in range(5)]
+
+    first = client.post('/api/checkout/batch', json={'bills': bills}).json['results']
+    assert [r['status'] for r in first] == ['created'] * 5
+    count = Bill.query.count()
+
+    # A till that lost the response sends the same backlog again
+    again = client.post('/api/checkout/batch', json={'bills': bills}).json['results']
+    assert [r['status'] for r in again] == ['duplicate'] * 5
+    assert [r['bill_id'] for r in again] == [r['bill_id'] for r in first]
+    assert Bill.query.count() == count
+    # And the single-bill endpoint returns the saved bill for a known client_ref
+    assert client.post('/api/checkout', json=bills[0]).json['bill_id'] == first[0]['bill_id']
+    assert Bill.query.count() == count
+
+
+def test_malformed_batch_bill_is_rejected_for_good(client, make_products):
+    product_ids = make_products(1)
+    missing_quantity = bill(product_ids, client_ref='missing')
+    del missing_quantity['items'][0]['quantity']
+    wrong_type = bill(product_ids, client_ref='wrong')
+    wrong_type['items'][0]['price'] = 'two'
+    missing_total = bill(product_ids, client_ref='total')
+    del missing_total['total_amount']
+
+    results = client.post('/api/checkout/batch', json={
+        'bills': [missing_quantity, wrong_type, missing_total]}).json['results']
+    assert [r['status'] for r in results] == ['error', 'error', 'error']
+    assert not any(r['retry'] for r in results)
+    assert client.post('/api/checkout', json=dict(missing_quantity, client_ref=None)).status_code == 400
+
+
+def test_offline_sale_short_of_stock_is_kept(client, make_products):
+    product_ids = make_products(1, stock=2)
+    results = client.post('/api/checkout/batch', json={
+        'bills': [bill(product_ids, quantity=5, client_ref='offline', offline=True)]}).json['results']
+
+    assert results[0]['status'] == 'created'
+    assert results[0]['short'] == [{'product_id': product_ids[0], 'name': 'Product 0', 'quantity': 3}]
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (5, -3)}
+    assert drift() == []
+
+
+def test_batch_sale_not_marked_offline_keeps_the_stock_guard(client, make_products):
+    product_ids = make_products(1, stock=2)
+    results = client.post('/api/checkout/batch', json={
+        'bills': [bill(product_ids, quantity=5, client_ref='online')]}).json['results']
+
+    assert results[0]['status'] == 'error'
+    assert not results[0]['retry']
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (0, 2)}
+
+
+def test_losing_a_client_ref_race_reports_the_saved_bill(client, make_products, monkeypatch):
+    import checkout
+    product_ids = make_products(1)
+    sell = checkout._sell
+
+    def resent_meanwhile(data, *args, **kwargs):
+        # Another request with the same client_ref commits between the lookup and the insert
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(Bill).values(bill_number=f"OTHER-{data['client_ref']}",
+                                                client_ref=data['client_ref'], total_amount=2.0))
+        return sell(data, *args, **kwargs)
+
+    monkeypatch.setattr(checkout, '_sell', resent_meanwhile)
+    single = client.post('/api/checkout', json=bill(product_ids, client_ref='single'))
+    assert single.status_code == 200
+    assert single.json['bill_number'] == 'OTHER-single'
+
+    results = client.post('/api/checkout/batch', json={'bills': [bill(product_ids, client_ref='batch')]}).json['results']
+    assert results[0]['status'] == 'duplicate'
+    assert results[0]['bill_number'] == 'OTHER-batch'
+    assert sold_and_on_hand(product_ids) == {product_ids[0]: (0, 100)}
@@ -0,0 +1,10 @@
+"""WSGI entry point for production servers:
+
+    gunicorn -w 4 -b 0.0.0.0:8000 wsgi:app
+    waitress-serve --port=8000 wsgi:app
+
+Configure with environment variables (DATABASE_URL, DB_POOL_SIZE, ... see config.py).
+"""
+from app import create_app
+
+app = create_app()